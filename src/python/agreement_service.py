@@ -0,0 +1,545 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from alpha_engine import MISSING, ReliabilityData, alphas_from_totals, count_totals
+from annotation_store import config_key, get_prediction_files
+from calculate_alpha import EXCLUDED_IDS, QUALITY_DIMENSIONS, process_ratings
+from compute_all_agreements import get_configs
+from core.columnar import read_ratings
+
+# Dimensions that process_ratings computes from the others when a ratings file does not rate them.
+AGGREGATED_DIMENSIONS = ['Cogency', 'Reasonableness', 'Effectiveness', 'Overall Quality']
+# Names of the totals of alpha_engine.count_totals.
+TOTALS = ["o", "value_totals", "num_pairable"]
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return [os.path.abspath(path), stat.st_size, stat.st_mtime_ns]
+
+
+def majority_codes(codes, present):
+    """
+    Rating of each item and dimension that get_majority selects with statistics.mode from the ratings of the
+    annotators (annotator x item x dimension) in file order: the most frequent rating and the first one on ties, where
+    every missing rating of an annotator that rated the item counts as a distinct value.
+    """
+    valid = codes != MISSING
+    same = (codes[:, np.newaxis] == codes[np.newaxis]) & valid[:, np.newaxis] & valid[np.newaxis]
+    frequency = np.where(valid, same.sum(axis=1), 1)
+    frequency = np.where(present[..., np.newaxis], frequency, 0)
+    first = np.argmax(frequency == frequency.max(axis=0), axis=0)
+    return np.take_along_axis(codes, first[np.newaxis], axis=0)
+
+
+class RatingsFileReader:
+    """
+    Ratings per argument of a file that is appended to while it is read. A JSONL file is read from where the last read
+    stopped, up to its last complete line; a Parquet file, which is only ever written whole, is read again in full. The
+    arguments that received ratings since they were last taken are kept apart, so that only those are coded again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.inode = None
+        self.offset = 0
+        self.reset()
+
+    def reset(self):
+        self.arguments = {}
+        self.dimensions = set()
+        # Arguments with ratings that were not taken yet, in the order they were read.
+        self.new_ids = {}
+        # Whether the file was read again from its start since ratings were last taken.
+        self.restarted = True
+
+    def read(self):
+        stat = os.stat(self.path)
+        if self.path.endswith(".parquet"):
+            records = read_ratings(self.path)[["id", "dimension", "rating"]].to_dict("records")
+            self.reset()
+            self.add(records)
+            return
+
+        if stat.st_ino != self.inode or stat.st_size < self.offset:
+            # The file was replaced or truncated.
+            self.inode = stat.st_ino
+            self.offset = 0
+            self.reset()
+
+        with open(self.path, "rb") as in_file:
+            in_file.seek(self.offset)
+            data = in_file.read()
+        end = data.rfind(b"\n") + 1
+        lines = data[:end].splitlines()
+        tail = data[end:]
+        if tail.strip():
+            # A last line without a newline is complete if it parses, e.g. at the end of a finished file.
+            try:
+                json.loads(tail)
+                lines.append(tail)
+                end = len(data)
+            except ValueError:
+                pass
+
+        self.add(json.loads(line) for line in lines if line.strip())
+        self.offset += end
+
+    def add(self, records):
+        for record in records:
+            self.arguments.setdefault(record["id"], {})[record["dimension"]] = record["rating"]
+            self.dimensions.add(record["dimension"])
+            self.new_ids[record["id"]] = None
+
+    def new_ratings(self, complete_only):
+        """
+        The ratings of the arguments that were not taken yet, their ids and the number of arguments left out of them.
+        With `complete_only`, only the arguments that are rated in all dimensions are included (all quality dimensions,
+        apart from the ones process_ratings computes if the file does not rate them), so that an argument whose ratings
+        are still being written is not coded with some of its dimensions missing.
+        """
+        ids = list(self.new_ids)
+        if complete_only:
+            required = [dimension for dimension in QUALITY_DIMENSIONS
+                        if dimension not in AGGREGATED_DIMENSIONS or dimension in self.dimensions]
+            ids = [argument_id for argument_id in ids
+                   if all(dimension in self.arguments[argument_id] for dimension in required)]
+        df = pd.DataFrame([(argument_id, dimension, rating) for argument_id in ids
+                           for dimension, rating in self.arguments[argument_id].items()],
+                          columns=["id", "dimension", "rating"])
+        return df, ids, len(self.new_ids) - len(ids)
+
+    def take(self, ids):
+        """Marks the ratings of the given arguments as coded."""
+        for argument_id in ids:
+            del self.new_ids[argument_id]
+        self.restarted = False
+
+
+class SourceAccumulator:
+    """
+    Coded ratings of the files of one model, prompt type and reasoning (one annotator per file) and their value counts
+    per item, dimension and value. The coincidences of any combination of configurations follow from the summed value
+    counts, so a change of a file only requires coding the arguments it changed.
+
+    Only the lines appended to a file since the last update are read and only the arguments they rate are coded again,
+    in arrays that grow by doubling, so the cost of an update grows with the new ratings rather than with the size of
+    the files. The codes that the changed arguments had before the last update are kept in `previous`. An argument is
+    only coded once it is rated in all dimensions. Once a file has not changed for `settle_time` seconds, all of its
+    arguments are coded, e.g. of human annotations that leave dimensions out or of a sweep that stopped in the middle
+    of an argument.
+    """
+
+    def __init__(self, model, prompt_type, reasoning, settle_time=60.0):
+        self.model = model
+        self.prompt_type = prompt_type
+        self.reasoning = reasoning
+        self.settle_time = settle_time
+        # Number of updates that changed the coded ratings.
+        self.version = 0
+        self.reset()
+
+    @property
+    def name(self):
+        return f"{self.model}-{self.prompt_type}{'-reasoning' if self.reasoning else ''}"
+
+    def reset(self):
+        self.files = []
+        # Files with arguments that were left out because they were not rated in all dimensions yet.
+        self.pending = set()
+        self.readers = {}
+        self.annotators = []
+        self.ids = []
+        self.index = {}
+        self.dimensions = []
+        self.values = np.zeros(0)
+        # Coded ratings (annotator x item x dimension), whether each annotator rated each item and the value counts
+        # (item x dimension x value). The items beyond len(self.ids) are spare capacity.
+        self.codes = np.full((0, 0, 0), MISSING, dtype=np.int8)
+        self.present = np.zeros((0, 0), dtype=bool)
+        self.counts = np.zeros((0, 0, 0), dtype=np.int32)
+        # Codes (annotator x dimension) and presence (annotator) before the last update of the items it changed.
+        self.previous = {}
+        # Whether the last update added dimensions or values, which changes the coding of all items.
+        self.domain_changed = True
+
+    def settled(self, signature):
+        return time.time() - signature[2] / 1e9 >= self.settle_time
+
+    def update(self, prediction_files):
+        """Codes the arguments that the files added or changed since the last update and returns whether any did."""
+        self.previous = {}
+        self.domain_changed = False
+        signatures = [file_signature(file) for file in prediction_files]
+        if [signature[0] for signature in signatures[:len(self.files)]] != [file[0] for file in self.files]:
+            # Files were removed or renamed, the annotators no longer correspond to the rows.
+            self.reset()
+
+        changed = False
+        for i, (file, signature) in enumerate(zip(prediction_files, signatures)):
+            settled = self.settled(signature)
+            if i < len(self.files) and self.files[i] == signature and not (signature[0] in self.pending and settled):
+                continue
+
+            reader = self.readers.setdefault(signature[0], RatingsFileReader(file))
+            try:
+                reader.read()
+                ratings, ids, num_pending = reader.new_ratings(complete_only=not settled)
+                ratings = ratings[~ratings["id"].isin(EXCLUDED_IDS)]
+                if ratings.empty and i == len(self.files):
+                    # No argument is complete yet, and the files after this one cannot be placed before it.
+                    break
+                annotations = None if ratings.empty else process_ratings(ratings, signature[0], reader.dimensions)
+            except (ValueError, KeyError):
+                # The file cannot be coded yet, e.g. a Parquet file that is being written. It is retried in a later
+                # update.
+                break
+            self.set_ratings(i, signature[0], annotations, reader.restarted)
+            reader.take(ids)
+            if num_pending:
+                self.pending.add(signature[0])
+            else:
+                self.pending.discard(signature[0])
+            if i < len(self.files):
+                self.files[i] = signature
+            else:
+                self.files.append(signature)
+            changed = True
+
+        if changed:
+            self.version += 1
+        return changed
+
+    def set_ratings(self, i, annotator, annotations, replace):
+        """
+        Codes the ratings of some arguments (None for none) of the annotator in row `i`, after removing all of its
+        ratings if `replace`.
+        """
+        if i == len(self.annotators):
+            self.annotators.append(annotator)
+            self.codes = np.concatenate([self.codes, np.full((1,) + self.codes.shape[1:], MISSING, dtype=np.int8)])
+            self.present = np.concatenate([self.present, np.zeros((1, self.present.shape[1]), dtype=bool)])
+        self.annotators[i] = annotator
+        if replace:
+            self.clear(i, np.flatnonzero(self.present[i, :len(self.ids)]))
+        if annotations is None:
+            return
+
+        row = ReliabilityData.from_annotations(annotations)
+        self.extend_domain(row.dimensions, row.values)
+        index = self.add_items([str(argument_id) for argument_id in row.ids])
+        self.clear(i, index)
+        value_map = np.append(np.searchsorted(self.values, row.values), MISSING).astype(np.int8)
+        dimension_index = [self.dimensions.index(dimension) for dimension in row.dimensions]
+        self.codes[i, index[:, np.newaxis], dimension_index] = value_map[row.codes[0]]
+        self.present[i, index] = True
+        self.count(i, index, 1)
+
+    def clear(self, i, index):
+        """Removes the ratings of the annotator in row `i` of the items at `index`."""
+        for j in index:
+            if self.ids[j] not in self.previous:
+                self.previous[self.ids[j]] = (self.codes[:, j].copy(), self.present[:, j].copy())
+        self.count(i, index, -1)
+        self.codes[i, index] = MISSING
+        self.present[i, index] = False
+
+    def count(self, i, index, sign):
+        """Adds the ratings of the annotator in row `i` of the items at `index` to the value counts (-1: subtracts)."""
+        codes = self.codes[i, index]
+        rated = codes != MISSING
+        items, dimensions = np.nonzero(rated)
+        np.add.at(self.counts, (index[items], dimensions, codes[rated]), sign)
+
+    def add_items(self, ids):
+        """Indices of the given arguments, adding the ones that are new."""
+        for argument_id in ids:
+            if argument_id not in self.index:
+                self.index[argument_id] = len(self.ids)
+                self.ids.append(argument_id)
+
+        capacity = self.present.shape[1]
+        if len(self.ids) > capacity:
+            extra = max(capacity, len(self.ids) - capacity)
+            num_annotators, _, num_dimensions = self.codes.shape
+            self.codes = np.concatenate(
+                [self.codes, np.full((num_annotators, extra, num_dimensions), MISSING, dtype=np.int8)], axis=1)
+            self.present = np.concatenate([self.present, np.zeros((num_annotators, extra), dtype=bool)], axis=1)
+            self.counts = np.concatenate(
+                [self.counts, np.zeros((extra,) + self.counts.shape[1:], dtype=self.counts.dtype)])
+        return np.array([self.index[argument_id] for argument_id in ids], dtype=int)
+
+    def extend_domain(self, dimensions, values):
+        """Adds the dimensions and values that are not coded yet."""
+        new_dimensions = [dimension for dimension in dimensions if dimension not in self.dimensions]
+        if new_dimensions:
+            self.dimensions += new_dimensions
+            num_annotators, capacity, _ = self.codes.shape
+            self.codes = np.concatenate(
+                [self.codes, np.full((num_annotators, capacity, len(new_dimensions)), MISSING, dtype=np.int8)], axis=2)
+            self.counts = np.concatenate(
+                [self.counts, np.zeros((capacity, len(new_dimensions), len(self.values)), dtype=self.counts.dtype)],
+                axis=1)
+            self.domain_changed = True
+
+        values = np.union1d(self.values, values)
+        if len(values) > len(self.values):
+            value_map = np.append(np.searchsorted(values, self.values), MISSING).astype(np.int8)
+            self.codes = value_map[self.codes]
+            counts = np.zeros(self.counts.shape[:2] + (len(values),), dtype=self.counts.dtype)
+            counts[..., value_map[:-1]] = self.counts
+            self.counts = counts
+            self.values = values
+            self.domain_changed = True
+
+    def item_codes(self, ids, before=False):
+        """
+        Codes (annotator x item x dimension) and presence (annotator x item) of the given arguments, or with `before`,
+        as they were before the last update.
+        """
+        index = np.array([self.index.get(argument_id, -1) for argument_id in ids], dtype=int)
+        codes = np.full((len(self.annotators), len(ids), len(self.dimensions)), MISSING, dtype=np.int8)
+        present = np.zeros((len(self.annotators), len(ids)), dtype=bool)
+        codes[:, index >= 0] = self.codes[:, index[index >= 0]]
+        present[:, index >= 0] = self.present[:, index[index >= 0]]
+        if before:
+            for k, argument_id in enumerate(ids):
+                if argument_id in self.previous:
+                    # The annotators added by the last update had not rated anything before.
+                    item_codes, item_present = self.previous[argument_id]
+                    codes[:, k] = MISSING
+                    codes[:len(item_present), k] = item_codes
+                    present[:, k] = False
+                    present[:len(item_present), k] = item_present
+        return codes, present
+
+    def config_counts(self, aggregation, ids, before=False):
+        """
+        Value counts (item x dimension x value) and dimensions of the annotations of the configuration with the given
+        aggregation for the given arguments, or with `before`, as they were before the last update.
+        """
+        if aggregation != "majority" and not (before and self.previous):
+            index = np.array([self.index.get(argument_id, -1) for argument_id in ids], dtype=int)
+            counts = np.zeros((len(ids),) + self.counts.shape[1:], dtype=self.counts.dtype)
+            counts[index >= 0] = self.counts[index[index >= 0]]
+            return counts, self.dimensions
+
+        codes, present = self.item_codes(ids, before)
+        dimensions = self.dimensions
+        if aggregation == "majority":
+            # The majority annotations only contain the quality dimensions.
+            dimensions = [dimension for dimension in self.dimensions if dimension in QUALITY_DIMENSIONS]
+            codes = majority_codes(codes[:, :, [self.dimensions.index(dimension) for dimension in dimensions]],
+                                   present)
+        return (codes[..., np.newaxis] == np.arange(len(self.values))).sum(axis=0), dimensions
+
+    def save(self, state_dir):
+        num_items = len(self.ids)
+        np.savez(os.path.join(state_dir, f"{self.name}.npz"), codes=self.codes[:, :num_items],
+                 present=self.present[:, :num_items], counts=self.counts[:num_items], ids=np.array(self.ids, dtype=str),
+                 values=self.values)
+        with open(os.path.join(state_dir, f"{self.name}.json"), "w") as state_file:
+            json.dump({"files": self.files, "pending": sorted(self.pending), "annotators": self.annotators,
+                       "dimensions": self.dimensions, "version": self.version}, state_file)
+
+    def load(self, state_dir):
+        state_file_name = os.path.join(state_dir, f"{self.name}.json")
+        if not os.path.exists(state_file_name):
+            return
+        with open(state_file_name) as state_file:
+            state = json.load(state_file)
+        arrays = np.load(os.path.join(state_dir, f"{self.name}.npz"))
+        self.files = state["files"]
+        self.pending = set(state.get("pending", []))
+        self.annotators = state["annotators"]
+        self.ids = [str(argument_id) for argument_id in arrays["ids"]]
+        self.index = {argument_id: i for i, argument_id in enumerate(self.ids)}
+        self.dimensions = state["dimensions"]
+        self.values = arrays["values"]
+        self.codes = arrays["codes"]
+        self.present = arrays["present"]
+        self.counts = arrays["counts"]
+        self.version = state.get("version", 0)
+
+
+class AgreementService:
+    """
+    Keeps the agreements of all pairs of configurations current while ratings files are added to or appended in the
+    predictions directory. Each update codes only the arguments that were added or changed, updates the coincidence
+    totals (see alpha_engine.count_totals) of the pairs that involve an affected configuration by the difference the
+    changed arguments make, recomputes their alphas from the totals and rewrites the agreements file in the format of
+    compute_all_agreements.py. The totals of a pair are only computed over all arguments when there are none that are
+    current with the previous update of its sources, or when new dimensions or values change their coding. The
+    accumulators, totals and alphas are kept in `state_dir` across restarts. Arguments that are not rated in all
+    dimensions yet are left out until they are, or until their file has not changed for `settle_time` seconds (see
+    SourceAccumulator).
+    """
+
+    def __init__(self, path, num_annotators, state_dir, configs, out_file_name="agreements.jsonl", settle_time=60.0):
+        self.path = path
+        self.num_annotators = num_annotators
+        self.state_dir = state_dir
+        self.configs = configs
+        self.out_file_name = out_file_name
+
+        os.makedirs(state_dir, exist_ok=True)
+        self.sources = {}
+        for config in configs:
+            model, prompt_type, reasoning, _ = config_key(config)
+            if (model, prompt_type, reasoning) not in self.sources:
+                source = SourceAccumulator(model, prompt_type, reasoning, settle_time)
+                source.load(state_dir)
+                self.sources[(model, prompt_type, reasoning)] = source
+
+        self.alphas = {}
+        alphas_file_name = os.path.join(state_dir, "alphas.json")
+        if os.path.exists(alphas_file_name):
+            with open(alphas_file_name) as alphas_file:
+                self.alphas = json.load(alphas_file)
+        # Totals of each pair, with its dimensions and the versions of its sources they are current with.
+        self.totals = {}
+        self.load_totals()
+
+    def pairs(self):
+        return [(config_i, config_j) for i, config_i in enumerate(self.configs)
+                for j, config_j in enumerate(self.configs) if i < j]
+
+    def update(self):
+        """Processes new and changed ratings and returns the number of recomputed pairs."""
+        changed_sources = set()
+        for key, source in self.sources.items():
+            model, prompt_type, reasoning = key
+            if source.update(get_prediction_files(self.path, model, prompt_type, reasoning, self.num_annotators)):
+                changed_sources.add(key)
+                source.save(self.state_dir)
+
+        num_updated = 0
+        for pair in self.pairs():
+            pair_key = json.dumps(pair)
+            keys = [config_key(config)[:3] for config in pair]
+            sources = [self.sources[key] for key in keys]
+            versions = [source.version for source in sources]
+            if pair_key in self.totals and self.totals[pair_key]["versions"] == versions:
+                continue
+            if any(not source.ids for source in sources):
+                continue
+
+            totals = self.totals.get(pair_key)
+            previous_versions = [source.version - (key in changed_sources) for key, source in zip(keys, sources)]
+            if (totals is not None and totals["versions"] == previous_versions
+                    and not any(source.domain_changed for source in sources)):
+                ids = list(dict.fromkeys(argument_id for source in sources for argument_id in source.previous))
+                before = count_totals(self.pair_counts(pair, sources, ids, before=True)[0])
+                after = count_totals(self.pair_counts(pair, sources, ids)[0])
+                for name, total_before, total_after in zip(TOTALS, before, after):
+                    totals[name] = totals[name] + total_after - total_before
+            else:
+                ids = list(dict.fromkeys(sources[0].ids + sources[1].ids))
+                value_counts, dimensions = self.pair_counts(pair, sources, ids)
+                totals = dict(zip(TOTALS, count_totals(value_counts)), dimensions=dimensions)
+            totals["versions"] = versions
+            self.totals[pair_key] = totals
+            self.alphas[pair_key] = self.compute_pair(totals)
+            num_updated += 1
+
+        if num_updated:
+            self.save_totals()
+            with open(os.path.join(self.state_dir, "alphas.json"), "w") as alphas_file:
+                json.dump(self.alphas, alphas_file)
+            self.write_agreements()
+        return num_updated
+
+    @staticmethod
+    def pair_counts(pair, sources, ids, before=False):
+        """
+        Summed value counts (item x dimension x value) of the two configurations of a pair for the given arguments, in
+        the values of both sources, and their dimensions.
+        """
+        config_counts = [source.config_counts(config["aggregation"], ids, before)
+                         for config, source in zip(pair, sources)]
+        dimensions = list(dict.fromkeys(dimension for _, config_dimensions in config_counts
+                                        for dimension in config_dimensions))
+        values = np.union1d(sources[0].values, sources[1].values)
+        value_counts = np.zeros((len(ids), len(dimensions), len(values)), dtype=np.int32)
+        for (counts, config_dimensions), source in zip(config_counts, sources):
+            value_counts[np.ix_(np.arange(len(ids)), [dimensions.index(dimension) for dimension in config_dimensions],
+                                np.searchsorted(values, source.values))] += counts
+        return value_counts, dimensions
+
+    @staticmethod
+    def compute_pair(totals):
+        try:
+            return alphas_from_totals(*[totals[name] for name in TOTALS], totals["dimensions"], QUALITY_DIMENSIONS)
+        except ValueError:
+            # Not enough ratings yet to measure agreement.
+            return None
+
+    def save_totals(self):
+        arrays = {"pairs": np.array(list(self.totals), dtype=str)}
+        for i, totals in enumerate(self.totals.values()):
+            for name in TOTALS:
+                arrays[f"{i}-{name}"] = totals[name]
+            arrays[f"{i}-dimensions"] = np.array(totals["dimensions"], dtype=str)
+            arrays[f"{i}-versions"] = np.array(totals["versions"])
+        np.savez(os.path.join(self.state_dir, "totals.npz"), **arrays)
+
+    def load_totals(self):
+        totals_file_name = os.path.join(self.state_dir, "totals.npz")
+        if not os.path.exists(totals_file_name):
+            return
+        arrays = np.load(totals_file_name)
+        for i, pair_key in enumerate(arrays["pairs"]):
+            self.totals[str(pair_key)] = dict({name: arrays[f"{i}-{name}"] for name in TOTALS},
+                                              dimensions=[str(dimension) for dimension in arrays[f"{i}-dimensions"]],
+                                              versions=arrays[f"{i}-versions"].tolist())
+
+    def write_agreements(self):
+        temp_file_name = self.out_file_name + ".tmp"
+        with open(temp_file_name, "w") as out_file:
+            for config_i, config_j in self.pairs():
+                alphas = self.alphas.get(json.dumps([config_i, config_j]))
+                if alphas is None:
+                    continue
+                out_file.write(json.dumps({
+                    "annotators": [config_i, config_j],
+                    "alphas": alphas
+                }))
+                out_file.write("\n")
+        os.replace(temp_file_name, self.out_file_name)
+
+    def watch(self, interval):
+        while True:
+            num_updated = self.update()
+            if num_updated:
+                print(f"{time.strftime('%H:%M:%S')}: updated the agreements of {num_updated} pairs")
+            time.sleep(interval)
+
+
+if __name__ == '__main__':
+    data_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..', 'data'))
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-p', '--path', type=str, default=os.path.join(data_dir, 'predictions'),
+                        help='directory containing the prediction files')
+    parser.add_argument('-a', '--annotators', type=str, nargs="+", default=["human", "GPT3", "palm2"])
+    parser.add_argument('-k', '--num_annotators', type=int, default=10)
+    parser.add_argument('--state-dir', type=str, default=os.path.join(data_dir, 'agreement-state'),
+                        help='directory for the accumulated ratings and alphas')
+    parser.add_argument('-o', '--out', type=str, default="agreements.jsonl")
+    parser.add_argument('--watch', action='store_true', help='keep polling the predictions directory for new ratings')
+    parser.add_argument('--interval', type=float, default=30, help='seconds between two polls')
+    parser.add_argument('--settle-time', type=float, default=60,
+                        help='seconds after the last change of a ratings file after which also its arguments that are '
+                             'not rated in all dimensions are included')
+    args = parser.parse_args()
+
+    service = AgreementService(args.path, args.num_annotators, args.state_dir, get_configs(args.annotators),
+                               args.out, args.settle_time)
+    if args.watch:
+        service.watch(args.interval)
+    else:
+        print(f"updated the agreements of {service.update()} pairs")
@@ -0,0 +1,192 @@
+import numpy as np
+import pandas as pd
+
+MISSING = -1
+
+
+class ReliabilityData:
+    """
+    Integer-coded ratings of a set of annotators as a 3-D array (annotator x item x dimension). Each rating is stored as
+    the index of its value in the sorted `values`, missing ratings as MISSING.
+    """
+
+    def __init__(self, annotators, ids, dimensions, values, codes):
+        self.annotators = list(annotators)
+        self.ids = np.asarray(ids)
+        self.dimensions = list(dimensions)
+        self.values = np.asarray(values, dtype=float)
+        self.codes = codes
+
+    @classmethod
+    def from_annotations(cls, annotations: pd.DataFrame, dimensions=None):
+        """
+        Codes a frame with one row per annotator and item (columns `annotator`, `id` and one column per dimension), as
+        returned by `get_annotations` and `get_majority`. By default, all other columns are dimensions.
+        """
+        if dimensions is None:
+            dimensions = [column for column in annotations.columns if column not in ("annotator", "id")]
+
+        annotators, annotator_index = np.unique(annotations["annotator"].to_numpy(), return_inverse=True)
+        ids, id_index = np.unique(annotations["id"].astype(str).to_numpy(dtype=str), return_inverse=True)
+
+        ratings = annotations.reindex(columns=dimensions).to_numpy(dtype=float)
+        present = ~np.isnan(ratings)
+        values = np.unique(ratings[present])
+
+        codes = np.full((len(annotators), len(ids), len(dimensions)), MISSING, dtype=np.int8)
+        codes[annotator_index, id_index] = np.where(present, np.searchsorted(values, np.where(present, ratings, 0)),
+                                                    MISSING)
+
+        return cls(annotators, ids, dimensions, values, codes)
+
+    @classmethod
+    def concat(cls, datas):
+        """Stacks the annotators of several data sets, aligned on the union of their items, dimensions and values."""
+        ids, dimensions, values = union_domain(datas)
+        codes = np.concatenate([data.align(ids, dimensions, values).codes for data in datas])
+        return cls([annotator for data in datas for annotator in data.annotators], ids, dimensions, values, codes)
+
+    def align(self, ids, dimensions, values):
+        """The same ratings coded in item, dimension and value domains that include those of the data."""
+        value_map = np.append(np.searchsorted(values, self.values), MISSING).astype(np.int8)
+        item_index = np.searchsorted(ids, self.ids)
+        dimension_index = [dimensions.index(dimension) for dimension in self.dimensions]
+
+        codes = np.full((len(self.annotators), len(ids), len(dimensions)), MISSING, dtype=np.int8)
+        codes[:, item_index[:, np.newaxis], dimension_index] = value_map[self.codes]
+        return ReliabilityData(self.annotators, ids, dimensions, values, codes)
+
+    def subset(self, rows):
+        """Data of the annotators in the given rows."""
+        rows = list(rows)
+        return ReliabilityData([self.annotators[row] for row in rows], self.ids, self.dimensions, self.values,
+                               self.codes[rows])
+
+    def value_counts(self) -> np.ndarray:
+        """Number of annotators that assigned each value to each item and dimension (item x dimension x value)."""
+        return np.stack([(self.codes == value).sum(axis=0) for value in range(len(self.values))], axis=-1)
+
+
+def union_domain(datas):
+    """Sorted items, dimensions in order of appearance and sorted values of several data sets."""
+    ids = np.unique(np.concatenate([data.ids for data in datas]))
+    dimensions = list(dict.fromkeys(dimension for data in datas for dimension in data.dimensions))
+    values = np.unique(np.concatenate([data.values for data in datas]))
+    return ids, dimensions, values
+
+
+def align_counts(value_counts: np.ndarray, data: ReliabilityData, ids, dimensions, values) -> np.ndarray:
+    """Value counts of the data (item x dimension x value) in item, dimension and value domains that include its own."""
+    aligned = np.zeros((len(ids), len(dimensions), len(values)), dtype=value_counts.dtype)
+    aligned[np.ix_(np.searchsorted(ids, data.ids), [dimensions.index(dimension) for dimension in data.dimensions],
+                   np.searchsorted(values, data.values))] = value_counts
+    return aligned
+
+
+def coincidences(value_counts: np.ndarray) -> np.ndarray:
+    """
+    Per-item coincidence matrices (item x dimension x value x value) for value counts (item x dimension x value),
+    normalized by the number of pairable values of the item as in krippendorff.alpha.
+    """
+    pairable = np.maximum(value_counts.sum(axis=-1), 2)
+    counts = value_counts.astype(float)
+    unnormalized = counts[..., :, np.newaxis] * counts[..., np.newaxis, :]
+    unnormalized -= counts[..., np.newaxis] * np.eye(counts.shape[-1])
+
+    return unnormalized / (pairable - 1)[..., np.newaxis, np.newaxis]
+
+
+def ordinal_alpha(o: np.ndarray) -> np.ndarray:
+    """Ordinal Krippendorff's alpha for (a stack of) coincidence matrices of shape (..., value, value)."""
+    n_v = o.sum(axis=-2)
+    n = n_v.sum(axis=-1)[..., np.newaxis, np.newaxis]
+    e = (n_v[..., :, np.newaxis] * n_v[..., np.newaxis, :] - n_v[..., np.newaxis] * np.eye(n_v.shape[-1])) / (n - 1)
+
+    # Ordinal distance: (sum of n_g for g between c and k, inclusive, minus (n_c + n_k) / 2) squared.
+    cumulative = np.cumsum(n_v, axis=-1)
+    lower = np.minimum.outer(np.arange(n_v.shape[-1]), np.arange(n_v.shape[-1]))
+    upper = np.maximum.outer(np.arange(n_v.shape[-1]), np.arange(n_v.shape[-1]))
+    between = cumulative[..., upper] - cumulative[..., lower] + n_v[..., lower]
+    d = (between - (n_v[..., :, np.newaxis] + n_v[..., np.newaxis, :]) / 2) ** 2
+
+    return 1 - (o * d).sum(axis=(-2, -1)) / (e * d).sum(axis=(-2, -1))
+
+
+def check_alpha_input(value_totals: np.ndarray, num_pairable: int, name: str):
+    """
+    Raises the errors of krippendorff.alpha for data without agreement to measure, given the number of times each
+    value was assigned and the number of items with values assigned by at least two coders.
+    """
+    if (value_totals > 0).sum() <= 1:
+        raise ValueError(f"{name}: There has to be more than one value in the domain.")
+
+    if num_pairable == 0:
+        raise ValueError(f"{name}: There has to be at least one unit with values assigned by at least two coders.")
+
+
+def compute_alphas(data: ReliabilityData, dimensions) -> dict:
+    """
+    Ordinal Krippendorff's alpha of each of the given dimensions and across all dimensions of the data, computed from
+    the coincidence matrices of all dimensions in one pass.
+    """
+    return alphas_from_counts(data.value_counts(), data.dimensions, dimensions)
+
+
+def count_totals(value_counts: np.ndarray):
+    """
+    Sums over the items of value counts (item x dimension x value) that alphas_from_totals needs: the coincidence
+    matrices (dimension x value x value), the value totals (dimension x value) and the number of pairable items per
+    dimension. The totals of a set of items are the sums of those of its parts.
+    """
+    return (coincidences(value_counts).sum(axis=0), value_counts.sum(axis=0),
+            (value_counts.sum(axis=-1) >= 2).sum(axis=0))
+
+
+def alphas_from_counts(value_counts: np.ndarray, data_dimensions, dimensions) -> dict:
+    """Same as compute_alphas for the value counts (item x dimension x value) of the data."""
+    return alphas_from_totals(*count_totals(value_counts), data_dimensions, dimensions)
+
+
+def alphas_from_totals(o: np.ndarray, value_totals: np.ndarray, num_pairable: np.ndarray, data_dimensions,
+                       dimensions) -> dict:
+    """Same as compute_alphas for the totals of count_totals."""
+    alpha_dict = {}
+    for dimension in dimensions:
+        i = data_dimensions.index(dimension)
+        check_alpha_input(value_totals[i], num_pairable[i], dimension)
+        alpha_dict[dimension] = float(ordinal_alpha(o[i]))
+
+    check_alpha_input(value_totals.sum(axis=0), num_pairable.sum(), "Across Dimensions")
+    alpha_dict["Across Dimensions"] = float(ordinal_alpha(o.sum(axis=0)))
+    return alpha_dict
+
+
+def bootstrap_alphas(data: ReliabilityData, dimensions, num_samples, confidence=0.95, seed=None,
+                     batch_size=1000) -> dict:
+    """
+    Percentile bootstrap confidence intervals of the alphas of compute_alphas, resampling the rated items with
+    replacement. The coincidence matrices of a resample are the weighted sum of the per-item coincidence matrices, so
+    each batch of resamples is a single matrix product.
+    """
+    value_counts = data.value_counts()
+    rated = value_counts.sum(axis=(1, 2)) > 0
+    per_item = coincidences(value_counts[rated])
+    num_items, num_dimensions, num_values = per_item.shape[:3]
+    per_item = per_item.reshape(num_items, -1)
+
+    rng = np.random.default_rng(seed)
+    samples = {name: [] for name in list(dimensions) + ["Across Dimensions"]}
+    for start in range(0, num_samples, batch_size):
+        size = min(batch_size, num_samples - start)
+        weights = rng.multinomial(num_items, np.full(num_items, 1 / num_items), size=size)
+        o = (weights @ per_item).reshape(-1, num_dimensions, num_values, num_values)
+
+        # Resamples without disagreement to measure have an undefined alpha and are left out of the intervals.
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for dimension in dimensions:
+                samples[dimension].append(ordinal_alpha(o[:, data.dimensions.index(dimension)]))
+            samples["Across Dimensions"].append(ordinal_alpha(o.sum(axis=1)))
+
+    percentiles = [(1 - confidence) / 2 * 100, (1 + confidence) / 2 * 100]
+    return {name: [float(bound) for bound in np.nanpercentile(np.concatenate(alphas), percentiles)]
+            for name, alphas in samples.items()}
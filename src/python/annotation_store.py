@@ -0,0 +1,99 @@
+import glob
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+from alpha_engine import ReliabilityData, compute_alphas
+from calculate_alpha import QUALITY_DIMENSIONS, find_prediction_files, get_annotations, get_majority, process_files
+
+
+def get_prediction_files(path, model, prompt_type, reasoning, num_annotators):
+    return find_prediction_files(model, prompt_type, reasoning, num_annotators, path)
+
+
+def config_key(annotator_config):
+    return (annotator_config["annotator"], annotator_config["prompt_type"], bool(annotator_config["reasoning"]),
+            annotator_config["aggregation"])
+
+
+class AnnotationStore:
+    """
+    Loads the ratings files of each annotator configuration once and keeps the ratings of all loaded configurations in
+    one integer-coded array, so that the agreement of any combination of configurations is computed from a slice of it.
+    With a `cache_dir`, the processed ratings of each model, prompt type and reasoning are memoized in a Parquet file
+    that is reused as long as the ratings files are unchanged (same paths, sizes and modification times).
+    """
+
+    def __init__(self, path, num_annotators, cache_dir=None):
+        self.path = path
+        self.num_annotators = num_annotators
+        self.cache_dir = cache_dir
+        self.annotations = {}
+        self.reliability_data = {}
+        self.data = None
+        self.rows = {}
+
+    def load_annotations(self, model, prompt_type, reasoning):
+        if self.cache_dir is None:
+            return get_annotations(model, prompt_type, reasoning, self.num_annotators, self.path)
+
+        prediction_files = get_prediction_files(self.path, model, prompt_type, reasoning, self.num_annotators)
+        signature = [[os.path.abspath(file), os.stat(file).st_size, os.stat(file).st_mtime_ns]
+                     for file in prediction_files]
+        digest = hashlib.sha256(json.dumps(signature).encode("utf-8")).hexdigest()[:16]
+        name = f"{model}-{prompt_type}{'-reasoning' if reasoning else ''}"
+        cache_file = os.path.join(self.cache_dir, f"{name}-{digest}.parquet")
+
+        if os.path.exists(cache_file):
+            return pd.read_parquet(cache_file)
+
+        annotations = process_files(prediction_files, model, prompt_type, reasoning)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        stale_pattern = glob.escape(name) + "-" + "[0-9a-f]" * 16 + ".parquet"
+        for stale_file in glob.glob(os.path.join(self.cache_dir, stale_pattern)):
+            os.remove(stale_file)
+        annotations.to_parquet(cache_file, index=False)
+        return annotations
+
+    def get_annotations(self, annotator_config):
+        """Annotations of a configuration in the format of calculate_alpha.get_annotations and get_majority."""
+        key = config_key(annotator_config)
+        if key not in self.annotations:
+            model, prompt_type, reasoning, aggregation = key
+            if aggregation == "majority":
+                annotations = self.get_annotations({**annotator_config, "aggregation": None})
+                self.annotations[key] = get_majority(annotations, model, prompt_type, reasoning)
+            else:
+                self.annotations[key] = self.load_annotations(model, prompt_type, reasoning)
+        return self.annotations[key]
+
+    def load(self, annotator_configs):
+        """Adds the annotations of the given configurations to the array of the store."""
+        new_configs = [config for config in annotator_configs if config_key(config) not in self.reliability_data]
+        if not new_configs:
+            return
+
+        for annotator_config in new_configs:
+            annotations = self.get_annotations(annotator_config)
+            self.reliability_data[config_key(annotator_config)] = ReliabilityData.from_annotations(annotations)
+        self.data = ReliabilityData.concat(list(self.reliability_data.values()))
+
+        # Configurations occupy consecutive rows in the order they were loaded.
+        self.rows = {}
+        offset = 0
+        for key, data in self.reliability_data.items():
+            self.rows[key] = range(offset, offset + len(data.annotators))
+            offset += len(data.annotators)
+
+    def select(self, annotator_configs) -> ReliabilityData:
+        self.load(annotator_configs)
+        rows = [row for config in annotator_configs for row in self.rows[config_key(config)]]
+        return self.data.subset(rows)
+
+    def get_alphas(self, annotator_configs):
+        """Same result as calculate_alpha.get_alphas for the configurations."""
+        if not annotator_configs:
+            return {}
+        return compute_alphas(self.select(annotator_configs), QUALITY_DIMENSIONS)
@@ -0,0 +1,125 @@
+"""
+Checks that agreement_service.py keeps the agreements of compute_all_agreements while a ratings file is being written:
+a file that ends in the middle of an argument and of a line is coded without the unfinished argument, and once the
+file is complete the agreements match those of calculate_alpha.get_alphas on the finished files, also after the service
+was restarted from its state. Times an update after an argument was appended against one that codes all files. Run from
+src/python:
+
+    python -m benchmarks.agreement_service --num-arguments 300 --num-annotators 9
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from agreement_service import AGGREGATED_DIMENSIONS, AgreementService
+from benchmarks.alpha import write_ratings
+from calculate_alpha import QUALITY_DIMENSIONS, get_alphas
+
+CONFIGS = [{"annotator": "GPT3", "prompt_type": "expert", "reasoning": False, "aggregation": None},
+           {"annotator": "human", "prompt_type": "expert", "reasoning": False, "aggregation": None},
+           {"annotator": "GPT3", "prompt_type": "expert", "reasoning": False, "aggregation": "majority"}]
+
+BASE_DIMENSIONS = [dimension for dimension in QUALITY_DIMENSIONS if dimension not in AGGREGATED_DIMENSIONS]
+
+
+def rating_lines(arguments, rng):
+    """Lines of a ratings file as predict_argument_quality.py writes them: every base dimension of every argument."""
+    return [json.dumps({"id": f"arg{argument}", "dimension": dimension,
+                        "rating": str(rng.choice(["1", "2", "3", "?"]))}) + "\n"
+            for argument in arguments for dimension in BASE_DIMENSIONS]
+
+
+def settle(path):
+    """Dates the files of a directory back, as if they were written long ago."""
+    for name in os.listdir(path):
+        os.utime(os.path.join(path, name), (time.time() - 3600, time.time() - 3600))
+
+
+def check(service, expected_dir, num_annotators, step):
+    for pair in service.pairs():
+        actual = service.alphas[json.dumps(pair)]
+        expected = get_alphas(list(pair), num_annotators, expected_dir)
+        for dimension in QUALITY_DIMENSIONS:
+            assert np.isclose(actual[dimension], expected[dimension]), (step, pair, dimension, actual, expected)
+    print(f"{step}: agreements of the service match get_alphas")
+
+
+def new_service(path, num_annotators, state_dir):
+    return AgreementService(path, num_annotators, state_dir, CONFIGS, os.path.join(state_dir, "agreements.jsonl"),
+                            settle_time=600)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num-arguments', type=int, default=300)
+    parser.add_argument('-k', '--num-annotators', type=int, default=9)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    with tempfile.TemporaryDirectory() as path:
+        predictions_dir = os.path.join(path, "predictions")
+        expected_dir = os.path.join(path, "expected")
+        os.makedirs(predictions_dir)
+        os.makedirs(expected_dir)
+        write_ratings(predictions_dir, "human", "expert", args.num_annotators, args.num_arguments, rng)
+        write_ratings(predictions_dir, "GPT3", "expert", args.num_annotators, args.num_arguments, rng)
+        settle(predictions_dir)
+        file_name = "GPT3-expert-1.jsonl"
+        for name in os.listdir(predictions_dir):
+            if name != file_name:
+                os.link(os.path.join(predictions_dir, name), os.path.join(expected_dir, name))
+
+        # The first annotator has only rated 5 of the dimensions of the first argument.
+        lines = rating_lines(range(args.num_arguments), rng)
+        with open(os.path.join(predictions_dir, file_name), "w") as out_file:
+            out_file.writelines(lines[:5])
+        state_dir = os.path.join(path, "state")
+        service = new_service(predictions_dir, args.num_annotators, state_dir)
+        service.update()
+        assert not service.alphas
+        print("first argument written halfway: no agreements yet")
+
+        # It stops after 5 of the dimensions of an argument and in the middle of a line.
+        half = len(BASE_DIMENSIONS) * (args.num_arguments // 2)
+        with open(os.path.join(predictions_dir, file_name), "a") as out_file:
+            out_file.writelines(lines[5:half + 5])
+            out_file.write(lines[half + 5][:20])
+        with open(os.path.join(expected_dir, file_name), "w") as out_file:
+            out_file.writelines(lines[:half])
+        service.update()
+        check(service, expected_dir, args.num_annotators, "file written halfway")
+
+        argument_size = len(BASE_DIMENSIONS)
+        with open(os.path.join(predictions_dir, file_name), "a") as out_file:
+            out_file.write(lines[half + 5][20:])
+            out_file.writelines(lines[half + 6:-2 * argument_size])
+        service.update()
+        with open(os.path.join(predictions_dir, file_name), "a") as out_file:
+            out_file.writelines(lines[-2 * argument_size:-argument_size])
+        start_time = time.perf_counter()
+        service.update()
+        update_time = time.perf_counter() - start_time
+
+        # A restarted service reads the files from their start again.
+        service = new_service(predictions_dir, args.num_annotators, state_dir)
+        with open(os.path.join(predictions_dir, file_name), "a") as out_file:
+            out_file.writelines(lines[-argument_size:])
+        service.update()
+        with open(os.path.join(expected_dir, file_name), "w") as out_file:
+            out_file.writelines(lines)
+        check(service, expected_dir, args.num_annotators, "file complete after a restart")
+
+        service = new_service(predictions_dir, args.num_annotators, os.path.join(path, "full-state"))
+        start_time = time.perf_counter()
+        service.update()
+        full_time = time.perf_counter() - start_time
+        check(service, expected_dir, args.num_annotators, "all files coded at once")
+        print(f"update after appending an argument: {update_time:.3f}s, coding all files: {full_time:.3f}s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Checks that the numpy engine of calculate_alpha matches krippendorff.alpha (ordinal) and compares the run times of
+both engines for all pairs of annotator configurations of synthetic ratings files. Run from src/python:
+
+    python -m benchmarks.alpha --num-arguments 300 --num-annotators 10
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from calculate_alpha import QUALITY_DIMENSIONS, get_config_annotations, compute_alphas_of_annotations
+
+
+def write_ratings(path, model, prompt_type, num_annotators, num_arguments, rng):
+    for i in range(num_annotators):
+        with open(os.path.join(path, f"{model}-{prompt_type}-{i + 1}.jsonl"), "w") as out_file:
+            for argument in range(num_arguments):
+                for dimension in QUALITY_DIMENSIONS:
+                    # Leave some ratings out, so that items have different numbers of pairable values.
+                    if rng.random() < 0.05:
+                        continue
+                    rating = str(rng.choice(["1", "2", "3", "?"], p=[0.2, 0.35, 0.4, 0.05]))
+                    out_file.write(json.dumps({"id": f"arg{argument}", "dimension": dimension, "rating": rating}))
+                    out_file.write("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num-arguments', type=int, default=300)
+    parser.add_argument('-k', '--num-annotators', type=int, default=10)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    configs = [{"annotator": "GPT3", "prompt_type": prompt_type, "reasoning": False, "aggregation": aggregation}
+               for prompt_type in ["expert", "novice"] for aggregation in [None, "majority"]]
+
+    with tempfile.TemporaryDirectory() as path:
+        for prompt_type in ["expert", "novice"]:
+            write_ratings(path, "GPT3", prompt_type, args.num_annotators, args.num_arguments, rng)
+
+        annotations = [get_config_annotations(config, args.num_annotators, path) for config in configs]
+
+        run_times = {"numpy": 0.0, "krippendorff": 0.0}
+        max_difference = 0.0
+        for i, annotations_i in enumerate(annotations):
+            for annotations_j in annotations[i + 1:]:
+                alphas = {}
+                for engine in run_times:
+                    start_time = time.time()
+                    for _ in range(args.repeats):
+                        alphas[engine] = compute_alphas_of_annotations([annotations_i, annotations_j], engine)
+                    run_times[engine] += (time.time() - start_time) / args.repeats
+
+                for key, alpha in alphas["krippendorff"].items():
+                    max_difference = max(max_difference, abs(alpha - alphas["numpy"][key]))
+
+    print(f"max. difference: {max_difference:.2e}")
+    for engine, run_time in run_times.items():
+        print(f"{engine}: {run_time:.3f}s")
+    print(f"speedup: {run_times['krippendorff'] / run_times['numpy']:.1f}x")
+    assert max_difference <= 1e-9
+
+
+if __name__ == '__main__':
+    main()
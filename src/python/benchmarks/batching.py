@@ -0,0 +1,95 @@
+"""
+Checks the batches of core.batching.BatchScheduler with a mock model on the CPU: every response is matched with its
+prompt, batches hold the items of one group and stay within the token budget, prompts are issued longest first and in
+the order they were submitted among prompts of the same length, retries follow once all pending prompts were issued,
+and a prompt that fails every time is tried `max_tries` times. Run from src/python:
+
+    python -m benchmarks.batching
+"""
+import argparse
+import random
+from typing import List, Tuple
+
+from core.batching import BatchScheduler
+
+# Decoding settings of the groups: the token budget per group.
+GROUP_BUDGETS = {"answer": 8, "reasoning": 64}
+
+
+class EchoLLM:
+    """Model that answers every prompt with the prompt itself and counts a token per word."""
+
+    def __init__(self):
+        self.generation_kwargs = {"max_new_tokens": 0}
+        self.batches = []
+
+    def count_tokens(self, prompts: List[str]) -> List[int]:
+        return [len(prompt.split()) for prompt in prompts]
+
+    def generate_batch(self, prompts: List[str]) -> Tuple[List[str], int]:
+        self.batches.append(prompts)
+        return list(prompts), len(prompts) * self.generation_kwargs["max_new_tokens"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--num-prompts', type=int, default=2000, help='prompts per group')
+    parser.add_argument('--max-batch-tokens', type=int, default=1024)
+    parser.add_argument('--max-tries', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    llm = EchoLLM()
+    scheduler = BatchScheduler(llm, args.max_batch_tokens, max_batch_size=64, max_tries=args.max_tries)
+
+    # Keys are (group, submission number), prompts of 1 to 40 words. Some prompts fail once, some every time.
+    submitted = {}
+    for group in GROUP_BUDGETS:
+        keys = [(group, i) for i in range(args.num_prompts)]
+        prompts = [f"{group} {i} " + "word " * rng.randint(0, 38) for i in range(args.num_prompts)]
+        submitted.update(zip(keys, prompts))
+        scheduler.submit(keys, prompts, group)
+    fails_once = set(rng.sample(sorted(submitted), len(submitted) // 10))
+    fails_always = set(rng.sample(sorted(submitted.keys() - fails_once), 20))
+
+    prepared = []
+
+    def prepare(group):
+        prepared.append(group)
+        llm.generation_kwargs["max_new_tokens"] = GROUP_BUDGETS[group]
+
+    issued = []
+    tries = {}
+    for batch, responses, stats in scheduler.run(prepare):
+        group = prepared[-1]
+        assert all(item.group == group for item in batch), "a batch mixes groups"
+        assert responses == [item.prompt for item in batch] == [submitted[item.key] for item in batch]
+        assert len(batch) == 1 or stats.padded_tokens + len(batch) * GROUP_BUDGETS[group] <= args.max_batch_tokens
+
+        for item in batch:
+            issued.append(item)
+            tries[item.key] = item.tries
+            failed = item.key in fails_always or (item.key in fails_once and item.tries == 1)
+            if failed and not scheduler.resubmit(item):
+                assert item.tries == args.max_tries, item.tries
+
+    # The first round issues every prompt once: group by group, longest first, in submission order among equal lengths.
+    first_round = [item.key for item in issued[:len(submitted)]]
+    expected = [key for group in GROUP_BUDGETS for key in sorted(
+        (key for key in submitted if key[0] == group), key=lambda key: (-len(submitted[key].split()), key[1]))]
+    assert first_round == expected, "the first round is not in length and submission order"
+    assert all(item.tries > 1 for item in issued[len(submitted):]), "a retry was issued before the first round ended"
+
+    assert all(tries[key] == args.max_tries for key in fails_always)
+    assert all(tries[key] == 2 for key in fails_once)
+    assert all(tries[key] == 1 for key in submitted if key not in fails_once and key not in fails_always)
+    assert len(issued) == len(submitted) + len(fails_once) + (args.max_tries - 1) * len(fails_always)
+
+    print(f"{len(submitted)} prompts in {len(llm.batches)} batches ({len(issued) / len(llm.batches):.1f} prompts per "
+          f"batch): responses matched, groups kept apart, token budget kept, first round in length and submission "
+          f"order, {len(fails_once)} retried once, {len(fails_always)} tried {args.max_tries} times")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Compares the size and load time of ratings and log files in JSONL and Parquet format (core.columnar) on synthetic data.
+Run from src/python:
+
+    python -m benchmarks.columnar --num-arguments 1000 --num-annotators 10
+"""
+import argparse
+import datetime
+import glob
+import json
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.alpha import write_ratings
+from calculate_alpha import QUALITY_DIMENSIONS, process_files
+from core.columnar import convert, prompts_path, read_logs
+
+WORDS = ("the argument is clear and relevant but it lacks sufficient support for its claim about the issue which makes "
+         "it weak overall").split()
+
+
+def write_log(path, num_arguments, rng):
+    templates = ["EXPERT_TEMPLATE", "NOVICE_TEMPLATE", "EXPERT_TEMPLATE_REASONING", "NOVICE_TEMPLATE_REASONING"]
+    arguments = {argument: " ".join(rng.choice(WORDS) for _ in range(rng.randint(50, 300)))
+                 for argument in range(num_arguments)}
+
+    with open(path, "w") as out_file:
+        for template in templates:
+            for argument, text in arguments.items():
+                for dimension in QUALITY_DIMENSIONS:
+                    prompt = f"You are an expert ({template}). Rate the {dimension} of the argument:\n{text}\n"
+                    # Some prompts are retried after an unparseable response.
+                    for tries in range(1, 1 + (2 if rng.random() < 0.1 else 1)):
+                        response = rng.choice(["3 - High", "2", "The argument ...\n### Your answer:\n1", "maybe"])
+                        out_file.write(json.dumps({
+                            "timestamp": datetime.datetime.now().isoformat(),
+                            "model": "LLama213b",
+                            "run_time": rng.random(),
+                            "try": tries,
+                            "id": f"arg{argument}",
+                            "dimension": dimension,
+                            "template": template,
+                            "ratings_file": "LLama213b-expert-1.jsonl",
+                            "prompt": prompt,
+                            "response": response,
+                            "parsed_response": response[-1] if response != "maybe" else None,
+                        }))
+                        out_file.write("\n")
+
+
+def size(paths):
+    return sum(os.path.getsize(path) for path in paths) / 2 ** 20
+
+
+def timed(function, *args):
+    start_time = time.time()
+    function(*args)
+    return time.time() - start_time
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num-arguments', type=int, default=1000)
+    parser.add_argument('-k', '--num-annotators', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as path:
+        write_ratings(path, "GPT3", "expert", args.num_annotators, args.num_arguments, np.random.default_rng(args.seed))
+        jsonl_files = sorted(glob.glob(os.path.join(path, "GPT3-expert-*.jsonl")))
+        parquet_files = [convert(file) for file in jsonl_files]
+
+        print(f"ratings ({len(jsonl_files)} files): JSONL {size(jsonl_files):.2f} MiB, "
+              f"Parquet {size(parquet_files):.2f} MiB")
+        jsonl_time = timed(process_files, jsonl_files, "GPT3", "expert", False)
+        parquet_time = timed(process_files, parquet_files, "GPT3", "expert", False)
+        print(f"  process_files: JSONL {jsonl_time:.3f}s, Parquet {parquet_time:.3f}s")
+
+        log_file = os.path.join(path, "log.jsonl")
+        write_log(log_file, args.num_arguments, random.Random(args.seed))
+        parquet_log_file = convert(log_file)
+
+        print(f"log: JSONL {size([log_file]):.2f} MiB, Parquet {size([parquet_log_file]):.2f} MiB "
+              f"+ prompts {size([prompts_path(parquet_log_file)]):.2f} MiB")
+        jsonl_time = timed(read_logs, log_file)
+        parquet_time = timed(read_logs, parquet_log_file)
+        without_prompts_time = timed(read_logs, parquet_log_file, False)
+        print(f"  read_logs: JSONL {jsonl_time:.3f}s, Parquet {parquet_time:.3f}s, "
+              f"Parquet without prompts {without_prompts_time:.3f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Checks that decoding with HFModel.stop_at_rating returns the ratings of full decoding and compares the generated
+tokens and run time. Decoding is greedy, so that a stopped response is a prefix of the full one. A small model rarely
+answers with a rating, so `--rating-bias` raises the logits of the rating tokens at the first generated position of
+every other prompt. Run from src/python, e.g. on the CPU with a small model:
+
+    python -m benchmarks.early_stop --model <small-model> --device-map cpu
+"""
+import argparse
+import time
+
+from core.data import load_arguments, load_dimension_definitions
+from core.llm import HFModel
+from core.parsing import parse_response
+from core.prompts import PromptTemplate, materialize
+
+
+class FirstTokenBias:
+    """Logits processor that raises the rating tokens at the first position of every other sequence of a generation."""
+
+    def __init__(self, token_ids, bias):
+        self.token_ids = token_ids
+        self.bias = bias
+        self.previous = None
+
+    def __call__(self, input_ids, scores):
+        import torch
+
+        first = (self.previous is None or self.previous.shape != (input_ids.shape[0], input_ids.shape[1] - 1)
+                 or not torch.equal(self.previous, input_ids[:, :-1]))
+        self.previous = input_ids
+        if first:
+            rows = (input_ids.sum(dim=1) % 2 == 0).nonzero().flatten()
+            for row in rows.tolist():
+                scores[row, self.token_ids] += self.bias
+        return scores
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', type=str, required=True, help='name or path of a Hugging Face causal language model')
+    parser.add_argument('--device-map', type=str, default="cpu")
+    parser.add_argument('--arguments', type=str, default="data/arguments.tsv")
+    parser.add_argument('--dimensions', type=str, default="data/dimensions_definitions.jsonl")
+    parser.add_argument('-n', '--num_arguments', type=int, default=2)
+    parser.add_argument('--max-new-tokens', type=int, default=64)
+    parser.add_argument('--rating-bias', type=float, default=100.0)
+    args = parser.parse_args()
+
+    llm = HFModel(args.model, device_map=args.device_map)
+    rating_token_ids = [token_id for ids in llm.get_rating_token_ids().values() for token_id in ids]
+    llm.generation_kwargs = {
+        "do_sample": False,
+        "num_return_sequences": 1,
+        "eos_token_id": llm.tokenizer.eos_token_id,
+        "max_new_tokens": args.max_new_tokens,
+        "logits_processor": [FirstTokenBias(rating_token_ids, args.rating_bias)]
+    }
+
+    arguments = load_arguments(args.arguments)[:args.num_arguments]
+    dimensions = load_dimension_definitions(args.dimensions)
+    templates = [PromptTemplate.EXPERT_TEMPLATE, PromptTemplate.NOVICE_TEMPLATE]
+    prompts = materialize(arguments, dimensions, templates).prompts
+
+    for method in ["generate_all", "generate_all_shared_prefix", "generate_batch"]:
+        responses = {}
+        run_times = {}
+        for stop_at_rating in [False, True]:
+            llm.stop_at_rating = stop_at_rating
+            start_time = time.time()
+            if method == "generate_all_shared_prefix":
+                # The prompts of the dimensions of an argument share a prefix.
+                responses[stop_at_rating] = [response for start in range(0, len(prompts), len(dimensions))
+                                             for response in llm.generate_all_shared_prefix(
+                                                 prompts[start:start + len(dimensions)])]
+            elif method == "generate_all":
+                responses[stop_at_rating] = llm.generate_all(prompts)
+            else:
+                responses[stop_at_rating] = [response for start in range(0, len(prompts), 8)
+                                             for response in llm.generate_batch(prompts[start:start + 8])[0]]
+            run_times[stop_at_rating] = time.time() - start_time
+
+        for full, stopped in zip(responses[False], responses[True]):
+            assert parse_response(stopped) == parse_response(full), (stopped, full)
+            assert full.startswith(stopped), (stopped, full)
+
+        tokens = {stop_at_rating: sum(len(llm.tokenizer(response, add_special_tokens=False)["input_ids"])
+                                      for response in responses[stop_at_rating]) for stop_at_rating in [False, True]}
+        num_rated = sum(parse_response(response) is not None for response in responses[True])
+        print(f"{method}: {len(prompts)} prompts, {num_rated} rated, identical ratings")
+        for stop_at_rating, mode in [(False, "full"), (True, "stop at rating")]:
+            print(f"  {mode:<15} {tokens[stop_at_rating]:>7} generated tokens  {run_times[stop_at_rating]:8.2f}s")
+
+
+if __name__ == '__main__':
+    main()
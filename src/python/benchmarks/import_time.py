@@ -0,0 +1,51 @@
+"""
+Measures the import time of the entry points that only parse responses or load data, each in a fresh interpreter, and
+asserts that none of them imports the libraries of the model backends. Run from src/python:
+
+    python -m benchmarks.import_time
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+MODULES = ["core.parsing", "core.data", "core.llm", "parse_palm_responses", "predict_argument_quality"]
+
+BACKEND_LIBRARIES = ["torch", "transformers", "openai"]
+
+IMPORT_CODE = """
+import json, sys, time
+start_time = time.perf_counter()
+import {module}
+run_time = time.perf_counter() - start_time
+print(json.dumps({{"run_time": run_time, "loaded": [name for name in {libraries} if name in sys.modules]}}))
+"""
+
+
+def measure_import(module: str) -> dict:
+    code = IMPORT_CODE.format(module=module, libraries=BACKEND_LIBRARIES)
+    src_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    result = subprocess.run([sys.executable, "-c", code], cwd=src_dir, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    for module in MODULES:
+        measurements = [measure_import(module) for _ in range(args.repeats)]
+        run_time = statistics.median(measurement["run_time"] for measurement in measurements)
+        print(f"{module:<28} {run_time * 1000:8.1f}ms")
+
+        loaded = measurements[0]["loaded"]
+        assert len(loaded) == 0, f"Importing {module} loads {', '.join(loaded)}"
+
+    print(f"No entry point imports {', '.join(BACKEND_LIBRARIES)}.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Compares the loading options of HFModel (dtype, int8 quantization, safetensors) by the load time and the peak resident
+set size, and checks that each loaded model generates. Every option is loaded in a fresh process, so that the peak
+RSS of one load does not hide the next. The RSS includes the pages of memory-mapped safetensors files that were read,
+which the kernel can drop again under memory pressure. Run from src/python, e.g. on the CPU:
+
+    python -m benchmarks.model_load --model <model> --device-map cpu
+    python -m benchmarks.model_load --model meta-llama/Llama-2-7b-hf --options dtype=bfloat16 \\
+        dtype=bfloat16,quantize=int8 --output model-load.json
+"""
+import argparse
+import importlib
+import json
+import subprocess
+import sys
+import time
+
+from core.metrics import peak_rss
+
+DEFAULT_OPTIONS = ["dtype=float32", "dtype=float16", "dtype=bfloat16", "dtype=bfloat16,safetensors=true",
+                   "dtype=bfloat16,quantize=int8"]
+
+PROMPT = "How would you rate the clarity of the argument? Answer with 1 (low), 2 (medium) or 3 (high).\nAnswer:"
+
+
+def parse_options(options: str) -> dict:
+    """Parses keyword arguments of HFModel such as "dtype=bfloat16,quantize=int8"."""
+    kwargs = {}
+    for option in options.split(","):
+        name, _, value = option.partition("=")
+        kwargs[name] = value.lower() == "true" if name == "safetensors" else value
+    return kwargs
+
+
+def load(model, device_map, options, max_new_tokens):
+    """Loads and runs the model with the options in this process and returns the measurements."""
+    from core.llm import HFModel
+
+    # The libraries are imported before the baseline is measured, so that it only leaves out the model.
+    for library in ["torch", "transformers"]:
+        importlib.import_module(library)
+    baseline_rss = peak_rss()
+    start_time = time.perf_counter()
+    llm = HFModel(model, device_map=device_map, **parse_options(options))
+    load_time = time.perf_counter() - start_time
+    load_rss = peak_rss()
+
+    llm.generation_kwargs = {"do_sample": False, "num_return_sequences": 1, "max_new_tokens": max_new_tokens,
+                             "eos_token_id": llm.tokenizer.eos_token_id}
+    start_time = time.perf_counter()
+    response = llm.generate(PROMPT)
+    generate_time = time.perf_counter() - start_time
+
+    return {"options": options, "load_seconds": load_time, "baseline_rss": baseline_rss, "load_rss": load_rss,
+            "generate_seconds": generate_time, "generate_rss": peak_rss(), "response": response}
+
+
+def gib(size):
+    return f"{size / 2 ** 30:8.2f}" if size is not None else "       -"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', type=str, required=True, help='name or path of a Hugging Face causal language model')
+    parser.add_argument('--device-map', type=str, default="cpu")
+    parser.add_argument('--options', type=str, nargs="+", default=DEFAULT_OPTIONS,
+                        help='comma-separated keyword arguments of HFModel to compare per load, e.g. '
+                             'dtype=bfloat16,quantize=int8')
+    parser.add_argument('--max-new-tokens', type=int, default=16)
+    parser.add_argument('--output', type=str, default=None, help='JSON file to write the results to')
+    parser.add_argument('--child', type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        print(json.dumps(load(args.model, args.device_map, args.child, args.max_new_tokens)))
+        return
+
+    results = []
+    print(f"{'options':<32} {'load (s)':>9} {'base GiB':>8} {'load GiB':>8} {'gen (s)':>8}  response")
+    for options in args.options:
+        process = subprocess.run([sys.executable, "-m", "benchmarks.model_load", "--model", args.model,
+                                  "--device-map", args.device_map, "--max-new-tokens", str(args.max_new_tokens),
+                                  "--child", options], capture_output=True, text=True)
+        if process.returncode != 0:
+            print(f"{options:<32} failed: {process.stderr.strip().splitlines()[-1:]}")
+            continue
+
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+        results.append(result)
+        print(f"{options:<32} {result['load_seconds']:9.2f} {gib(result['baseline_rss'])} {gib(result['load_rss'])} "
+              f"{result['generate_seconds']:8.2f}  {result['response'][:40]!r}")
+
+    if args.output is not None:
+        with open(args.output, "w") as out_file:
+            json.dump({"model": args.model, "device_map": args.device_map, "results": results}, out_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+"""
+End-to-end check of the Batch API mode of predict_argument_quality.py against a local stub of the OpenAI file and batch
+endpoints. A first run only submits the batches, a second run with --resume collects them (without submitting them
+again) and retries unparseable or failed requests in further batches, and a third run finds nothing left to do. Run
+from src/python:
+
+    python -m benchmarks.openai_batch
+"""
+import argparse
+import email.parser
+import hashlib
+import itertools
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import predict_argument_quality
+from core.data import load_arguments, load_dimension_definitions
+
+
+def stub_response(prompt, attempt):
+    # Some prompts fail or get an unparseable response on their first attempt.
+    value = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest(), 16)
+    if attempt == 1 and value % 7 == 0:
+        return None
+    if attempt == 1 and value % 5 == 0:
+        return "I cannot rate this argument."
+    return ["1 - Low", "2 - Medium", "3 - High", "? - Cannot judge"][value % 4]
+
+
+class BatchStub:
+    """Files and batches of the stub server. A batch completes once it was retrieved `polls` times."""
+
+    def __init__(self, polls):
+        self.polls = polls
+        self.files = {}
+        self.batches = {}
+        self.attempts = {}
+        self.ids = itertools.count()
+        self.lock = threading.Lock()
+
+    def new_id(self, prefix):
+        return f"{prefix}-{next(self.ids)}"
+
+    def add_file(self, content, purpose):
+        file_id = self.new_id("file")
+        self.files[file_id] = content
+        return {"id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                "filename": f"{file_id}.jsonl", "purpose": purpose, "status": "processed"}
+
+    def create_batch(self, request):
+        batch = {"id": self.new_id("batch"), "object": "batch", "endpoint": request["endpoint"],
+                 "input_file_id": request["input_file_id"], "completion_window": request["completion_window"],
+                 "status": "validating", "created_at": int(time.time()), "output_file_id": None,
+                 "error_file_id": None, "errors": None, "polls": 0}
+        self.batches[batch["id"]] = batch
+        return batch
+
+    def retrieve_batch(self, batch_id):
+        batch = self.batches[batch_id]
+        batch["polls"] += 1
+        if batch["status"] != "completed":
+            batch["status"] = "in_progress"
+        if batch["polls"] >= self.polls and batch["status"] != "completed":
+            self.run_batch(batch)
+        return batch
+
+    def run_batch(self, batch):
+        outputs, errors = [], []
+        for line in self.files[batch["input_file_id"]].decode("utf-8").splitlines():
+            request = json.loads(line)
+            prompt = request["body"]["messages"][0]["content"]
+            self.attempts[prompt] = self.attempts.get(prompt, 0) + 1
+            response = stub_response(prompt, self.attempts[prompt])
+            if response is None:
+                errors.append({"id": self.new_id("request"), "custom_id": request["custom_id"],
+                               "response": {"status_code": 500, "body": {"error": {"message": "stub error"}}},
+                               "error": None})
+                continue
+            body = {"id": self.new_id("completion"), "object": "chat.completion", "created": int(time.time()),
+                    "model": request["body"]["model"],
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": response}}]}
+            outputs.append({"id": self.new_id("request"), "custom_id": request["custom_id"],
+                            "response": {"status_code": 200, "body": body}, "error": None})
+
+        batch["output_file_id"] = self.add_file("".join(json.dumps(o) + "\n" for o in outputs).encode(),
+                                                "batch_output")["id"]
+        if errors:
+            batch["error_file_id"] = self.add_file("".join(json.dumps(e) + "\n" for e in errors).encode(),
+                                                   "batch_output")["id"]
+        batch["status"] = "completed"
+
+
+def make_handler(stub):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def reply(self, data, content_type="application/json"):
+            if not isinstance(data, bytes):
+                data = json.dumps({key: value for key, value in data.items() if key != "polls"}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            with stub.lock:
+                if self.path == "/v1/files":
+                    message = email.parser.BytesParser().parsebytes(
+                        f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body)
+                    fields = {part.get_param("name", header="content-disposition"): part.get_payload(decode=True)
+                              for part in message.get_payload()}
+                    self.reply(stub.add_file(fields["file"], fields["purpose"].decode()))
+                elif self.path == "/v1/batches":
+                    self.reply(stub.create_batch(json.loads(body)))
+                else:
+                    self.send_error(404)
+
+        def do_GET(self):
+            with stub.lock:
+                match = re.fullmatch(r"/v1/files/([^/]+)/content", self.path)
+                if match is not None:
+                    self.reply(stub.files[match.group(1)], "application/octet-stream")
+                elif self.path.startswith("/v1/batches/"):
+                    self.reply(stub.retrieve_batch(self.path[len("/v1/batches/"):]))
+                else:
+                    self.send_error(404)
+
+    return Handler
+
+
+def run_predict(argv):
+    sys.argv = ["predict_argument_quality.py"] + argv
+    predict_argument_quality.main(predict_argument_quality.parse_args())
+
+
+def read_ratings(path):
+    with open(path) as ratings_file:
+        return [json.loads(line) for line in ratings_file]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--arguments', type=str, default="data/arguments.tsv")
+    parser.add_argument('--dimensions', type=str, default="data/dimensions_definitions.jsonl")
+    parser.add_argument('--polls', type=int, default=3, help='status requests until a stub batch completes')
+    args = parser.parse_args()
+
+    num_prompts = len(load_arguments(args.arguments)) * len(load_dimension_definitions(args.dimensions))
+    stub = BatchStub(args.polls)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(stub))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    os.environ["OPENAI_API_KEY"] = "stub"
+
+    work_dir = tempfile.mkdtemp()
+    os.makedirs(os.path.join(work_dir, "data"))
+    shutil.copy(args.arguments, os.path.join(work_dir, "data/arguments.tsv"))
+    shutil.copy(args.dimensions, os.path.join(work_dir, "data/dimensions_definitions.jsonl"))
+    current_dir = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        options = ["-m", "GPT3", "--openai-batch", "--poll-interval", "0.01"]
+
+        run_predict(options + ["--batch-submit-only"])
+        assert len(stub.batches) == 4 and all(batch["polls"] == 0 for batch in stub.batches.values())
+        print(f"submit only: {len(stub.batches)} batches submitted")
+
+        start_time = time.time()
+        run_predict(options + ["--resume"])
+        run_time = time.time() - start_time
+        num_batches = len(stub.batches)
+        assert all(batch["status"] == "completed" for batch in stub.batches.values())
+
+        for file_name in sorted(os.listdir("data/ratings")):
+            ratings = read_ratings(os.path.join("data/ratings", file_name))
+            keys = [(rating["id"], rating["dimension"]) for rating in ratings]
+            assert len(keys) == len(set(keys)) == num_prompts, file_name
+            assert all(rating["rating"] in ["1", "2", "3", "?"] for rating in ratings), file_name
+        print(f"resume: {num_batches - 4} retry batches, {sum(stub.attempts.values())} requests for "
+              f"{4 * num_prompts} prompts, {run_time:.2f}s")
+
+        run_predict(options + ["--resume"])
+        assert len(stub.batches) == num_batches
+        assert all(len(read_ratings(os.path.join("data/ratings", file_name))) == num_prompts
+                   for file_name in os.listdir("data/ratings"))
+        print("resume again: no batches submitted, ratings unchanged")
+    finally:
+        os.chdir(current_dir)
+        server.shutdown()
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+"""
+Checks the concurrent OpenAI client of core.llm.OpenAIModel against a local stub of the chat completions endpoint: the
+number of requests in flight stays at `max_concurrency`, requests that fail with 429 or 503 are retried, requests that
+fail with another client error are not (nor any request with `max_retries=1`), and the request and token buckets pace
+the requests. Run from src/python:
+
+    python -m benchmarks.openai_client
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from core.llm import OpenAIModel
+from core.rate_limit import TokenBucket
+
+BAD_REQUEST_PROMPT = "This prompt is rejected."
+
+
+class CompletionStub:
+    """
+    Chat completions of the stub server. Some prompts fail with a rate limit or a server error on their first attempt,
+    the bad request prompt always fails with 400.
+    """
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.attempts = {}
+        self.start_times = []
+
+    def status(self, prompt):
+        value = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest(), 16)
+        if prompt == BAD_REQUEST_PROMPT:
+            return 400
+        if self.attempts[prompt] == 1 and value % 5 == 0:
+            return 429
+        if self.attempts[prompt] == 1 and value % 7 == 0:
+            return 503
+        return 200
+
+    def complete(self, request):
+        prompt = request["messages"][0]["content"]
+        with self.lock:
+            self.attempts[prompt] = self.attempts.get(prompt, 0) + 1
+            self.start_times.append(time.monotonic())
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            status = self.status(prompt)
+
+        try:
+            if status != 200:
+                return status, {"error": {"message": f"stub error {status}", "type": "stub", "code": None}}
+            time.sleep(self.latency)
+            return status, {"id": "completion", "object": "chat.completion", "created": int(time.time()),
+                            "model": request["model"],
+                            "choices": [{"index": i, "finish_reason": "stop",
+                                         "message": {"role": "assistant", "content": f"3 - High ({prompt})"}}
+                                        for i in range(request.get("n", 1))],
+                            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": 4,
+                                      "total_tokens": len(prompt) // 4 + 4}}
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def reset(self):
+        self.max_in_flight = 0
+        self.attempts = {}
+        self.start_times = []
+
+
+def make_handler(stub):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            if self.path != "/v1/chat/completions":
+                self.send_error(404)
+                return
+
+            status, body = stub.complete(request)
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            if status == 429:
+                self.send_header("retry-after", "0")
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+
+def check_concurrency(model, stub, num_prompts):
+    prompts = [f"Rate argument {i}." for i in range(num_prompts)]
+    start_time = time.perf_counter()
+    responses = model.generate_all(prompts)
+    run_time = time.perf_counter() - start_time
+
+    assert responses == [f"3 - High ({prompt})" for prompt in prompts]
+    assert stub.max_in_flight <= model.max_concurrency, stub.max_in_flight
+    num_retried = sum(attempts > 1 for attempts in stub.attempts.values())
+    assert num_retried > 0 and all(attempts <= 2 for attempts in stub.attempts.values())
+    print(f"concurrency: {num_prompts} prompts in {run_time:.2f}s, at most {stub.max_in_flight} requests in flight "
+          f"(max_concurrency {model.max_concurrency}), {num_retried} retried after a 429 or 503")
+
+
+def check_bad_request(model, stub):
+    import openai
+
+    try:
+        model.generate(BAD_REQUEST_PROMPT)
+    except openai.BadRequestError:
+        pass
+    else:
+        raise AssertionError("a bad request must fail")
+    assert stub.attempts[BAD_REQUEST_PROMPT] == 1, stub.attempts[BAD_REQUEST_PROMPT]
+    print("bad request: failed after 1 attempt")
+
+
+def check_single_attempt(base_url, stub):
+    import openai
+
+    try:
+        OpenAIModel("stub-model", max_retries=0, base_url=base_url)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("max_retries below 1 must be rejected")
+
+    model = OpenAIModel("stub-model", max_retries=1, base_url=base_url)
+    prompt = next(prompt for prompt in (f"Rate argument {i} once." for i in range(1000))
+                  if int(hashlib.sha256(prompt.encode("utf-8")).hexdigest(), 16) % 5 == 0)
+    try:
+        model.generate(prompt)
+    except openai.RateLimitError:
+        pass
+    else:
+        raise AssertionError("a rate limited request must fail without retries")
+    assert stub.attempts[prompt] == 1, stub.attempts[prompt]
+    print("max_retries 0: rejected, max_retries 1: a rate limited request failed after 1 attempt")
+
+
+def check_pacing(model, stub, requests_per_second):
+    # Buckets that hold a single request, so that the requests are paced from the start.
+    model.request_bucket = TokenBucket(requests_per_second * 60, capacity=1)
+    prompts = [f"Pace argument {i}." for i in range(int(requests_per_second) * 2)]
+    model.generate_all(prompts)
+    model.request_bucket = None
+
+    gaps = [end - start for start, end in zip(stub.start_times, stub.start_times[1:])]
+    expected_time = (len(prompts) - 1) / requests_per_second
+    actual_time = stub.start_times[-1] - stub.start_times[0]
+    assert actual_time >= 0.9 * expected_time, (actual_time, expected_time)
+    print(f"request bucket: {len(prompts)} requests over {actual_time:.2f}s ({requests_per_second:g}/s, "
+          f"shortest gap {min(gaps) * 1000:.0f}ms)")
+
+    stub.reset()
+    tokens = model.estimate_tokens(prompts[0])
+    model.token_bucket = TokenBucket(tokens * requests_per_second * 60, capacity=tokens)
+    model.generate_all(prompts)
+    model.token_bucket = None
+
+    actual_time = stub.start_times[-1] - stub.start_times[0]
+    assert actual_time >= 0.9 * expected_time, (actual_time, expected_time)
+    print(f"token bucket: {len(prompts)} requests of {tokens} tokens over {actual_time:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--num-prompts', type=int, default=200)
+    parser.add_argument('--max-concurrency', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds the stub takes per completion')
+    parser.add_argument('--requests-per-second', type=float, default=10)
+    args = parser.parse_args()
+
+    stub = CompletionStub(args.latency)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(stub))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["OPENAI_API_KEY"] = "stub"
+    try:
+        base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+        model = OpenAIModel("stub-model", max_concurrency=args.max_concurrency, base_url=base_url)
+        check_concurrency(model, stub, args.num_prompts)
+        stub.reset()
+        check_bad_request(model, stub)
+        stub.reset()
+        check_single_attempt(base_url, stub)
+        stub.reset()
+        check_pacing(model, stub, args.requests_per_second)
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
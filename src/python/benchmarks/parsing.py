@@ -0,0 +1,99 @@
+"""
+Differential check and benchmark of core.parsing.parse_responses against parse_response: both must return the same
+rating for random adversarial responses, generated reasoning responses and, if given, the responses of log files.
+parse_responses reaches about 10x the throughput of parse_response on reasoning responses and on short responses that
+start with a rating, but only about 5-7x on the adversarial ones: these are a few characters long and mostly have no
+rating at all, so the interpreter overhead per response dominates both parsers. Timings of a single run vary a lot on
+shared machines, so the best of `--repeat` runs is reported. Run from src/python:
+
+    python -m benchmarks.parsing --num-responses 100000 --logs data/logs/*.jsonl
+"""
+import argparse
+import json
+import random
+import time
+
+from core.parsing import parse_response, parse_responses
+
+PIECES = ["1", "2", "3", "?", "0", "4", "-", " - ", " -", "- ", "High", "Medium", "Low", "Cannot judge", "Cannot",
+          "### Your answer:\n", "### Your answer:", "\n", " ", "\t", " ", " ", "\x1c", "Rating: ",
+          "The argument", " is ", "clear", ".", "**", "#"]
+
+WORDS = ("the argument is clear and relevant but it lacks sufficient support for its claim about the issue which makes "
+         "it weak overall").split()
+
+
+def adversarial_response(rng):
+    return "".join(rng.choice(PIECES) for _ in range(rng.randint(0, 12)))
+
+
+def reasoning_response(rng):
+    text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(80, 200)))
+    rating = rng.choice(["1", "2", "3", "?", "2 - Medium", "3 - High", "1 - Low", "? - Cannot judge"])
+    kind = rng.random()
+    if kind < 0.4:
+        return f"{text}\n### Your answer:\n{rating}"
+    if kind < 0.6:
+        return f"Reasoning: {text} I would rate it {rating}."
+    if kind < 0.8:
+        return f"{rating}\n{text}"
+    return text
+
+
+def read_responses(file_names):
+    for file_name in file_names:
+        with open(file_name) as in_file:
+            for line in in_file:
+                yield json.loads(line)["response"]
+
+
+def timed(function, repeat):
+    """The result of the function and its best run time of `repeat` runs."""
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start_time)
+    return result, min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--num-responses', type=int, default=100000)
+    parser.add_argument('--logs', type=str, nargs="*", default=[], help='log files with a response field per line')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs of each parser, the best one counts')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    response_sets = {
+        "adversarial": [adversarial_response(rng) for _ in range(args.num_responses)],
+        "reasoning": [reasoning_response(rng) for _ in range(args.num_responses)],
+        "short": [rng.choice(["2", "2 - Medium", " 3 - High", "?", "1 - Low"]) for _ in range(args.num_responses)]
+    }
+    if args.logs:
+        response_sets["logs"] = list(read_responses(args.logs))
+
+    num_mismatches = 0
+    for name, responses in response_sets.items():
+        expected, reference_time = timed(lambda: [parse_response(response) for response in responses], args.repeat)
+        parsed, batch_time = timed(lambda: list(parse_responses(responses)), args.repeat)
+
+        mismatches = [(response, rating, result) for response, rating, result in zip(responses, expected, parsed)
+                      if rating != result.rating]
+        for response, rating, result in mismatches[:10]:
+            print(f"mismatch: {response!r}: {rating!r} != {result}")
+        num_mismatches += len(mismatches)
+
+        rules = {}
+        for result in parsed:
+            rules[result.rule] = rules.get(result.rule, 0) + 1
+
+        print(f"{name}: {len(responses)} responses, {len(mismatches)} mismatches, rules: {rules}")
+        print(f"  parse_response: {reference_time:.3f}s, parse_responses: {batch_time:.3f}s, "
+              f"speedup: {reference_time / batch_time:.1f}x")
+    assert num_mismatches == 0
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Compares the prefill work and run time of the pipeline call of HFModel.generate_all with the shared-prefix generation
+for the prompts of the dimensions of each argument. Run from src/python, e.g. on the CPU with a small model:
+
+    python -m benchmarks.prefix_cache --model <small-model> --device-map cpu
+"""
+import argparse
+import time
+
+from core.llm import HFModel, common_prefix_length
+from core.prompts import PromptTemplate
+from predict_argument_quality import load_arguments, load_dimension_definitions, get_prompt_builder
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', type=str, required=True, help='name or path of a Hugging Face causal language model')
+    parser.add_argument('--device-map', type=str, default="cpu")
+    parser.add_argument('--arguments', type=str, default="data/arguments.tsv")
+    parser.add_argument('--dimensions', type=str, default="data/dimensions_definitions.jsonl")
+    parser.add_argument('-n', '--num_arguments', type=int, default=3)
+    parser.add_argument('--max-new-tokens', type=int, default=8)
+    args = parser.parse_args()
+
+    llm = HFModel(args.model, device_map=args.device_map)
+    # Greedy decoding, so that both generation modes must produce the same responses.
+    llm.generation_kwargs = {
+        "do_sample": False,
+        "num_return_sequences": 1,
+        "eos_token_id": llm.tokenizer.eos_token_id,
+        "max_new_tokens": args.max_new_tokens
+    }
+
+    arguments = load_arguments(args.arguments)[:args.num_arguments]
+    dimensions = load_dimension_definitions(args.dimensions)
+
+    for prompt_template in [PromptTemplate.EXPERT_TEMPLATE, PromptTemplate.NOVICE_TEMPLATE]:
+        prompt_builder, _ = get_prompt_builder(prompt_template)
+        prefill_tokens = {"pipeline": 0, "shared-prefix": 0}
+        run_times = {"pipeline": 0.0, "shared-prefix": 0.0}
+        num_identical = 0
+        num_prompts = 0
+
+        for argument in arguments:
+            prompts = [prompt_builder.build(argument, dimension) for dimension in dimensions]
+            input_ids = llm.tokenizer(prompts)["input_ids"]
+            prefix_length = min(common_prefix_length(input_ids), min(len(ids) for ids in input_ids) - 1)
+
+            prefill_tokens["pipeline"] += sum(len(ids) for ids in input_ids)
+            prefill_tokens["shared-prefix"] += prefix_length + sum(len(ids) - prefix_length for ids in input_ids)
+
+            responses = {}
+            for mode, prefix_caching in [("pipeline", False), ("shared-prefix", True)]:
+                llm.prefix_caching = prefix_caching
+                start_time = time.time()
+                responses[mode] = llm.generate_all(prompts)
+                run_times[mode] += time.time() - start_time
+
+            num_identical += sum(a == b for a, b in zip(responses["pipeline"], responses["shared-prefix"]))
+            num_prompts += len(prompts)
+
+        print(f"{prompt_template.name} ({len(arguments)} arguments, {num_prompts} prompts):")
+        for mode in ["pipeline", "shared-prefix"]:
+            print(f"  {mode:<14} {prefill_tokens[mode]:>8} prefill tokens  {run_times[mode]:8.2f}s")
+        print(f"  prefill reduction {prefill_tokens['pipeline'] / prefill_tokens['shared-prefix']:.1f}x, "
+              f"speedup {run_times['pipeline'] / run_times['shared-prefix']:.1f}x, "
+              f"{num_identical}/{num_prompts} identical responses")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Differential check and benchmark of the compiled prompt templates: PromptBuilder.build and materialize must return
+the prompts of the original double formatting (`reference_build`) for the arguments and dimensions of the data files,
+random arguments with braces in their text and builders with custom knowledge. Run from src/python:
+
+    python -m benchmarks.prompts --repeat 20 --tokenizer <hf-model>
+"""
+import argparse
+import random
+import time
+
+from core.argument import Argument
+from core.data import load_arguments, load_dimension_definitions
+from core.prompts import PromptTemplate, create_prompt_builder, materialize
+
+PIECES = ["word", " ", "\n", "{", "}", "{{", "}}", "{issue}", "{argument}", "{0}", "{}", "{dimension}", "{x!r}",
+          "{issue:>5}", "ü", "### Your answer:"]
+
+
+def reference_build(prompt_builder, argument, dimension):
+    # PromptBuilder.build before the templates were compiled.
+    considered_types = prompt_builder.default_types
+    if prompt_builder.custom_types is not None:
+        considered_types = prompt_builder.custom_types
+
+    knowledge_types = ""
+
+    for knowledge_type in considered_types:
+        if knowledge_types != "":
+            knowledge_types += "\n\n"
+
+        knowledge_types += knowledge_type
+
+    variables = {**argument.__dict__, **dimension.__dict__}
+    prompt = prompt_builder.prompt_template.value.format(knowledge_types=knowledge_types, **variables)
+    return prompt.format(**variables)
+
+
+def outcome(build, *args):
+    try:
+        return build(*args)
+    except Exception as error:
+        return type(error)
+
+
+def random_text(rng):
+    return "".join(rng.choice(PIECES) for _ in range(rng.randint(0, 6)))
+
+
+def random_argument(rng, i):
+    return Argument(f"arg{i}", random_text(rng), random_text(rng), random_text(rng), random_text(rng))
+
+
+def get_builders(rng):
+    builders = [create_prompt_builder(prompt_template) for prompt_template in PromptTemplate]
+    for prompt_template in PromptTemplate:
+        builder = create_prompt_builder(prompt_template)
+        for _ in range(rng.randint(1, 4)):
+            builder.with_knowledge(rng.choice(["", "### Issue:\n{issue}", "{argument} {question}", "{unknown}",
+                                               random_text(rng)]))
+        builders.append(builder)
+    return builders
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--arguments', type=str, default="data/arguments.tsv")
+    parser.add_argument('--dimensions', type=str, default="data/dimensions_definitions.jsonl")
+    parser.add_argument('-n', '--num-random', type=int, default=2000, help='number of random arguments')
+    parser.add_argument('--repeat', type=int, default=10, help='number of timed passes over the data files')
+    parser.add_argument('--tokenizer', type=str, help='name or path of a Hugging Face tokenizer for materialize')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    arguments = load_arguments(args.arguments)
+    dimensions = load_dimension_definitions(args.dimensions)
+
+    num_checked = 0
+    random_arguments = [random_argument(rng, i) for i in range(args.num_random)]
+    for builder in get_builders(rng):
+        for argument in arguments + random_arguments:
+            for dimension in dimensions:
+                expected = outcome(reference_build, builder, argument, dimension)
+                actual = outcome(builder.build, argument, dimension)
+                assert actual == expected, (builder.prompt_template.name, argument, dimension, actual, expected)
+                num_checked += 1
+    print(f"build: {num_checked} prompts identical to the reference")
+
+    templates = list(PromptTemplate)
+    matrix = materialize(arguments, dimensions, templates)
+    for t, prompt_template in enumerate(templates):
+        builder = create_prompt_builder(prompt_template)
+        for a, argument in enumerate(arguments):
+            for d, dimension in enumerate(dimensions):
+                assert matrix[t, a, d] == reference_build(builder, argument, dimension)
+    print(f"materialize: {len(matrix)} prompts {matrix.shape} identical to the reference")
+
+    # Each timed pass starts with new builders, so that it includes compiling the templates.
+    run_times = {}
+    for mode in ["reference", "build", "materialize"]:
+        start_time = time.perf_counter()
+        for _ in range(args.repeat):
+            if mode == "materialize":
+                materialize(arguments, dimensions, templates)
+                continue
+            for prompt_template in templates:
+                builder = create_prompt_builder(prompt_template)
+                for argument in arguments:
+                    for dimension in dimensions:
+                        if mode == "build":
+                            builder.build(argument, dimension)
+                        else:
+                            reference_build(builder, argument, dimension)
+        run_times[mode] = time.perf_counter() - start_time
+        print(f"  {mode:<12} {run_times[mode]:8.3f}s for {args.repeat} x {len(matrix)} prompts "
+              f"({run_times['reference'] / run_times[mode]:.1f}x)")
+
+    if args.tokenizer:
+        from transformers import AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
+        start_time = time.perf_counter()
+        matrix = materialize(arguments, dimensions, templates, tokenizer=tokenizer)
+        run_time = time.perf_counter() - start_time
+        input_ids = tokenizer(matrix.prompts)["input_ids"]
+        assert all(list(matrix.token_ids(i)) == ids for i, ids in enumerate(input_ids))
+        print(f"tokenized materialize: {run_time:.3f}s, {len(matrix.input_ids)} tokens "
+              f"({matrix.input_ids.nbytes + matrix.offsets.nbytes} bytes)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Checks that predict_argument_quality.py --resume continues the sweep that was interrupted: after a complete first sweep,
+a second sweep fails partway through its templates (or while the model is loaded), and the resumed run completes every
+ratings file of the second sweep while the files of the first stay as they are, also with several --samples. Runs a
+mock LLM on synthetic data (benchmarks.synthetic) in a temporary directory. Run from src/python:
+
+    python -m benchmarks.resume
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import predict_argument_quality
+from benchmarks.synthetic import MockLLM, num_arguments, write_data
+from calculate_alpha import QUALITY_DIMENSIONS
+from core.llm import MODELS
+
+CONDITIONS = ["expert", "expert-reasoning", "novice", "novice-reasoning"]
+
+
+class FailingMockLLM(MockLLM):
+    """
+    MockLLM that fails on its generation call number `fail_at` (counted from 1) of the run, or while it is loaded if
+    `fail_at` is 0.
+    """
+
+    fail_at = None
+
+    def __init__(self, **kwargs):
+        # The options of OpenAI models that predict_argument_quality.py passes are ignored.
+        super().__init__(unparseable=0.0)
+        if FailingMockLLM.fail_at == 0:
+            raise RuntimeError("Interrupted while loading")
+
+    def generate_all(self, prompts):
+        if self.num_calls + 1 == FailingMockLLM.fail_at:
+            raise RuntimeError("Interrupted")
+        return super().generate_all(prompts)
+
+
+def run_predict(argv, fail_at=None):
+    FailingMockLLM.fail_at = fail_at
+    sys.argv = ["predict_argument_quality.py", "-m", FailingMockLLM.__name__] + argv
+    with contextlib.redirect_stdout(io.StringIO()):
+        predict_argument_quality.main(predict_argument_quality.parse_args())
+
+
+def read_ratings():
+    """Contents of the ratings files by file name."""
+    ratings = {}
+    for file_name in sorted(os.listdir("data/ratings")):
+        with open(os.path.join("data/ratings", file_name)) as ratings_file:
+            ratings[file_name] = ratings_file.read()
+    return ratings
+
+
+def check_complete(ratings, file_name, num_prompts):
+    keys = [(rating["id"], rating["dimension"]) for rating in map(json.loads, ratings[file_name].splitlines())]
+    assert len(keys) == len(set(keys)) == num_prompts, (file_name, len(keys), len(set(keys)))
+
+
+def check_sweep(model, scale, num_samples, fail_at):
+    """
+    Runs a complete sweep and one that fails on generation call `fail_at`, both with `num_samples` ratings files per
+    template, resumes the second and checks that all of its files are complete and those of the first unchanged.
+    """
+    num_prompts = num_arguments(scale) * len(QUALITY_DIMENSIONS)
+    samples_argv = ["--samples", str(num_samples)] if num_samples > 1 else []
+    first_sweep_names = [f"{model}-{condition}-{i}.jsonl" for condition in CONDITIONS
+                         for i in range(1, num_samples + 1)]
+    second_sweep_names = [f"{model}-{condition}-{i}.jsonl" for condition in CONDITIONS
+                          for i in range(num_samples + 1, 2 * num_samples + 1)]
+
+    work_dir = tempfile.mkdtemp()
+    write_data(work_dir, scale, predictions=False)
+    current_dir = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        run_predict(samples_argv)
+        first_sweep = read_ratings()
+        assert sorted(first_sweep) == sorted(first_sweep_names), sorted(first_sweep)
+
+        run_predict(samples_argv, fail_at=fail_at)
+        run_predict(samples_argv + ["--resume"])
+        ratings = read_ratings()
+        assert sorted(ratings) == sorted(first_sweep_names + second_sweep_names), sorted(ratings)
+        assert all(ratings[file_name] == content for file_name, content in first_sweep.items())
+        for file_name in second_sweep_names:
+            check_complete(ratings, file_name, num_prompts)
+        failure = f"generation call {fail_at}" if fail_at > 0 else "load"
+        print(f"{num_samples} samples, failed on {failure}: the resumed second sweep is complete in "
+              f"all {len(second_sweep_names)} files, the first sweep is unchanged")
+    finally:
+        os.chdir(current_dir)
+        shutil.rmtree(work_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', type=float, default=0.02, help='multiple of the number of arguments of the paper')
+    args = parser.parse_args()
+
+    MODELS[FailingMockLLM.__name__] = FailingMockLLM
+    model = FailingMockLLM.__name__
+    for num_samples, fail_at in [(1, num_arguments(args.scale) + 2), (2, 2 * num_arguments(args.scale) + 2), (2, 0)]:
+        check_sweep(model, args.scale, num_samples, fail_at)
+
+
+if __name__ == '__main__':
+    main()
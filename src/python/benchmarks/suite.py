@@ -0,0 +1,308 @@
+"""
+Benchmark suite of the annotation and agreement pipelines on synthetic data (benchmarks.synthetic) at multiples of the
+paper's scale: prompt building, response parsing, ratings and log I/O, the annotation loop with a mock LLM, alpha of a
+pair of configurations and the full agreement matrix of compute_all_agreements. The results of a run are written to a
+JSON file, and a run can be compared to an earlier one. Run from src/python:
+
+    python -m benchmarks.suite --scales 1 10 --output results.json
+    python -m benchmarks.suite --scales 1 10 --compare results.json
+
+At 100x the paper's scale, the ratings files of all configurations take about 3 GB. They are only written for the
+benchmarks that read them, e.g. not for `--scales 100 --benchmarks build parse_responses annotate`.
+"""
+import argparse
+import contextlib
+import datetime
+import functools
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import compute_all_agreements
+import predict_argument_quality
+from benchmarks.synthetic import PAPER_ANNOTATORS, MockLLM, num_arguments, synthetic_response, write_data
+from calculate_alpha import find_prediction_files, get_alphas, process_files
+from core.columnar import read_logs
+from core.data import load_arguments, load_dimension_definitions
+from core.parsing import parse_response, parse_responses
+from core.prompts import PromptTemplate, create_prompt_builder, materialize
+
+TEMPLATES = list(PromptTemplate)
+
+
+class Workspace:
+    """The synthetic data directory of one scale, written once and shared by the benchmarks of the scale."""
+
+    def __init__(self, path, scale, seed, num_annotators, predictions=True):
+        self.path = path
+        self.scale = scale
+        self.seed = seed
+        self.num_annotators = num_annotators
+        write_data(path, scale, seed, num_annotators, predictions)
+        self.arguments = load_arguments(os.path.join(path, "data", "arguments.tsv"))
+        self.dimensions = load_dimension_definitions(os.path.join(path, "data", "dimensions_definitions.jsonl"))
+        self.predictions_dir = os.path.join(path, "data", "predictions")
+
+    @property
+    def num_prompts(self):
+        return len(TEMPLATES) * len(self.arguments) * len(self.dimensions)
+
+    def responses(self):
+        rng = random.Random(self.seed)
+        return [synthetic_response(rng) for _ in range(self.num_prompts)]
+
+    def scratch_path(self, name):
+        return os.path.join(self.path, name)
+
+
+# Each benchmark prepares its input from a workspace and returns the number of items it processes and a function that
+# processes them, which is timed.
+
+def bench_build(workspace, args):
+    def run():
+        # New builders, so that compiling the templates is included.
+        for prompt_template in TEMPLATES:
+            builder = create_prompt_builder(prompt_template)
+            for argument in workspace.arguments:
+                for dimension in workspace.dimensions:
+                    builder.build(argument, dimension)
+
+    return workspace.num_prompts, run
+
+
+def bench_materialize(workspace, args):
+    return workspace.num_prompts, functools.partial(materialize, workspace.arguments, workspace.dimensions, TEMPLATES)
+
+
+def bench_parse_response(workspace, args):
+    responses = workspace.responses()
+    return len(responses), lambda: [parse_response(response) for response in responses]
+
+
+def bench_parse_responses(workspace, args):
+    responses = workspace.responses()
+    return len(responses), lambda: list(parse_responses(responses))
+
+
+def bench_write_ratings(workspace, args):
+    ratings = [{"id": argument.id, "dimension": dimension.dimension, "rating": parse_response(response)}
+               for (argument, dimension), response in zip(
+                   itertools.product(workspace.arguments, workspace.dimensions), workspace.responses())]
+    path = workspace.scratch_path("ratings.jsonl")
+
+    def run():
+        with open(path, "w") as out_file:
+            for rating in ratings:
+                predict_argument_quality.write_jsonl_line(out_file, rating)
+
+    return len(ratings), run
+
+
+def bench_process_files(workspace, args):
+    files = find_prediction_files("GPT3", "expert", False, workspace.num_annotators, workspace.predictions_dir)
+    num_ratings = workspace.num_annotators * len(workspace.arguments) * len(workspace.dimensions)
+    return num_ratings, functools.partial(process_files, files, "GPT3", "expert", False)
+
+
+def log_entries(workspace):
+    matrix = materialize(workspace.arguments, workspace.dimensions, TEMPLATES)
+    entries = []
+    for i, response in enumerate(workspace.responses()):
+        t, rest = divmod(i, len(workspace.arguments) * len(workspace.dimensions))
+        a, d = divmod(rest, len(workspace.dimensions))
+        entries.append({
+            "timestamp": datetime.datetime.now().isoformat(),
+            "model": "MockLLM",
+            "run_time": 0.0,
+            "try": 1,
+            "id": workspace.arguments[a].id,
+            "dimension": workspace.dimensions[d].dimension,
+            "template": TEMPLATES[t].name,
+            "ratings_file": "MockLLM-expert-1.jsonl",
+            "prompt": matrix[t, a, d],
+            "response": response,
+            "parsed_response": parse_response(response),
+        })
+    return entries
+
+
+def bench_write_log(workspace, args):
+    entries = log_entries(workspace)
+    path = workspace.scratch_path("log.jsonl")
+
+    def run():
+        with open(path, "w") as log_file:
+            for entry in entries:
+                predict_argument_quality.write_jsonl_line(log_file, entry)
+
+    return len(entries), run
+
+
+def bench_read_logs(workspace, args):
+    path = workspace.scratch_path("log-read.jsonl")
+    entries = log_entries(workspace)
+    with open(path, "w") as log_file:
+        for entry in entries:
+            predict_argument_quality.write_jsonl_line(log_file, entry)
+    return len(entries), functools.partial(read_logs, path)
+
+
+def bench_annotate(workspace, args):
+    """The annotation loop of predict_argument_quality (with its retries) over all templates and arguments."""
+    def run():
+        llm = MockLLM(args.call_latency, args.prompt_latency, seed=workspace.seed)
+        with open(workspace.scratch_path("annotate-log.jsonl"), "w") as log_file, \
+                open(workspace.scratch_path("annotate-ratings.jsonl"), "w") as out_file:
+            for prompt_template in TEMPLATES:
+                prompt_builder, _ = predict_argument_quality.get_prompt_builder(prompt_template)
+                for argument in workspace.arguments:
+                    predict_argument_quality.annotate_argument(
+                        llm, prompt_builder, prompt_template, argument, workspace.dimensions, "ratings.jsonl",
+                        functools.partial(predict_argument_quality.write_jsonl_line, log_file),
+                        functools.partial(predict_argument_quality.write_jsonl_line, out_file))
+
+    return workspace.num_prompts, run
+
+
+def bench_get_alphas(workspace, args):
+    configs = [{"annotator": "GPT3", "prompt_type": "expert", "reasoning": False, "aggregation": None},
+               {"annotator": "human", "prompt_type": "expert", "reasoning": False, "aggregation": None}]
+    num_ratings = len(configs) * workspace.num_annotators * len(workspace.arguments) * len(workspace.dimensions)
+    return num_ratings, functools.partial(get_alphas, configs, workspace.num_annotators, workspace.predictions_dir)
+
+
+def bench_agreements(workspace, args):
+    """The agreement matrix of all configurations of compute_all_agreements, including loading the ratings."""
+    num_configs = len(compute_all_agreements.get_configs())
+
+    def run():
+        current_dir = os.getcwd()
+        os.chdir(workspace.path)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                compute_all_agreements.main(workers=args.workers, predictions_dir=workspace.predictions_dir)
+        finally:
+            os.chdir(current_dir)
+
+    return num_configs * (num_configs - 1) // 2, run
+
+
+# Benchmarks that read the ratings files of the annotator configurations.
+PREDICTION_BENCHMARKS = {"process_files", "get_alphas", "agreements"}
+
+BENCHMARKS = {
+    "build": bench_build,
+    "materialize": bench_materialize,
+    "parse_response": bench_parse_response,
+    "parse_responses": bench_parse_responses,
+    "write_ratings": bench_write_ratings,
+    "process_files": bench_process_files,
+    "write_log": bench_write_log,
+    "read_logs": bench_read_logs,
+    "annotate": bench_annotate,
+    "get_alphas": bench_get_alphas,
+    "agreements": bench_agreements,
+}
+
+
+def run_benchmark(name, workspace, args):
+    num_items, run = BENCHMARKS[name](workspace, args)
+    times = []
+    for _ in range(args.repeat):
+        start_time = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start_time)
+
+    median = statistics.median(times)
+    return {"benchmark": name, "scale": workspace.scale, "arguments": len(workspace.arguments), "items": num_items,
+            "times": times, "best": min(times), "median": median,
+            "items_per_second": num_items / median if median > 0 else None}
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {"timestamp": datetime.datetime.now().isoformat(), "commit": commit, "python": sys.version.split()[0],
+            "platform": platform.platform(), "cpus": os.cpu_count()}
+
+
+def compare(results, baseline, tolerance):
+    """Prints the median time of each benchmark relative to the baseline and returns the regressed benchmarks."""
+    baseline_results = {(result["benchmark"], result["scale"]): result for result in baseline["results"]}
+    regressions = []
+    print(f"Compared to {baseline['environment'].get('commit') or 'the baseline'} "
+          f"({baseline['environment'].get('timestamp')}):")
+    for result in results:
+        key = (result["benchmark"], result["scale"])
+        if key not in baseline_results:
+            continue
+
+        ratio = result["median"] / baseline_results[key]["median"]
+        regressed = ratio > 1 + tolerance
+        if regressed:
+            regressions.append(key)
+        print(f"  {result['benchmark']:<16} {result['scale']:>6g}x  {ratio:6.2f}x the baseline time"
+              + ("  REGRESSION" if regressed else ""))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scales', type=float, nargs="+", default=[1, 10],
+                        help='multiples of the paper\'s scale (320 arguments, 10 annotators per configuration)')
+    parser.add_argument('--benchmarks', type=str, nargs="+", default=list(BENCHMARKS), choices=list(BENCHMARKS))
+    parser.add_argument('--repeat', type=int, default=3, help='number of timed runs of each benchmark')
+    parser.add_argument('-k', '--num-annotators', type=int, default=PAPER_ANNOTATORS)
+    parser.add_argument('-w', '--workers', type=int, default=1, help='workers of the agreement matrix')
+    parser.add_argument('--call-latency', type=float, default=0.0,
+                        help='seconds the mock LLM of the annotate benchmark sleeps per generation call')
+    parser.add_argument('--prompt-latency', type=float, default=0.0,
+                        help='seconds the mock LLM of the annotate benchmark sleeps per prompt')
+    parser.add_argument('--output', type=str, default=None, help='JSON file to write the results to')
+    parser.add_argument('--compare', type=str, default=None, help='JSON results of an earlier run to compare to')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='relative slowdown of the median time that counts as a regression')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    results = []
+    for scale in args.scales:
+        with tempfile.TemporaryDirectory() as path:
+            start_time = time.perf_counter()
+            workspace = Workspace(path, scale, args.seed, args.num_annotators,
+                                  predictions=not PREDICTION_BENCHMARKS.isdisjoint(args.benchmarks))
+            print(f"Scale {scale:g}x: {num_arguments(scale)} arguments, {workspace.num_prompts} prompts "
+                  f"(data written in {time.perf_counter() - start_time:.1f}s)", flush=True)
+
+            for name in args.benchmarks:
+                result = run_benchmark(name, workspace, args)
+                results.append(result)
+                print(f"  {name:<16} {result['items']:>9} items  best {result['best']:8.3f}s  "
+                      f"median {result['median']:8.3f}s  {result['items_per_second']:12.0f} items/s", flush=True)
+
+    run = {"environment": environment(), "options": vars(args), "results": results}
+    if args.output is not None:
+        with open(args.output, "w") as out_file:
+            json.dump(run, out_file, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare) as in_file:
+            regressions = compare(results, json.load(in_file), args.tolerance)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
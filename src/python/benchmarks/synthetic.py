@@ -0,0 +1,136 @@
+"""
+Synthetic data in the formats of the repository at a multiple of the paper's scale (320 arguments rated in 15
+dimensions by 10 annotators per configuration), and a mock LLM with a configurable latency. Used by benchmarks.suite,
+or on its own to write a data directory for predict_argument_quality.py and compute_all_agreements.py:
+
+    python -m benchmarks.synthetic <dir> --scale 10
+"""
+import argparse
+import json
+import os
+import random
+import time
+from typing import List
+
+import numpy as np
+
+from benchmarks.alpha import write_ratings
+from calculate_alpha import QUALITY_DIMENSIONS
+from core.llm import LLM
+
+PAPER_ARGUMENTS = 320
+PAPER_ANNOTATORS = 10
+
+WORDS = ("the argument is clear and relevant but it lacks sufficient support for its claim about the issue which makes "
+         "it weak overall because school uniforms evolution abortion gay marriage should be banned allowed people "
+         "children government").split()
+
+RATINGS = ["1", "2", "3", "?", "1 - Low", "2 - Medium", "3 - High", "? - Cannot judge"]
+
+
+def words(rng: random.Random, low: int, high: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))
+
+
+def num_arguments(scale: float) -> int:
+    return max(1, round(PAPER_ARGUMENTS * scale))
+
+
+def write_arguments(path: str, scale: float, rng: random.Random):
+    """Writes an arguments TSV (see core.data.load_arguments) with `scale` times the arguments of the paper."""
+    with open(path, "w") as out_file:
+        out_file.write("id\tissue\tstance\tconclusion\targument\n")
+        for i in range(num_arguments(scale)):
+            out_file.write("\t".join([f"arg{i}", words(rng, 3, 8), rng.choice(["pro", "con"]), words(rng, 5, 15),
+                                      words(rng, 30, 250)]))
+            out_file.write("\n")
+
+
+def write_dimensions(path: str, rng: random.Random):
+    """Writes the dimension definitions JSONL (see core.data.load_dimension_definitions) of the 15 dimensions."""
+    with open(path, "w") as out_file:
+        for dimension in QUALITY_DIMENSIONS:
+            out_file.write(json.dumps({"dimension": dimension, "definition": words(rng, 30, 80),
+                                       "question": f"How would you rate the {dimension.lower()} of the argument?",
+                                       "definition_novice": words(rng, 20, 50),
+                                       "question_novice": f"How {dimension.lower()} is the argument?"}))
+            out_file.write("\n")
+
+
+def write_predictions(path: str, scale: float, seed: int, num_annotators: int = PAPER_ANNOTATORS,
+                      models=("GPT3", "palm2")):
+    """
+    Writes the ratings files of all annotator configurations of compute_all_agreements.get_configs: `num_annotators`
+    files per model, prompt type and reasoning, and per prompt type of the human annotators.
+    """
+    rng = np.random.default_rng(seed)
+    for prompt_type in ["expert", "novice"]:
+        write_ratings(path, "human", prompt_type, num_annotators, num_arguments(scale), rng)
+        for model in models:
+            for condition in [prompt_type, f"{prompt_type}-reasoning"]:
+                write_ratings(path, model, condition, num_annotators, num_arguments(scale), rng)
+
+
+def write_data(path: str, scale: float, seed: int = 0, num_annotators: int = PAPER_ANNOTATORS,
+               predictions: bool = True):
+    """Writes data/arguments.tsv, data/dimensions_definitions.jsonl and (optionally) data/predictions/ below `path`."""
+    rng = random.Random(seed)
+    os.makedirs(os.path.join(path, "data", "predictions"), exist_ok=True)
+    write_arguments(os.path.join(path, "data", "arguments.tsv"), scale, rng)
+    write_dimensions(os.path.join(path, "data", "dimensions_definitions.jsonl"), rng)
+    if predictions:
+        write_predictions(os.path.join(path, "data", "predictions"), scale, seed, num_annotators)
+
+
+def synthetic_response(rng: random.Random, unparseable: float = 0.05) -> str:
+    """A response with a rating at its start or after a reasoning, or (with probability `unparseable`) without one."""
+    kind = rng.random()
+    if kind < unparseable:
+        return words(rng, 5, 60)
+    if kind < 0.5:
+        return rng.choice(RATINGS)
+    return f"{words(rng, 40, 200)}\n### Your answer:\n{rng.choice(RATINGS)}"
+
+
+class MockLLM(LLM):
+    """
+    LLM that answers every prompt with a synthetic response after sleeping `call_latency` seconds per generation call
+    plus `prompt_latency` seconds per prompt, e.g. to measure the overhead of the annotation loop around a model.
+    """
+
+    def __init__(self, call_latency: float = 0.0, prompt_latency: float = 0.0, unparseable: float = 0.05,
+                 seed: int = 0):
+        super().__init__()
+        self.call_latency = call_latency
+        self.prompt_latency = prompt_latency
+        self.unparseable = unparseable
+        self.rng = random.Random(seed)
+        self.num_calls = 0
+        self.num_prompts = 0
+
+    def generate(self, prompt: str) -> str:
+        return self.generate_all([prompt])[0]
+
+    def generate_all(self, prompts: List[str]) -> List[str]:
+        self.num_calls += 1
+        self.num_prompts += len(prompts)
+        latency = self.call_latency + len(prompts) * self.prompt_latency
+        if latency > 0:
+            time.sleep(latency)
+        return [synthetic_response(self.rng, self.unparseable) for _ in prompts]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('path', type=str, help='directory to write the data directory to')
+    parser.add_argument('--scale', type=float, default=1, help='multiple of the number of arguments of the paper')
+    parser.add_argument('-k', '--num-annotators', type=int, default=PAPER_ANNOTATORS)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    write_data(args.path, args.scale, args.seed, args.num_annotators)
+    print(f"Wrote {num_arguments(args.scale)} arguments and their ratings to {os.path.join(args.path, 'data')}.")
+
+
+if __name__ == '__main__':
+    main()
@@ -6,6 +6,8 @@ import glob
 import os
 import argparse
 import statistics
+from alpha_engine import ReliabilityData, compute_alphas, bootstrap_alphas
+from core.columnar import read_ratings
 
 QUALITY_DIMENSIONS = ['Cogency', 'Local Acceptability', 'Local Relevance',
                       'Local Sufficiency', 'Effectiveness', 'Credibility', 'Emotional Appeal',
@@ -51,35 +53,63 @@ def compute_dimension_mean(df):
     return df
 
 
+def process_ratings(df, annotator, dimensions=None):
+    """
+    Pivots the ratings of one annotator (one row per argument and dimension) to one row per argument. If `df` only
+    holds some of the arguments of a file, `dimensions` are all dimensions the file rates.
+    """
+    response_column = 'rating'
+    df = df.drop(df[df["id"].isin(EXCLUDED_IDS)].index)
+    df[response_column] = df[response_column].replace("?", 0).astype("float")
+    df = df.pivot(index='id', columns='dimension', values=response_column)
+    if dimensions is not None:
+        df = df.reindex(columns=sorted(set(df.columns).union(dimensions)))
+    if "Cogency" not in df.columns:
+        df = compute_dimension_mean(df)
+    df.reset_index(inplace=True)
+    df['annotator'] = annotator
+    return df
+
+
 def process_files(paths, model, prompt_type, reasoning):
     dfs = []
-    response_column = 'rating'
     if reasoning:
         reasoning = "_reasoning"
     else:
         reasoning = ""
 
     for i, path in enumerate(paths):
-        df = pd.read_json(path, lines=True)
-        df = df.drop(df[df["id"].isin(EXCLUDED_IDS)].index)
-        df[response_column] = df[response_column].replace("?", 0).astype("float")
-        df = df.pivot(index='id', columns='dimension', values=response_column)
-        if "Cogency" not in df.columns:
-            df = compute_dimension_mean(df)
-        df.reset_index(inplace=True)
-        df['annotator'] = f'{model}_{i + 1}_{prompt_type}{reasoning}'
-
-        dfs.append(df)
+        dfs.append(process_ratings(read_ratings(path), f'{model}_{i + 1}_{prompt_type}{reasoning}'))
     return pd.concat(dfs)
 
 
-def get_annotations(model, prompt_type, reasoning, num_annotators, path):
+def find_prediction_files(model, prompt_type, reasoning, num_annotators, path):
     if reasoning:
-        path_pattern = os.path.join(path, f'{model}[-_]{prompt_type}[-_]reasoning[-_][0-9].jsonl')
+        path_pattern = os.path.join(path, f'{model}[-_]{prompt_type}[-_]reasoning[-_][0-9]')
     else:
-        path_pattern = os.path.join(path, f'{model}[-_]{prompt_type}[-_][0-9].jsonl')
+        path_pattern = os.path.join(path, f'{model}[-_]{prompt_type}[-_][0-9]')
+
+    # Ratings files in JSONL or Parquet format. Empty files of a sweep that was interrupted before their template
+    # started are left out.
+    files = [file for extension in ['.jsonl', '.parquet'] for file in glob.glob(path_pattern + extension)
+             if os.path.getsize(file) > 0]
+    stems = sorted({os.path.splitext(file)[0] for file in files})
+    return [stem + '.parquet' if use_parquet(stem, files) else stem + '.jsonl' for stem in stems][:num_annotators]
+
+
+def use_parquet(stem, files):
+    """
+    Whether to read the Parquet file of a ratings file rather than the JSONL file: only if it is at least as recent,
+    since a resumed run appends to the JSONL file without necessarily writing the Parquet file again.
+    """
+    parquet_file, jsonl_file = stem + '.parquet', stem + '.jsonl'
+    if parquet_file not in files:
+        return False
+    return jsonl_file not in files or os.stat(parquet_file).st_mtime_ns >= os.stat(jsonl_file).st_mtime_ns
+
 
-    prediction_files = sorted(glob.glob(path_pattern))[:num_annotators]
+def get_annotations(model, prompt_type, reasoning, num_annotators, path):
+    prediction_files = find_prediction_files(model, prompt_type, reasoning, num_annotators, path)
     df = process_files(prediction_files, model, prompt_type, reasoning)
     return df
 
@@ -100,28 +130,31 @@ def get_majority(annotations, annotator, prompt_type, reasoning):
     return majority.reset_index()
 
 
-def get_alphas(annotator_configs, num_annotators, path):
-    annotation_set = None
-    for annotator_config in annotator_configs:
-        annotations = get_annotations(
-            annotator_config["annotator"],
-            annotator_config["prompt_type"],
-            annotator_config["reasoning"],
-            num_annotators,
-            path)
-        if annotator_config["aggregation"] == "majority":
-            annotations = get_majority(annotations, annotator_config["annotator"], annotator_config["prompt_type"],
-                                       annotator_config["reasoning"])
-
-        if annotation_set is None:
-            annotation_set = annotations
-        else:
-            annotation_set = pd.concat([annotation_set, annotations], ignore_index=True)
+def get_config_annotations(annotator_config, num_annotators, path):
+    annotations = get_annotations(
+        annotator_config["annotator"],
+        annotator_config["prompt_type"],
+        annotator_config["reasoning"],
+        num_annotators,
+        path)
+    if annotator_config["aggregation"] == "majority":
+        annotations = get_majority(annotations, annotator_config["annotator"], annotator_config["prompt_type"],
+                                   annotator_config["reasoning"])
+    return annotations
+
 
+def compute_alphas_of_annotations(annotations_per_config, engine="numpy"):
     alpha_dict = {}
-    if annotation_set is None:
+    if not annotations_per_config:
         return alpha_dict
 
+    # The numpy engine codes each configuration as an integer array and computes the coincidences of all dimensions in
+    # one pass, the krippendorff engine pivots the concatenated annotations per dimension.
+    if engine == "numpy":
+        reliability_data = [ReliabilityData.from_annotations(annotations) for annotations in annotations_per_config]
+        return compute_alphas(ReliabilityData.concat(reliability_data), QUALITY_DIMENSIONS)
+
+    annotation_set = pd.concat(annotations_per_config, ignore_index=True)
     for dimension in QUALITY_DIMENSIONS:
         annotation_per_annotator = (annotation_set.pivot(index='annotator', columns='id', values=dimension))
         alpha = krippendorff.alpha(annotation_per_annotator,
@@ -134,6 +167,19 @@ def get_alphas(annotator_configs, num_annotators, path):
     return alpha_dict
 
 
+def compute_alpha_intervals(annotations_per_config, num_samples, seed=None):
+    if not annotations_per_config:
+        return {}
+    reliability_data = [ReliabilityData.from_annotations(annotations) for annotations in annotations_per_config]
+    return bootstrap_alphas(ReliabilityData.concat(reliability_data), QUALITY_DIMENSIONS, num_samples, seed=seed)
+
+
+def get_alphas(annotator_configs, num_annotators, path, engine="numpy"):
+    annotations_per_config = [get_config_annotations(annotator_config, num_annotators, path)
+                              for annotator_config in annotator_configs]
+    return compute_alphas_of_annotations(annotations_per_config, engine)
+
+
 if __name__ == '__main__':
     data_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data'))
     parser = argparse.ArgumentParser()
@@ -147,6 +193,11 @@ if __name__ == '__main__':
     parser.add_argument('-k', '--num_annotators', type=int, help='number of annotators', default=3)
     parser.add_argument('-p', '--path', type=str, help='directory containing the prediction files',
                         default=data_dir)
+    parser.add_argument('--engine', type=str, help='implementation of Krippendorff\'s alpha',
+                        choices=['numpy', 'krippendorff'], default='numpy')
+    parser.add_argument('-b', '--bootstrap', type=int, default=0,
+                        help='number of bootstrap resamples of the arguments for 95%% confidence intervals')
+    parser.add_argument('--seed', type=int, default=None, help='seed of the bootstrap resampling')
     args = parser.parse_args()
 
 
@@ -169,12 +220,20 @@ if __name__ == '__main__':
         for i, agg in enumerate(args.aggregation):
             annotator_configs[i]["aggregation"] = agg[0]
 
-    alphas = get_alphas(annotator_configs, args.num_annotators, args.path)
+    annotations_per_config = [get_config_annotations(annotator_config, args.num_annotators, args.path)
+                              for annotator_config in annotator_configs]
+    alphas = compute_alphas_of_annotations(annotations_per_config, args.engine)
+    intervals = {}
+    if args.bootstrap > 0:
+        intervals = compute_alpha_intervals(annotations_per_config, args.bootstrap, args.seed)
 
     print('Annotator:', args.annotator, '\nType:', args.type, '\nReasoning:', args.reasoning,
           '\nTotal annotators:', args.num_annotators)
     print('\nKrippendorff\'s alpha')
     for k, v in alphas.items():
-        print(k, round(v, 2))
+        if k in intervals:
+            print(k, round(v, 2), [round(bound, 2) for bound in intervals[k]])
+        else:
+            print(k, round(v, 2))
 
     print('\nOverall Krippendorff\'s alpha:', round(alphas["Across Dimensions"], 2))
@@ -1,10 +1,12 @@
 import json
+import multiprocessing
 import os
 import statistics
 import pandas as pd
-import glob
+import functools
 from calculate_alpha import get_alphas, get_majority,  get_annotations
 import krippendorff
+from get_perfect_arguments import load_perfect_agreement
 
 QUALITY_DIMENSIONS = ['Cogency', 'Local Acceptability', 'Local Relevance',
                     'Local Sufficiency', 'Effectiveness', 'Credibility',
@@ -48,6 +50,14 @@ def get_llm_majority(path, prompt_type, model, reasoning, num_annotators, dimens
     return dim.reset_index()
 
 
+@functools.lru_cache(maxsize=None)
+def get_perfect_human(prompt_type):
+    '''
+    Perfect-agreement subsets of the human annotations of a type, selected in memory from the annotation file.
+    '''
+    return load_perfect_agreement(f"../../data/human_annotations/{prompt_type}.tsv")
+
+
 def perfect_human_vs_llm(human_config, model_config): #path='../data/', model=None, human_type=None, type=None, reasoning=False):
     '''
     Compare perfect human annotations with LLM annotations.
@@ -58,12 +68,10 @@ def perfect_human_vs_llm(human_config, model_config): #path='../data/', model=No
     type (str): Type of annotator: expert, novice.
     reasoning (bool): Flag to process LLM annotations with reasoning prompts.
     '''
-    perfect_human = glob.glob(f"../../data/human_annotations/perfect_agreement-{human_config['prompt_type']}/*.tsv")
+    perfect_human = get_perfect_human(human_config['prompt_type'])
 
-    
     alphas = {}
-    for human in perfect_human:
-        human_df=pd.read_csv(human, sep='\t')
+    for human_df in perfect_human.values():
         human_df = human_df.drop_duplicates(subset='id') # all rows with the same id have the same annotations for a given dimension
         human_df['annotator'] = 'human'
         dimension = human_df.columns[-1]
@@ -79,7 +87,12 @@ def perfect_human_vs_llm(human_config, model_config): #path='../data/', model=No
         alphas[dimension] = krippendorff.alpha(df.pivot(index='annotator', columns='id', values=dimension), level_of_measurement='ordinal').round(2)
     return alphas
 
-def calculate_agreement_perfect_human_llm():
+def evaluate_perfect_pair(configs):
+    human_config, llm_config = configs
+    return perfect_human_vs_llm(human_config, llm_config)
+
+
+def calculate_agreement_perfect_human_llm(workers=1):
     annotators = ["human", "GPT3", "palm2"]
     prompt_types = ["novice", "expert"]
     aggregation = ["majority", None]
@@ -99,14 +112,19 @@ def calculate_agreement_perfect_human_llm():
     annotation_sets = []
     human_configs = [config for config in configs if config['annotator']=='human']
     llm_configs = [config for config in configs if config['annotator']!='human']
-    for human_config in human_configs:
-        for llm_config in llm_configs:
-            print(human_config, llm_config)
-            annotations = {}
-            alphas = perfect_human_vs_llm(human_config, llm_config)
-            annotations['annotators'] = [human_config, llm_config]
-            annotations['alphas'] = alphas
-            annotation_sets.append(annotations)
+    pairs = [(human_config, llm_config) for human_config in human_configs for llm_config in llm_configs]
+    # The pairs are independent, a pool evaluates them in parallel and returns the results in order.
+    if workers > 1:
+        with multiprocessing.Pool(workers) as pool:
+            results = pool.map(evaluate_perfect_pair, pairs)
+    else:
+        results = map(evaluate_perfect_pair, pairs)
+    for (human_config, llm_config), alphas in zip(pairs, results):
+        print(human_config, llm_config)
+        annotations = {}
+        annotations['annotators'] = [human_config, llm_config]
+        annotations['alphas'] = alphas
+        annotation_sets.append(annotations)
     with open('agreements-perfect-human.jsonl', 'w') as f:
         for item in annotation_sets:
             f.write("%s\n" % json.dumps(item))
@@ -1,13 +1,77 @@
+import argparse
 import json
+import multiprocessing
 import os
-from calculate_alpha import get_alphas
+from alpha_engine import compute_alphas, bootstrap_alphas
+from annotation_store import AnnotationStore, config_key
+from calculate_alpha import QUALITY_DIMENSIONS
 from calculate_perfect_agreement import calculate_agreement_perfect_human_llm
 
+# Read-only ratings of all configs in the pair workers, inherited from the parent process when workers are forked.
+_data = None
+_rows = None
+_bootstrap = None
+
+
+def init_pair_worker(data, rows, bootstrap):
+    global _data, _rows, _bootstrap
+    _data = data
+    _rows = rows
+    _bootstrap = bootstrap
+
+
+def evaluate_pair(indexed_pair):
+    index, pair = indexed_pair
+    rows = [row for config in pair for row in _rows[config_key(config)]]
+    data = _data.subset(rows)
+    alphas = compute_alphas(data, QUALITY_DIMENSIONS)
+
+    intervals = None
+    num_samples, seed = _bootstrap
+    if num_samples > 0:
+        # Seeded per pair, so that the intervals do not depend on which worker evaluates the pair.
+        intervals = bootstrap_alphas(data, QUALITY_DIMENSIONS, num_samples, seed=[seed, index])
+    return alphas, intervals
 
-def main():
-    num_annotators = 10
 
-    annotators = ["human", "GPT3", "palm2"]
+def compute_agreement_matrix(configs, store, out_file_name="agreements.jsonl", workers=1, bootstrap=0, seed=0):
+    """
+    Computes the agreement of every pair of configs and writes each pair to `out_file_name` as soon as it and all pairs
+    before it are done, so that the file is identical for any number of workers. With `bootstrap` resamples, the 95%
+    confidence intervals of the alphas are added to each pair.
+    """
+    store.load(configs)
+    pairs = [(config_i, config_j) for i, config_i in enumerate(configs) for j, config_j in enumerate(configs) if i < j]
+
+    with open(out_file_name, "w+") as out_file:
+        if workers > 1:
+            pool = multiprocessing.Pool(workers, initializer=init_pair_worker,
+                                        initargs=(store.data, store.rows, (bootstrap, seed)))
+            results = pool.imap(evaluate_pair, enumerate(pairs), chunksize=max(1, len(pairs) // (4 * workers)))
+        else:
+            pool = None
+            init_pair_worker(store.data, store.rows, (bootstrap, seed))
+            results = map(evaluate_pair, enumerate(pairs))
+
+        try:
+            for (config_i, config_j), (alphas, intervals) in zip(pairs, results):
+                print(config_i, "-", config_j)
+                entry = {
+                    "annotators": [config_i, config_j],
+                    "alphas": alphas
+                }
+                if intervals is not None:
+                    entry["intervals"] = intervals
+                out_file.write(json.dumps(entry))
+                out_file.write("\n")
+                out_file.flush()
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+
+def get_configs(annotators=("human", "GPT3", "palm2")):
     prompt_types = ["novice", "expert"]
     aggregation = ["majority", None]
 
@@ -22,30 +86,35 @@ def main():
                 if annotator != "human":
                     config = {"annotator": annotator, "prompt_type": prompt_type, "reasoning": True, "aggregation": agg}
                     configs.append(config)
+    return configs
 
-    data = []
-    predictions_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..', 'data', 'predictions'))
-    print(predictions_dir)
-    for i, config_i in enumerate(configs):
-        for j, config_j in enumerate(configs):
-            if i < j:
-                print(config_i, "-", config_j)
-                alphas = get_alphas(
-                    [config_i, config_j],
-                    num_annotators,
-                    predictions_dir)
 
-                data.append({
-                    "annotators": [config_i, config_j],
-                    "alphas": alphas
-                })
+def main(cache_dir=None, workers=1, predictions_dir=None, bootstrap=0, seed=0):
+    num_annotators = 10
 
-    with open("agreements.jsonl", "w+") as out_file:
-        for entry in data:
-            out_file.write(json.dumps(entry))
-            out_file.write("\n")
+    configs = get_configs()
+
+    if predictions_dir is None:
+        predictions_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..', 'data', 'predictions'))
+    print(predictions_dir)
+    # Every config is loaded once, the agreement of a pair is computed from a slice of the ratings of all configs.
+    store = AnnotationStore(predictions_dir, num_annotators, cache_dir)
+    compute_agreement_matrix(configs, store, "agreements.jsonl", workers, bootstrap, seed)
 
 
 if __name__ == '__main__':
-    main()
-    calculate_agreement_perfect_human_llm()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cache-dir', type=str, default=None,
+                        help='directory for Parquet copies of the processed ratings, reused while the files are '
+                             'unchanged')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='number of processes that compute the agreements of config pairs')
+    parser.add_argument('-p', '--path', type=str, default=None,
+                        help='directory containing the prediction files')
+    parser.add_argument('-b', '--bootstrap', type=int, default=0,
+                        help='number of bootstrap resamples of the arguments for 95%% confidence intervals')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the bootstrap resampling')
+    args = parser.parse_args()
+
+    main(args.cache_dir, args.workers, args.path, args.bootstrap, args.seed)
+    calculate_agreement_perfect_human_llm(args.workers)
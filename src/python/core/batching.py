@@ -0,0 +1,114 @@
+import bisect
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+
+@dataclass(order=True)
+class BatchItem:
+    num_tokens: int
+    # Negative submission number, so that of the prompts with the same length the first submitted is issued first.
+    rank: int
+    key: Any = field(compare=False)
+    prompt: str = field(compare=False)
+    tries: int = field(default=0, compare=False)
+    # Items of a group (e.g. of templates with the same decoding settings) share batches, see BatchScheduler.run.
+    group: Any = field(default=None, compare=False)
+
+
+@dataclass
+class BatchStats:
+    batch_size: int
+    prompt_tokens: int
+    padded_tokens: int
+    generated_tokens: int
+    run_time: float
+
+    @property
+    def tokens_per_second(self) -> float:
+        return (self.prompt_tokens + self.generated_tokens) / self.run_time if self.run_time > 0 else 0.0
+
+
+class BatchScheduler:
+    """
+    Pools pending prompts across arguments, dimensions and templates and issues them in batches of similar tokenized
+    length. A batch is capped so that its padded size, including the generated tokens, stays within `max_batch_tokens`.
+    Batches only hold items of one group, e.g. of the templates that are decoded with the same settings; the groups are
+    issued in the order they were submitted. Items can be submitted again (e.g. after an unparseable response), at most
+    until they were tried `max_tries` times. They are scheduled once all pending items were, in a round of batches of
+    their own, so that a prompt that fails every time is not part of each following batch.
+    """
+
+    def __init__(self, llm, max_batch_tokens: int = 16384, max_batch_size: int = 64, max_tries: Optional[int] = None):
+        self.llm = llm
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_tries = max_tries
+        self.num_submitted = 0
+        # Items sorted by length per group.
+        self.pending: Dict[Any, List[BatchItem]] = {}
+        self.retries: Dict[Any, List[BatchItem]] = {}
+
+    def __len__(self):
+        return sum(len(items) for items in self.pending.values()) + sum(len(items) for items in self.retries.values())
+
+    def submit(self, keys: List[Any], prompts: List[str], group: Any = None):
+        items = self.pending.setdefault(group, [])
+        for key, prompt, num_tokens in zip(keys, prompts, self.llm.count_tokens(prompts)):
+            self.num_submitted += 1
+            bisect.insort(items, BatchItem(num_tokens, -self.num_submitted, key, prompt, group=group))
+
+    def resubmit(self, item: BatchItem) -> bool:
+        """Schedules the item again unless it was tried `max_tries` times, and returns whether it was."""
+        if self.max_tries is not None and item.tries >= self.max_tries:
+            return False
+        bisect.insort(self.retries.setdefault(item.group, []), item)
+        return True
+
+    def next_group(self) -> Any:
+        if all(len(items) == 0 for items in self.pending.values()):
+            # The next round: the items submitted again since the last one.
+            self.pending, self.retries = self.retries, {}
+        return next(group for group, items in self.pending.items() if len(items) > 0)
+
+    def next_batch(self, group: Any = None) -> List[BatchItem]:
+        pending = self.pending[group]
+
+        # Longest prompts first, so that a batch exceeding the memory fails early in a sweep.
+        batch = [pending.pop()]
+        cost = batch[0].num_tokens + self.llm.generation_kwargs["max_new_tokens"]
+
+        while len(pending) > 0 and len(batch) < self.max_batch_size:
+            # The first item of a batch is the longest, so each further item adds the same padded cost.
+            if (len(batch) + 1) * cost > self.max_batch_tokens:
+                break
+            batch.append(pending.pop())
+
+        return batch
+
+    def run(self, prepare: Optional[Callable[[Any], None]] = None) \
+            -> Iterator[Tuple[List[BatchItem], List[str], BatchStats]]:
+        """
+        Generates responses batch by batch until no items are pending, including items submitted meanwhile. `prepare`
+        is called with the group of each batch before it is formed, e.g. to apply the decoding settings of the group.
+        """
+        while len(self) > 0:
+            group = self.next_group()
+            if prepare is not None:
+                prepare(group)
+            batch = self.next_batch(group)
+            for item in batch:
+                item.tries += 1
+
+            start_time = time.time()
+            responses, generated_tokens = self.llm.generate_batch([item.prompt for item in batch])
+            run_time = time.time() - start_time
+
+            stats = BatchStats(
+                batch_size=len(batch),
+                prompt_tokens=sum(item.num_tokens for item in batch),
+                padded_tokens=len(batch) * batch[0].num_tokens,
+                generated_tokens=generated_tokens,
+                run_time=run_time)
+
+            yield batch, responses, stats
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import sqlite3
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from core.llm import LLM
+
+
+class CacheMissError(LookupError):
+    pass
+
+
+class ResponseCache:
+    """Persistent SQLite store of LLM responses, addressed by a hash of everything that determines a request."""
+
+    def __init__(self, path: str, max_entries: Optional[int] = None, max_age: Optional[float] = None,
+                 read_only: bool = False):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.read_only = read_only
+        self.hits = 0
+        self.misses = 0
+
+        # Worker processes may share the cache file, so wait for each other's write locks.
+        self.connection = sqlite3.connect(path, timeout=60.0)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS responses ("
+                                "key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+                                "created REAL NOT NULL, accessed REAL NOT NULL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self.connection.commit()
+
+        if not self.read_only:
+            self.evict()
+
+    @staticmethod
+    def key(model: str, prompt: str, params: dict, sample_index) -> str:
+        payload = json.dumps({"model": model, "prompt": prompt, "params": params, "sample": sample_index},
+                             sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        row = self.connection.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+
+        if row is None or (self.max_age is not None and not self.read_only and time.time() - row[1] > self.max_age):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        if not self.read_only:
+            self.connection.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+        return row[0]
+
+    def put(self, key: str, response: str):
+        if self.read_only:
+            return
+
+        now = time.time()
+        self.connection.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, response, now, now))
+
+    def commit(self):
+        self.connection.commit()
+
+    def evict(self):
+        if self.max_age is not None:
+            self.connection.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.max_age,))
+
+        if self.max_entries is not None:
+            # Least recently used entries go first.
+            self.connection.execute("DELETE FROM responses WHERE key IN ("
+                                    "SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                                    (self.max_entries,))
+
+        self.connection.commit()
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self):
+        if not self.read_only:
+            self.evict()
+        self.connection.close()
+
+
+class CachedLLM(LLM):
+    """
+    Serves responses of the wrapped model from a ResponseCache and only forwards cache misses.
+
+    Repeated requests of the same prompt within one sample index (e.g. retries of unparseable responses) are
+    distinguished by their attempt number, so a replay yields the same sequence of responses as the original run. The
+    keys include the loading options of the model (dtype, quantization), as the responses of a float16 and an int8
+    model are not interchangeable.
+    """
+
+    def __init__(self, llm: LLM, cache: ResponseCache, sample_index: int = 0):
+        super().__init__()
+        self.llm = llm
+        self.metrics = llm.metrics
+        self.cache = cache
+        self.sample_index = sample_index
+        # Attempts per (prompt, sample index), as retry rounds may alternate between the sample indices.
+        self.attempts = Counter()
+
+    @property
+    def name(self) -> str:
+        return self.llm.name
+
+    def request_key(self, prompt: str) -> str:
+        attempt = self.attempts[prompt, self.sample_index]
+        self.attempts[prompt, self.sample_index] += 1
+
+        params = getattr(self.llm, "generation_kwargs", {})
+        if getattr(self.llm, "stop_at_rating", False):
+            # Responses that end at the rating are not interchangeable with full ones.
+            params = {**params, "stop_at_rating": True}
+        if getattr(self.llm, "loading_options", None):
+            params = {**params, "loading_options": self.llm.loading_options}
+        return ResponseCache.key(getattr(self.llm, "model_name", self.llm.name), prompt, params,
+                                 [self.sample_index, attempt])
+
+    def generate(self, prompt: str) -> str:
+        return self.generate_all([prompt])[0]
+
+    def generate_all(self, prompts: List[str]) -> List[str]:
+        keys = [self.request_key(prompt) for prompt in prompts]
+        results = [self.cache.get(key) for key in keys]
+
+        missing = [i for i, result in enumerate(results) if result is None]
+        if len(missing) > 0:
+            if self.cache.read_only:
+                raise CacheMissError(f"{len(missing)} of {len(prompts)} prompts are not cached")
+
+            responses = self.llm.generate_all([prompts[i] for i in missing])
+            for i, response in zip(missing, responses):
+                results[i] = response
+                if response is not None:
+                    self.cache.put(keys[i], response)
+
+        self.cache.commit()
+        return results
+
+    def count_tokens(self, prompts: List[str]) -> List[int]:
+        return self.llm.count_tokens(prompts)
+
+    def score_ratings(self, prompts: List[str], sample: bool = False) -> List[Tuple[str, Dict[str, float]]]:
+        # Scoring is a single forward pass without decoding and is not cached.
+        return self.llm.score_ratings(prompts, sample=sample)
+
+    @property
+    def generation_kwargs(self) -> dict:
+        return self.llm.generation_kwargs
+
+    def generate_batch(self, prompts: List[str]) -> Tuple[List[str], int]:
+        keys = [self.request_key(prompt) for prompt in prompts]
+        results = [self.cache.get(key) for key in keys]
+
+        generated_tokens = 0
+        missing = [i for i, result in enumerate(results) if result is None]
+        if len(missing) > 0:
+            if self.cache.read_only:
+                raise CacheMissError(f"{len(missing)} of {len(prompts)} prompts are not cached")
+
+            responses, generated_tokens = self.llm.generate_batch([prompts[i] for i in missing])
+            for i, response in zip(missing, responses):
+                results[i] = response
+                self.cache.put(keys[i], response)
+
+        self.cache.commit()
+        return results, generated_tokens
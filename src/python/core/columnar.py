@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+from typing import Iterable, List
+
+# Columns with few distinct values, stored once per row group in a dictionary.
+DICTIONARY_COLUMNS = ["id", "dimension", "rating", "model", "template", "ratings_file", "parsed_response"]
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+
+
+def prompts_path(path: str) -> str:
+    """
+    Path of the prompt table that belongs to a Parquet log file. The table is a Parquet file too, but its name does not
+    end in .parquet, so that patterns such as `log-*.parquet` only match the log files.
+    """
+    return os.path.splitext(path)[0] + ".prompts"
+
+
+def read_jsonl(path: str) -> List[dict]:
+    with open(path, "r") as in_file:
+        # A line cut off by an interruption is skipped.
+        return [json.loads(line) for line in in_file if line.endswith("\n")]
+
+
+def to_table(rows: Iterable[dict]):
+    import pyarrow as pa
+
+    table = pa.Table.from_pylist(list(rows))
+    for name in DICTIONARY_COLUMNS:
+        if name in table.column_names:
+            index = table.column_names.index(name)
+            table = table.set_column(index, name, table.column(name).cast(pa.string()).dictionary_encode())
+    return table
+
+
+def write_ratings(ratings: Iterable[dict], path: str):
+    """Writes ratings (id, dimension, rating and optionally probabilities) to a Parquet file."""
+    import pyarrow.parquet as pq
+
+    pq.write_table(to_table(ratings), path, compression="zstd")
+
+
+def write_logs(entries: Iterable[dict], path: str):
+    """
+    Writes log entries to a Parquet file. Every prompt is stored once in a separate table (see `prompts_path`) and
+    referenced by its hash in the `prompt_hash` column of the log table.
+    """
+    import pyarrow.parquet as pq
+
+    prompts = {}
+    rows = []
+    for entry in entries:
+        entry = dict(entry)
+        prompt = entry.pop("prompt")
+        entry["prompt_hash"] = prompt_hash(prompt)
+        prompts[entry["prompt_hash"]] = prompt
+        rows.append(entry)
+
+    pq.write_table(to_table(rows), path, compression="zstd")
+    pq.write_table(to_table({"prompt_hash": key, "prompt": prompt} for key, prompt in prompts.items()),
+                   prompts_path(path), compression="zstd")
+
+
+def read_table(path: str, columns=None):
+    """Reads a Parquet file into a data frame with plain (not categorical) columns for the dictionary columns."""
+    import pyarrow.parquet as pq
+
+    df = pq.read_table(path, columns=columns).to_pandas()
+    for name in DICTIONARY_COLUMNS:
+        if name in df.columns:
+            df[name] = df[name].astype(object).where(df[name].notna(), None)
+    return df
+
+
+def read_ratings(path: str):
+    """Reads a ratings file in JSONL or Parquet format into a data frame."""
+    if path.endswith(".parquet"):
+        return read_table(path)
+
+    import pandas as pd
+    return pd.read_json(path, lines=True)
+
+
+def read_logs(path: str, prompts: bool = True):
+    """
+    Reads a log file in JSONL or Parquet format into a data frame. For Parquet logs, the prompts are looked up in the
+    prompt table unless `prompts` is False.
+    """
+    if not path.endswith(".parquet"):
+        import pandas as pd
+        return pd.DataFrame(read_jsonl(path))
+
+    df = read_table(path)
+    if prompts:
+        prompt_file = prompts_path(path)
+        if not os.path.exists(prompt_file):
+            # Name of the prompt table in earlier runs.
+            prompt_file = os.path.splitext(path)[0] + ".prompts.parquet"
+        prompt_table = read_table(prompt_file)
+        df["prompt"] = df["prompt_hash"].map(dict(zip(prompt_table["prompt_hash"], prompt_table["prompt"])))
+    return df
+
+
+def convert(path: str) -> str:
+    """Converts a JSONL ratings or log file to Parquet next to it and returns the path of the Parquet file."""
+    rows = read_jsonl(path)
+    out_path = os.path.splitext(path)[0] + ".parquet"
+    if rows and "prompt" in rows[0]:
+        write_logs(rows, out_path)
+    else:
+        write_ratings(rows, out_path)
+    return out_path
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert JSONL ratings and log files to Parquet.")
+    parser.add_argument("paths", type=str, nargs="+")
+    args = parser.parse_args()
+
+    for jsonl_path in args.paths:
+        print(f"{jsonl_path} -> {convert(jsonl_path)}")
@@ -0,0 +1,28 @@
+import json
+from typing import List
+
+from core.argument import Argument
+from core.quality_dimension import QualityDimension
+
+
+def load_arguments(path: str) -> List[Argument]:
+    arguments = []
+    with open(path, "r") as in_file:
+        in_file.readline()
+
+        for line in in_file:
+            comp = line.strip().split("\t")
+            arguments.append(Argument(*comp))
+
+    return arguments
+
+
+def load_dimension_definitions(path: str) -> List[QualityDimension]:
+    dimensions = []
+
+    with open(path, "r") as in_file:
+        for line in in_file:
+            data = json.loads(line)
+            dimensions.append(QualityDimension(**data))
+
+    return dimensions
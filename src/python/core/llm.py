@@ -1,19 +1,26 @@
 import abc
+import asyncio
+import copy
 import os
+import time
 from enum import Enum
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
-import openai
-from retry import retry
-
-import torch
-import transformers
-from openai import OpenAI
-from transformers import AutoTokenizer, AutoModelForCausalLM
+from core.metrics import Metrics
+from core.parsing import first_rating
+from core.rate_limit import TokenBucket, backoff_delay
 
 
 class LLM(metaclass=abc.ABCMeta):
 
+    def __init__(self):
+        # Stage durations and token counts of the generation calls, see core/metrics.py.
+        self.metrics = Metrics()
+
+    @property
+    def name(self) -> str:
+        return self.__class__.__name__
+
     @abc.abstractmethod
     def generate(self, prompt: str) -> str:
         pass
@@ -25,24 +32,67 @@ class LLM(metaclass=abc.ABCMeta):
 
         return results
 
+    def generate_samples(self, prompts: List[str], num_samples: int) -> List[List[str]]:
+        """Generates `num_samples` responses to each prompt, by default with a call of generate_all per sample."""
+        return [list(samples) for samples in zip(*[self.generate_all(prompts) for _ in range(num_samples)])]
 
-class HFModel(LLM):
 
-    def __init__(self, model_name, device_map=None):
+class HFModel(LLM):
+    RATINGS = ["1", "2", "3", "?"]
+
+    DTYPES = ["float16", "bfloat16", "float32", "auto"]
+
+    def __init__(self, model_name, device_map=None, prefix_caching: bool = False, dtype: str = "float16",
+                 quantize: Optional[str] = None, max_memory: Optional[Dict] = None,
+                 offload_folder: Optional[str] = None, safetensors: bool = False):
+        """
+        Loads the model in `dtype` ("auto" keeps the type of the checkpoint) on the devices of `device_map`, at most
+        `max_memory` per device (e.g. {0: "20GiB", "cpu": "60GiB"} with device map "auto") and the rest offloaded to
+        `offload_folder`. With `safetensors`, only safetensors weights are loaded, which are memory-mapped instead of
+        unpickled. `quantize="int8"` replaces the linear layers by dynamically quantized int8 layers on the CPU.
+        """
         super().__init__()
+        # Heavy libraries are only imported once a backend is instantiated.
+        import torch
+        import transformers
+        from transformers import AutoTokenizer, AutoModelForCausalLM
+
         if device_map is None:
             device_map = {"": 0}
+        if dtype not in HFModel.DTYPES:
+            raise ValueError(f"Unknown dtype {dtype}, expected one of {', '.join(HFModel.DTYPES)}")
+        if quantize not in [None, "int8"]:
+            raise ValueError(f"Unknown quantization {quantize}, expected int8")
         self.model_name = model_name
+        self.prefix_caching = prefix_caching
+        # Loader settings that change the weights the responses are computed with, e.g. for the keys of a cache.
+        self.loading_options = {"dtype": dtype, "quantize": quantize, "safetensors": safetensors,
+                                "offload": offload_folder is not None}
+
+        loading_kwargs = {}
+        if max_memory is not None:
+            loading_kwargs["max_memory"] = max_memory
+        if offload_folder is not None:
+            loading_kwargs["offload_folder"] = offload_folder
+        if safetensors:
+            loading_kwargs["use_safetensors"] = True
 
         self.model = AutoModelForCausalLM.from_pretrained(
             self.model_name,
-            torch_dtype=torch.float16,
+            torch_dtype=dtype if dtype == "auto" else getattr(torch, dtype),
             device_map=device_map,
             return_dict=True,
             low_cpu_mem_usage=True,
+            **loading_kwargs
             # use_flash_attention_2=True
         )
 
+        if quantize == "int8":
+            devices = {parameter.device.type for parameter in self.model.parameters()}
+            if devices != {"cpu"} or "disk" in set(getattr(self.model, "hf_device_map", {}).values()):
+                raise ValueError("int8 quantization requires all weights on the CPU (e.g. --device-map cpu)")
+            quantize_linear_layers(self.model)
+
         self.tokenizer = AutoTokenizer.from_pretrained(
             self.model_name,
             trust_remote_code=True,
@@ -59,32 +109,44 @@ class HFModel(LLM):
             return_full_text=False,
         )
 
+        self.generation_kwargs = {
+            "do_sample": True,
+            "top_k": 40,
+            "top_p": 1.0,
+            "num_return_sequences": 1,
+            "eos_token_id": self.tokenizer.eos_token_id,
+            "max_new_tokens": 256,
+            "temperature": 0.3
+        }
+
+        # Whether decoding ends once the rating of a response is decided (see RatingStoppingCriteria).
+        self.stop_at_rating = False
+
+        self.rating_token_ids = None
+
+    def decoding_kwargs(self, **overrides) -> dict:
+        """
+        Arguments of a generation call: the generation parameters, the overrides, the stopping criteria and a streamer
+        that times the prefill and decoding of each generation.
+        """
+        kwargs = {**self.generation_kwargs, **overrides}
+        if self.stop_at_rating:
+            kwargs["stopping_criteria"] = [RatingStoppingCriteria(self.tokenizer)]
+        kwargs.setdefault("streamer", GenerationTimer(self.metrics, self.tokenizer.pad_token_id,
+                                                      kwargs.get("num_return_sequences", 1)))
+        return kwargs
+
     def generate(self, prompt: str) -> str:
-        sequences = self.pipeline(
-            prompt,
-            do_sample=True,
-            top_k=40,
-            top_p=1.0,
-            num_return_sequences=1,
-            eos_token_id=self.tokenizer.eos_token_id,
-            max_new_tokens=256,
-            temperature=0.3
-        )
+        sequences = self.pipeline(prompt, **self.decoding_kwargs())
 
         for seq in sequences:
             return seq["generated_text"]
 
     def generate_all(self, prompts: List[str]) -> List[str]:
-        response = self.pipeline(
-            prompts,
-            do_sample=True,
-            top_k=40,
-            top_p=1.0,
-            num_return_sequences=1,
-            eos_token_id=self.tokenizer.eos_token_id,
-            max_new_tokens=256,
-            temperature=0.3
-        )
+        if self.prefix_caching:
+            return self.generate_all_shared_prefix(prompts)
+
+        response = self.pipeline(prompts, **self.decoding_kwargs())
 
         results = []
         for sequence in response:
@@ -93,6 +155,260 @@ class HFModel(LLM):
 
         return results
 
+    def count_tokens(self, prompts: List[str]) -> List[int]:
+        with self.metrics.span("tokenize"):
+            return [len(input_ids) for input_ids in self.tokenizer(prompts)["input_ids"]]
+
+    def generate_batch(self, prompts: List[str]) -> Tuple[List[str], int]:
+        """
+        Generates the responses for all prompts in a single padded batch.
+
+        Returns the responses and the number of generated (non-padding) tokens.
+        """
+        import torch
+
+        with self.metrics.span("tokenize"):
+            inputs = self.tokenizer(prompts, return_tensors="pt", padding=True).to(self.model.device)
+
+        # The padding of the batch is not counted as prompt tokens.
+        streamer = GenerationTimer(self.metrics, self.tokenizer.pad_token_id,
+                                   prompt_tokens=int(inputs["attention_mask"].sum()))
+        with torch.no_grad():
+            outputs = self.model.generate(**inputs, pad_token_id=self.tokenizer.pad_token_id,
+                                          **self.decoding_kwargs(streamer=streamer))
+
+        generated = outputs[:, inputs["input_ids"].shape[1]:]
+        generated_tokens = int((generated != self.tokenizer.pad_token_id).sum())
+
+        with self.metrics.span("detokenize"):
+            return self.tokenizer.batch_decode(generated, skip_special_tokens=True), generated_tokens
+
+    def generate_all_shared_prefix(self, prompts: List[str]) -> List[str]:
+        """
+        Encodes the token prefix shared by all prompts (e.g. the instruction, issue, stance and argument of the prompts
+        for the dimensions of one argument) once and reuses its key-value cache for the generation of every prompt.
+        Falls back to ordinary generation if the prompts share no prefix.
+        """
+        return [samples[0] for samples in self._generate_shared_prefix(prompts, 1)]
+
+    def generate_samples(self, prompts: List[str], num_samples: int) -> List[List[str]]:
+        """
+        Generates `num_samples` responses to each prompt in a single call with `num_return_sequences`, so that each
+        prompt is tokenized once. With prefix caching, the key-value cache of each prompt is also computed once and
+        repeated for its samples.
+        """
+        if self.prefix_caching:
+            return self._generate_shared_prefix(prompts, num_samples)
+
+        response = self.pipeline(prompts, **self.decoding_kwargs(num_return_sequences=num_samples))
+        return [[seq["generated_text"] for seq in sequence] for sequence in response]
+
+    def _generate_shared_prefix(self, prompts: List[str], num_samples: int) -> List[List[str]]:
+        import torch
+        from transformers import DynamicCache
+
+        with self.metrics.span("tokenize"):
+            input_ids = self.tokenizer(prompts)["input_ids"]
+        generation_kwargs = self.decoding_kwargs(num_return_sequences=num_samples)
+
+        # The last token of each prompt is left to generate, which needs its logits.
+        prefix_length = min(common_prefix_length(input_ids), min(len(ids) for ids in input_ids) - 1)
+        if (len(prompts) < 2 and num_samples == 1) or prefix_length < 1:
+            response = self.pipeline(prompts, **generation_kwargs)
+            return [[seq["generated_text"] for seq in sequence] for sequence in response]
+
+        results = []
+        with torch.no_grad():
+            prefix_cache = DynamicCache()
+            with self.metrics.span("prefill"):
+                self.model(torch.tensor([input_ids[0][:prefix_length]], device=self.model.device),
+                           past_key_values=prefix_cache, use_cache=True)
+
+            for ids in input_ids:
+                cache = copy.deepcopy(prefix_cache)
+                if num_samples > 1:
+                    # Encode the rest of the prompt once, then decode all samples from copies of its cache.
+                    if len(ids) - 1 > prefix_length:
+                        with self.metrics.span("prefill"):
+                            self.model(torch.tensor([ids[prefix_length:-1]], device=self.model.device),
+                                       past_key_values=cache, use_cache=True)
+                    cache.batch_repeat_interleave(num_samples)
+
+                output = self.model.generate(torch.tensor([ids] * num_samples, device=self.model.device),
+                                             attention_mask=torch.ones(num_samples, len(ids), device=self.model.device),
+                                             past_key_values=cache,
+                                             pad_token_id=self.tokenizer.pad_token_id,
+                                             **{**generation_kwargs, "num_return_sequences": 1})
+                with self.metrics.span("detokenize"):
+                    results.append(self.tokenizer.batch_decode(output[:, len(ids):], skip_special_tokens=True))
+
+        return results
+
+    def get_rating_token_ids(self) -> Dict[str, List[int]]:
+        """Ids of all vocabulary tokens that decode to a rating, with or without surrounding whitespace."""
+        if self.rating_token_ids is None:
+            self.rating_token_ids = {rating: [] for rating in HFModel.RATINGS}
+            for token_id in range(len(self.tokenizer)):
+                token = self.tokenizer.decode([token_id]).strip()
+                if token in self.rating_token_ids:
+                    self.rating_token_ids[token].append(token_id)
+
+        return self.rating_token_ids
+
+    def score_ratings(self, prompts: List[str], sample: bool = False, answer_prefix: str = " ",
+                      batch_size: int = 16) -> List[Tuple[str, Dict[str, float]]]:
+        """
+        Rates each prompt with a single forward pass instead of decoding a response. The probabilities of the next token
+        after the prompt (followed by `answer_prefix`) are summed per rating and renormalized over the ratings.
+
+        Returns the most probable rating (or a rating sampled at the generation temperature) and the distribution.
+        """
+        import torch
+
+        rating_token_ids = self.get_rating_token_ids()
+        results = []
+
+        for start in range(0, len(prompts), batch_size):
+            batch = [prompt + answer_prefix for prompt in prompts[start:start + batch_size]]
+            with self.metrics.span("tokenize"):
+                inputs = self.tokenizer(batch, return_tensors="pt", padding=True).to(self.model.device)
+            self.metrics.add_tokens(prompt_tokens=int(inputs["attention_mask"].sum()))
+
+            # Prompts are padded on the left, so the last position holds the next-token logits of every prompt. The
+            # positions start at the first token of each prompt, as in generate, so that padding does not shift them.
+            position_ids = (inputs["attention_mask"].long().cumsum(-1) - 1).clamp(min=0)
+            with torch.no_grad(), self.metrics.span("prefill"):
+                logits = self.model(**inputs, position_ids=position_ids).logits[:, -1, :].float()
+
+            probabilities = torch.softmax(logits, dim=-1)
+            rating_probabilities = torch.stack(
+                [probabilities[:, rating_token_ids[rating]].sum(dim=-1) for rating in HFModel.RATINGS], dim=-1)
+            rating_probabilities = rating_probabilities / rating_probabilities.sum(dim=-1, keepdim=True)
+
+            if sample:
+                weights = rating_probabilities ** (1 / self.generation_kwargs["temperature"])
+                choices = torch.multinomial(weights / weights.sum(dim=-1, keepdim=True), 1).squeeze(-1)
+            else:
+                choices = rating_probabilities.argmax(dim=-1)
+
+            for choice, distribution in zip(choices.tolist(), rating_probabilities.tolist()):
+                results.append((HFModel.RATINGS[choice], dict(zip(HFModel.RATINGS, distribution))))
+
+        return results
+
+
+def quantize_linear_layers(model):
+    """
+    Replaces the linear layers of a model by dynamically quantized int8 layers: the weights are quantized per output
+    channel once, the activations per batch at run time. Layers are converted one at a time, so that besides the model
+    only one layer is held in float32. The output layer (`lm_head`) is left as it is, as it may share its weights with
+    the embeddings and the rating probabilities are read from its logits. The other parameters keep the type of the
+    model; the quantized layers compute in float32 and convert their input and output.
+    """
+    import torch
+    from torch.ao.nn.quantized.dynamic import Linear as DynamicQuantizedLinear
+    from torch.ao.quantization import per_channel_dynamic_qconfig
+
+    dtype = model.dtype
+    output_layer = model.get_output_embeddings()
+    # Only the names are collected, so that a replaced layer (and its float32 weights) is freed right away.
+    linear_layers = [(parent, name) for parent in model.modules() for name, child in parent.named_children()
+                     if isinstance(child, torch.nn.Linear) and child is not output_layer]
+    for parent, name in linear_layers:
+        layer = getattr(parent, name).float()
+        layer.qconfig = per_channel_dynamic_qconfig
+        quantized_layer = DynamicQuantizedLinear.from_float(layer)
+        if dtype != torch.float32:
+            quantized_layer.register_forward_pre_hook(lambda module, args: tuple(arg.float() for arg in args))
+            quantized_layer.register_forward_hook(lambda module, args, output: output.to(dtype))
+        setattr(parent, name, quantized_layer)
+        del layer
+
+
+class RatingStoppingCriteria:
+    """
+    Stopping criterion of Hugging Face generation that ends a sequence as soon as its response starts with a rating
+    (after whitespace). The first rule of parse_response then decides the rating, so the shortened response is parsed
+    to the same rating as the full one. Sequences whose response starts with other text are decoded in full.
+    """
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.previous = None
+        self.start = None
+        self.undecided = []
+
+    def __call__(self, input_ids, scores, **kwargs):
+        import torch
+
+        # The pipeline reuses the criterion for the generation of each prompt. A generation continues the sequences of
+        # the previous call by one token, anything else is a new generation.
+        if (self.previous is None or self.previous.shape != (input_ids.shape[0], input_ids.shape[1] - 1)
+                or not torch.equal(self.previous, input_ids[:, :-1])):
+            self.start = input_ids.shape[1] - 1
+            self.undecided = list(range(input_ids.shape[0]))
+        self.previous = input_ids
+
+        is_done = torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+        undecided = []
+        for row in self.undecided:
+            response = self.tokenizer.decode(input_ids[row, self.start:], skip_special_tokens=True)
+            if response.strip() == "":
+                undecided.append(row)
+            elif first_rating(response) is not None:
+                is_done[row] = True
+        self.undecided = undecided
+        return is_done
+
+
+class GenerationTimer:
+    """
+    Streamer of Hugging Face generation that records the prefill time (until the first token is generated), the decode
+    time and the token counts of each generation in the metrics. Generation passes the prompt ids (with a row per
+    returned sequence) and then the next token of every sequence to the streamer, and finished sequences get padding
+    tokens. The prompt tokens are counted from the unpadded prompt ids unless the count is given.
+    """
+
+    def __init__(self, metrics: Metrics, pad_token_id: int, num_return_sequences: int = 1,
+                 prompt_tokens: Optional[int] = None):
+        self.metrics = metrics
+        self.pad_token_id = pad_token_id
+        self.num_return_sequences = num_return_sequences
+        self.prompt_tokens = prompt_tokens
+        self.start_time = None
+
+    def put(self, value):
+        now = time.perf_counter()
+        if self.start_time is None:
+            # The pipeline reuses the streamer for the generation of each prompt.
+            self.start_time = now
+            self.first_token_time = None
+            self.generation_prompt_tokens = self.prompt_tokens
+            if self.generation_prompt_tokens is None:
+                self.generation_prompt_tokens = value[::self.num_return_sequences].numel()
+            self.completion_tokens = 0
+            return
+
+        if self.first_token_time is None:
+            self.first_token_time = now
+        self.completion_tokens += int((value != self.pad_token_id).sum())
+
+    def end(self):
+        if self.first_token_time is not None:
+            self.metrics.add("prefill", self.first_token_time - self.start_time)
+            self.metrics.add("decode", time.perf_counter() - self.first_token_time)
+        self.metrics.add_tokens(self.generation_prompt_tokens, self.completion_tokens)
+        self.start_time = None
+
+
+def common_prefix_length(sequences: List[List[int]]) -> int:
+    shortest = min(sequences, key=len)
+    for i, token in enumerate(shortest):
+        if any(sequence[i] != token for sequence in sequences):
+            return i
+
+    return len(shortest)
+
 
 class Param(Enum):
     SEVEN_B = "7b"
@@ -101,12 +417,12 @@ class Param(Enum):
 
 
 class LLama2(HFModel):
-    def __init__(self, param: Param = Param.SEVEN_B, device_map=None):
+    def __init__(self, param: Param = Param.SEVEN_B, device_map=None, **kwargs):
         if device_map is None:
             device_map = {"": 0}
         name = f"meta-llama/Llama-2-{param.value}-hf"
 
-        super().__init__(name, device_map)
+        super().__init__(name, device_map, **kwargs)
 
     # def generate(self, prompt: str) -> str:
     #     return super().generate(f"<s>[INST]\n{prompt}\n[/INST] {{answer}}</s>")
@@ -116,42 +432,132 @@ class LLama2(HFModel):
 
 
 class LLama27b(LLama2):
-    def __init__(self):
-        super().__init__(param=Param.SEVEN_B)
+    def __init__(self, **kwargs):
+        super().__init__(param=Param.SEVEN_B, **kwargs)
 
 
 class LLama213b(LLama2):
-    def __init__(self):
-        super().__init__(param=Param.THIRTEEN_B)
+    def __init__(self, **kwargs):
+        super().__init__(param=Param.THIRTEEN_B, **kwargs)
 
 
 class LLama270b(LLama2):
-    def __init__(self):
-        super().__init__(param=Param.SEVENTY_B, device_map="auto")
+    def __init__(self, **kwargs):
+        kwargs.setdefault("device_map", "auto")
+        super().__init__(param=Param.SEVENTY_B, **kwargs)
 
 
 class OpenAIModel(LLM):
-    def __init__(self, model_name):
+
+    def __init__(self, model_name, max_concurrency: int = 8, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None, max_retries: int = 10, base_url: Optional[str] = None):
         super().__init__()
+        import openai
+
+        if max_concurrency < 1 or max_retries < 1:
+            raise ValueError(f"max_concurrency ({max_concurrency}) and max_retries ({max_retries}) must be at least 1")
+        self.retry_errors = (openai.APIConnectionError, openai.APIStatusError)
         self.model_name = model_name
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=20.0, max_retries=0)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_url = base_url or os.getenv("OPENAI_BASE_URL")
+        self.generation_kwargs = {"max_tokens": 256, "temperature": 0.3, "top_p": 1.0}
+
+        self.request_bucket = None
+        if requests_per_minute is not None:
+            self.request_bucket = TokenBucket(requests_per_minute)
+
+        self.token_bucket = None
+        if tokens_per_minute is not None:
+            self.token_bucket = TokenBucket(tokens_per_minute)
 
-    @retry((openai.APIConnectionError, openai.RateLimitError, openai.APIStatusError), tries=10, delay=60)
     def generate(self, prompt: str) -> str:
-        response = self.client.chat.completions.create(
-            model=self.model_name,
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=256,
-            temperature=0.3,
-            top_p=1.0)
-        return response.choices[0].message.content
+        return self.generate_all([prompt])[0]
+
+    def generate_all(self, prompts: List[str]) -> List[str]:
+        return [samples[0] for samples in asyncio.run(self._generate_all(prompts))]
+
+    def generate_samples(self, prompts: List[str], num_samples: int) -> List[List[str]]:
+        """Generates `num_samples` responses to each prompt with a single request using the `n` parameter."""
+        return asyncio.run(self._generate_all(prompts, num_samples))
+
+    def estimate_tokens(self, prompt: str, num_samples: int = 1) -> int:
+        # Rough upper bound of ~4 characters per token plus the full completion budget of each sample, as the API
+        # counts it.
+        return len(prompt) // 4 + 1 + num_samples * self.generation_kwargs["max_tokens"]
+
+    async def _generate_all(self, prompts: List[str], num_samples: int = 1) -> List[List[str]]:
+        from openai import AsyncOpenAI
+
+        # The async client is bound to the event loop of this call.
+        client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url=self.base_url, timeout=20.0,
+                             max_retries=0)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async with client:
+            return await asyncio.gather(*[self._generate(client, semaphore, prompt, num_samples)
+                                          for prompt in prompts])
+
+    async def _generate(self, client, semaphore: asyncio.Semaphore, prompt: str, num_samples: int) -> List[str]:
+        for attempt in range(self.max_retries):
+            with self.metrics.span("rate_limit"):
+                if self.request_bucket is not None:
+                    await self.request_bucket.acquire()
+                if self.token_bucket is not None:
+                    await self.token_bucket.acquire(self.estimate_tokens(prompt, num_samples))
+
+            try:
+                async with semaphore:
+                    with self.metrics.span("api_wait"):
+                        response = await client.chat.completions.create(
+                            model=self.model_name,
+                            messages=[{"role": "user", "content": prompt}],
+                            **self.generation_kwargs,
+                            **({"n": num_samples} if num_samples > 1 else {}))
+                if response.usage is not None:
+                    self.metrics.add_tokens(response.usage.prompt_tokens, response.usage.completion_tokens)
+                return [choice.message.content for choice in sorted(response.choices, key=lambda c: c.index)]
+            except self.retry_errors as e:
+                if attempt == self.max_retries - 1 or not is_retryable(e):
+                    raise
+
+                # Sleep outside the semaphore so a throttled prompt does not hold back the other requests.
+                with self.metrics.span("backoff"):
+                    await asyncio.sleep(max(backoff_delay(attempt), retry_after(e)))
+
+
+# Status codes of transient errors: timeout, conflict, rate limit and server errors (5xx).
+RETRY_STATUS_CODES = {408, 409, 429}
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether a request that failed with the error can succeed when it is sent again."""
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        # Connection errors and timeouts.
+        return True
+    return status_code in RETRY_STATUS_CODES or status_code >= 500
+
+
+def retry_after(error: Exception) -> float:
+    response = getattr(error, "response", None)
+    if response is None:
+        return 0.0
+
+    try:
+        return float(response.headers.get("retry-after", 0))
+    except ValueError:
+        return 0.0
 
 
 class GPT4(OpenAIModel):
-    def __init__(self):
-        super().__init__("gpt-4")
+    def __init__(self, **kwargs):
+        super().__init__("gpt-4", **kwargs)
 
 
 class GPT3(OpenAIModel):
-    def __init__(self):
-        super().__init__("gpt-3.5-turbo")
+    def __init__(self, **kwargs):
+        super().__init__("gpt-3.5-turbo", **kwargs)
+
+
+MODELS = {model.__name__: model for model in [LLama27b, LLama213b, LLama270b, GPT3, GPT4]}
@@ -0,0 +1,161 @@
+import contextlib
+import json
+import math
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+QUANTILES = [0.5, 0.95, 0.99]
+
+
+def quantile(values: List[float], q: float) -> float:
+    """Quantile of sorted values, interpolated linearly between the closest ranks (as numpy.quantile)."""
+    position = (len(values) - 1) * q
+    lower = math.floor(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def peak_rss() -> Optional[int]:
+    """Peak resident set size of the process in bytes, or None where the resource module is not available."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def prometheus_labels(labels: dict) -> str:
+    escaped = {name: str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+               for name, value in labels.items()}
+    return "{" + ",".join(f"{name}=\"{value}\"" for name, value in escaped.items()) + "}"
+
+
+class Metrics:
+    """
+    Durations of the stages of an annotation run and the numbers of prompt and completion tokens, labeled with the
+    model and template they were recorded for. The caller updates the labels as the run moves on to another model or
+    template. The stages recorded by this repository are:
+
+    - load: loading a model
+    - build: building the prompts
+    - generate: a generation call of the annotation loop (wall time, including everything below)
+    - tokenize, prefill, decode, detokenize: the parts of a Hugging Face generation (prefill lasts until the first
+      token is generated)
+    - rate_limit, api_wait, backoff: waiting for the rate limits, for an OpenAI response and before a retry
+    - batch_wait: waiting for a batch of the OpenAI Batch API
+    - parse, write: parsing the responses and writing the log entries and ratings
+    """
+
+    def __init__(self, model: str = "", template: str = ""):
+        self.model = model
+        self.template = template
+        self.durations: Dict[Tuple[str, str, str], List[float]] = defaultdict(list)
+        self.tokens: Dict[Tuple[str, str], Counter] = defaultdict(Counter)
+
+    def add(self, stage: str, seconds: float):
+        self.durations[(self.model, self.template, stage)].append(seconds)
+
+    @contextlib.contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start_time)
+
+    def add_tokens(self, prompt_tokens: int = 0, completion_tokens: int = 0):
+        counts = self.tokens[(self.model, self.template)]
+        counts["prompt"] += prompt_tokens
+        counts["completion"] += completion_tokens
+
+    def merge(self, other: "Metrics"):
+        """Adds the durations and token counts of other metrics, e.g. of a worker process."""
+        for key, durations in other.durations.items():
+            self.durations[key].extend(durations)
+        for key, counts in other.tokens.items():
+            self.tokens[key].update(counts)
+
+    def throughput(self, model: str, template: str) -> Dict[str, Optional[float]]:
+        """Prompt and completion tokens, and completion tokens per second of the generation calls and of decoding."""
+        counts = self.tokens.get((model, template), Counter())
+        result = {"prompt_tokens": counts["prompt"], "completion_tokens": counts["completion"]}
+        for stage in ["generate", "decode"]:
+            seconds = sum(self.durations.get((model, template, stage), []))
+            result[f"{stage}_tokens_per_second"] = counts["completion"] / seconds if seconds > 0 else None
+        return result
+
+    def summary(self) -> List[dict]:
+        """A row with the count, total and quantiles of the durations per model, template and stage, and a row with
+        the token counts and throughput per model and template."""
+        rows = []
+        for (model, template, stage), durations in sorted(self.durations.items()):
+            values = sorted(durations)
+            rows.append({"model": model, "template": template, "stage": stage, "count": len(values),
+                         "seconds": sum(values),
+                         **{f"p{round(q * 100)}": quantile(values, q) for q in QUANTILES}})
+
+        for model, template in sorted(self.tokens):
+            rows.append({"model": model, "template": template, "stage": "tokens",
+                         **self.throughput(model, template)})
+        return rows
+
+    def format_summary(self) -> str:
+        lines = []
+        for row in self.summary():
+            name = f"{row['model']} {row['template']}".strip()
+            if row["stage"] == "tokens":
+                rates = ", ".join(f"{row[key]:.1f} {key.replace('_', ' ')}" for key in
+                                  ["generate_tokens_per_second", "decode_tokens_per_second"] if row[key] is not None)
+                lines.append(f"{name} tokens: {row['prompt_tokens']} prompt, {row['completion_tokens']} completion"
+                             + (f" ({rates})" if rates else ""))
+            else:
+                lines.append(f"{name} {row['stage']}: {row['count']} x, {row['seconds']:.2f}s, "
+                             f"p50 {row['p50']:.3f}s, p95 {row['p95']:.3f}s, p99 {row['p99']:.3f}s")
+        return "\n".join(lines)
+
+    def write_jsonl(self, path: str):
+        with open(path, "w") as out_file:
+            for row in self.summary():
+                out_file.write(json.dumps(row))
+                out_file.write("\n")
+
+    def write_prometheus(self, path: str, prefix: str = "argument_quality"):
+        """
+        Writes the summary in the Prometheus text format, e.g. for the textfile collector of the node exporter. The
+        file is replaced at once, so that a collector never reads a partial file.
+        """
+        lines = [f"# HELP {prefix}_stage_seconds Duration of the stages of the annotation.",
+                 f"# TYPE {prefix}_stage_seconds summary"]
+        token_lines = [f"# HELP {prefix}_tokens_total Number of prompt and completion tokens.",
+                       f"# TYPE {prefix}_tokens_total counter"]
+        rate_lines = [f"# HELP {prefix}_tokens_per_second Completion tokens per second of generation and decoding.",
+                      f"# TYPE {prefix}_tokens_per_second gauge"]
+
+        for row in self.summary():
+            labels = {"model": row["model"], "template": row["template"]}
+            if row["stage"] == "tokens":
+                for kind in ["prompt", "completion"]:
+                    token_lines.append(f"{prefix}_tokens_total{prometheus_labels({**labels, 'kind': kind})} "
+                                       f"{row[f'{kind}_tokens']}")
+                for stage in ["generate", "decode"]:
+                    if row[f"{stage}_tokens_per_second"] is not None:
+                        rate_lines.append(f"{prefix}_tokens_per_second{prometheus_labels({**labels, 'stage': stage})} "
+                                          f"{row[f'{stage}_tokens_per_second']}")
+                continue
+
+            labels["stage"] = row["stage"]
+            for q in QUANTILES:
+                lines.append(f"{prefix}_stage_seconds{prometheus_labels({**labels, 'quantile': str(q)})} "
+                             f"{row[f'p{round(q * 100)}']}")
+            lines.append(f"{prefix}_stage_seconds_sum{prometheus_labels(labels)} {row['seconds']}")
+            lines.append(f"{prefix}_stage_seconds_count{prometheus_labels(labels)} {row['count']}")
+
+        temp_path = path + ".tmp"
+        with open(temp_path, "w") as out_file:
+            out_file.write("\n".join(lines + token_lines + rate_lines) + "\n")
+        os.replace(temp_path, path)
@@ -0,0 +1,131 @@
+import json
+import os
+import time
+from typing import List, Optional, Tuple
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+FINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def batch_request(custom_id: str, model_name: str, prompt: str, generation_kwargs: dict) -> dict:
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": {"model": model_name, "messages": [{"role": "user", "content": prompt}], **generation_kwargs}
+    }
+
+
+def read_batch_output(text: str) -> dict:
+    """Maps the custom id of each line of a batch output or error file to its response, None for failed requests."""
+    responses = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        result = json.loads(line)
+        response = result.get("response") or {}
+        content = None
+        if response.get("status_code") == 200:
+            content = response["body"]["choices"][0]["message"]["content"]
+        responses[result["custom_id"]] = content
+    return responses
+
+
+class BatchJob:
+    """
+    A batch of prompts to an OpenAI model, run with the Batch API. The batch is tracked in a JSON state file (with the
+    batch input and output files next to it), so that a job created again with the same state file continues polling
+    the batch that was already submitted instead of submitting it again.
+    """
+
+    def __init__(self, llm, state_path: str):
+        self.llm = llm
+        self.state_path = state_path
+        self.state = None
+        if os.path.exists(state_path):
+            with open(state_path) as state_file:
+                self.state = json.load(state_file)
+
+        self._client = None
+
+    @property
+    def submitted(self) -> bool:
+        return self.state is not None
+
+    @property
+    def keys(self) -> List[Tuple]:
+        return [tuple(key) for key in self.state["keys"]]
+
+    @property
+    def client(self):
+        if self._client is None:
+            from openai import OpenAI
+
+            self._client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url=self.llm.base_url,
+                                  max_retries=self.llm.max_retries)
+        return self._client
+
+    def file_path(self, kind: str) -> str:
+        return f"{os.path.splitext(self.state_path)[0]}.{kind}.jsonl"
+
+    def save(self):
+        temp_path = self.state_path + ".tmp"
+        with open(temp_path, "w") as state_file:
+            json.dump(self.state, state_file)
+        os.replace(temp_path, self.state_path)
+
+    def submit(self, keys: List[Tuple], prompts: List[str]):
+        """Writes the prompts to a batch input file, uploads it and creates the batch. `keys` identify the prompts."""
+        input_path = self.file_path("input")
+        with open(input_path, "w") as input_file:
+            for i, prompt in enumerate(prompts):
+                input_file.write(json.dumps(batch_request(f"request-{i}", self.llm.model_name, prompt,
+                                                          self.llm.generation_kwargs)))
+                input_file.write("\n")
+
+        with open(input_path, "rb") as input_file:
+            uploaded = self.client.files.create(file=input_file, purpose="batch")
+        batch = self.client.batches.create(input_file_id=uploaded.id, endpoint=BATCH_ENDPOINT,
+                                           completion_window="24h")
+
+        self.state = {"batch_id": batch.id, "input_file_id": uploaded.id, "model": self.llm.model_name,
+                      "status": batch.status, "keys": [list(key) for key in keys]}
+        self.save()
+
+    def wait(self, poll_interval: float):
+        """Polls the batch until it has finished and returns it."""
+        while True:
+            batch = self.client.batches.retrieve(self.state["batch_id"])
+            if batch.status != self.state["status"]:
+                self.state["status"] = batch.status
+                self.save()
+            if batch.status in FINAL_STATUSES:
+                return batch
+            time.sleep(poll_interval)
+
+    def results(self, poll_interval: float = 60.0) -> List[Optional[str]]:
+        """
+        Waits for the batch and returns the response to each prompt in the order of the keys, None for requests that
+        failed or were not run before the batch expired. The output is downloaded once and kept next to the state file.
+        """
+        output_path = self.file_path("output")
+        if not os.path.exists(output_path):
+            batch = self.wait(poll_interval)
+            if batch.status == "failed" and batch.output_file_id is None:
+                raise RuntimeError(f"Batch {batch.id} failed: {batch.errors}")
+
+            text = ""
+            for file_id in [batch.output_file_id, batch.error_file_id]:
+                if file_id is not None:
+                    text += self.client.files.content(file_id).text + "\n"
+
+            temp_path = output_path + ".tmp"
+            with open(temp_path, "w") as output_file:
+                output_file.write(text)
+            os.replace(temp_path, output_path)
+
+        with open(output_path) as output_file:
+            responses = read_batch_output(output_file.read())
+        return [responses.get(f"request-{i}") for i in range(len(self.state["keys"]))]
+
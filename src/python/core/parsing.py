@@ -0,0 +1,135 @@
+import re
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+FIRST_OCCURRENCE_PATTERN = re.compile(r"^\s*[1-3?](?: ?- ?(?:High|Medium|Low|Cannot judge))?", re.DOTALL)
+
+ANSWER_PATTERN = re.compile(r"(?<=### Your answer:\n)^[1-3?](?: ?- ?(?:High|Medium|Low|Cannot judge))?", re.MULTILINE)
+
+RATING_PATTERN = re.compile(r"[1-3?](?: ?- ?(?:High|Medium|Low|Cannot judge))?")
+
+
+def parse_response(response: str) -> Optional[str]:
+    pattern_sequence = [FIRST_OCCURRENCE_PATTERN, ANSWER_PATTERN, RATING_PATTERN]
+
+    for pattern in pattern_sequence:
+        matches = re.findall(pattern, response)
+        match = None
+        if len(matches) > 0:
+            if len(matches) > 1:
+                if matches.count(matches[0]) == len(matches):
+                    match = matches[0]
+            else:
+                match = matches[0]
+
+        if match is not None:
+            return match.split("-")[0].strip()
+
+    return None
+
+
+RATING_CHARACTERS = "123?"
+
+ANSWER_PREFIX = "### Your answer:\n"
+
+RATING_SUFFIX_PATTERN = re.compile(r" ?- ?(?:High|Medium|Low|Cannot judge)")
+
+
+class ParsedResponse(NamedTuple):
+    rating: Optional[str]
+    # Rule of parse_response that produced the rating: "first" (the response starts with a rating), "answer" (all
+    # ratings after "### Your answer:" agree) or "unanimous" (all ratings in the response agree); None if none applied.
+    rule: Optional[str]
+
+
+# Results are immutable, so that a single instance of each is shared.
+_FIRST_RESULTS = {rating: ParsedResponse(rating, "first") for rating in RATING_CHARACTERS}
+_ANSWER_RESULTS = {rating: ParsedResponse(rating, "answer") for rating in RATING_CHARACTERS}
+_UNANIMOUS_RESULTS = {rating: ParsedResponse(rating, "unanimous") for rating in RATING_CHARACTERS}
+_UNPARSED = ParsedResponse(None, None)
+
+_ANSWER_PREFIX_LENGTH = len(ANSWER_PREFIX)
+
+_SUFFIX_STARTS = {" ", "-"}
+
+# A rating character followed by a suffix, i.e. a match of RATING_PATTERN that is longer than the character.
+_SUFFIXED_PATTERNS = {rating: re.compile(re.escape(rating) + RATING_SUFFIX_PATTERN.pattern)
+                      for rating in RATING_CHARACTERS}
+
+
+def _rating_match(response: str, position: int) -> str:
+    # The match of RATING_PATTERN that starts at the rating character at `position`.
+    if response[position + 1:position + 2] not in _SUFFIX_STARTS:
+        return response[position]
+    suffix = RATING_SUFFIX_PATTERN.match(response, position + 1)
+    return response[position:suffix.end()] if suffix is not None else response[position]
+
+
+def _parse(response: str) -> ParsedResponse:
+    # lstrip returns the response itself unless it starts with whitespace.
+    result = _FIRST_RESULTS.get(response.lstrip()[:1])
+    if result is not None:
+        return result
+
+    # Ratings directly after an answer heading, all of which have to agree.
+    position = response.find(ANSWER_PREFIX)
+    if position != -1:
+        answer = None
+        while position != -1:
+            start = position + _ANSWER_PREFIX_LENGTH
+            if response[start:start + 1] in _FIRST_RESULTS:
+                match = _rating_match(response, start)
+                if answer is None:
+                    answer = match
+                elif match != answer:
+                    answer = None
+                    break
+            position = response.find(ANSWER_PREFIX, start)
+        if answer is not None:
+            return _ANSWER_RESULTS[answer[0]]
+
+    # Every rating character starts a match of RATING_PATTERN (the optional suffix contains none), so the matches can
+    # only agree if a single rating character occurs.
+    character = None
+    for rating in RATING_CHARACTERS:
+        if rating in response:
+            if character is not None:
+                return _UNPARSED
+            character = rating
+    if character is None:
+        return _UNPARSED
+
+    if "-" not in response:
+        # Without a hyphen, no match has a suffix.
+        return _UNANIMOUS_RESULTS[character]
+
+    position = response.find(character)
+    following = response.find(character, position + 1)
+    if following == -1:
+        return _UNANIMOUS_RESULTS[character]
+
+    first = _rating_match(response, position)
+    if len(first) == 1:
+        # The matches agree if no other occurrence of the character has a suffix.
+        if _SUFFIXED_PATTERNS[character].search(response, following) is not None:
+            return _UNPARSED
+        return _UNANIMOUS_RESULTS[character]
+    # The suffix contains no rating character and none of its alternatives is a prefix of another, so an occurrence
+    # of the character matches `first` exactly if the text starts with it there.
+    return _UNANIMOUS_RESULTS[character] if response.count(first) == response.count(character) else _UNPARSED
+
+
+def first_rating(response: str) -> Optional[str]:
+    """
+    The rating if the response starts with one (after whitespace). parse_response then returns this rating for the
+    response and for every continuation of it.
+    """
+    result = _FIRST_RESULTS.get(response.lstrip()[:1])
+    return result.rating if result is not None else None
+
+
+def parse_responses(responses: Iterable[str]) -> Iterator[ParsedResponse]:
+    """
+    Parses each response with the rules of parse_response and the same result, using substring searches instead of
+    three regular expression scans per response. Yields the rating and the rule that produced it.
+    """
+    return map(_parse, responses)
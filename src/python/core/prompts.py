@@ -1,8 +1,13 @@
+import dataclasses
+import string
 from enum import Enum
+from typing import List, Optional, Sequence, Union
 
 from core.argument import Argument
 from core.quality_dimension import QualityDimension
 
+ARGUMENT_FIELDS = frozenset(field.name for field in dataclasses.fields(Argument))
+
 
 class PromptTemplate(Enum):
     EXPERT_TEMPLATE = ("{knowledge_types} Choose one of the options below:\n"
@@ -45,30 +50,87 @@ class PromptBuilder:
         self.prompt_template = prompt_template
         self.default_types = []
         self.custom_types = None
+        self._knowledge_types = None
+        self._compiled = {}
 
     def with_knowledge(self, knowledge: str):
         if self.custom_types is None:
             self.custom_types = []
 
         self.custom_types.append(knowledge)
-
-    def build(self, argument: Argument, dimension: QualityDimension):
-        considered_types = self.default_types
-        if self.custom_types is not None:
-            considered_types = self.custom_types
-
-        knowledge_types = ""
-
-        for knowledge_type in considered_types:
-            if knowledge_types != "":
-                knowledge_types += "\n\n"
-
-            knowledge_types += knowledge_type
-
+        self._knowledge_types = None
+        self._compiled = {}
+
+    def knowledge_types(self) -> str:
+        """The knowledge blocks of the builder, joined once."""
+        if self._knowledge_types is None:
+            considered_types = self.default_types
+            if self.custom_types is not None:
+                considered_types = self.custom_types
+
+            # Leading empty blocks are not followed by a separator.
+            start = 0
+            while start < len(considered_types) and considered_types[start] == "":
+                start += 1
+            self._knowledge_types = "\n\n".join(considered_types[start:])
+        return self._knowledge_types
+
+    def format_prompt(self, argument: Argument, dimension: QualityDimension) -> str:
+        """
+        Builds the prompt by formatting the template with the knowledge blocks and then the result with the variables
+        of the argument and dimension. `build` returns the same prompt from a compiled template where possible.
+        """
         variables = {**argument.__dict__, **dimension.__dict__}
-        prompt = self.prompt_template.value.format(knowledge_types=knowledge_types, **variables)
+        prompt = self.prompt_template.value.format(knowledge_types=self.knowledge_types(), **variables)
         return prompt.format(**variables)
 
+    def compile(self, dimension: QualityDimension) -> Optional[str]:
+        """
+        Format string of the prompts of the dimension in which only the argument fields remain to be filled in, or
+        None if the template cannot be compiled, e.g. because it refers to argument fields itself (whose values are
+        then formatted a second time) or uses conversions or format specifications.
+        """
+        key = tuple(dimension.__dict__.values())
+        if key not in self._compiled:
+            self._compiled[key] = self._compile(dimension)
+        return self._compiled[key]
+
+    def _compile(self, dimension: QualityDimension) -> Optional[str]:
+        formatter = string.Formatter()
+        dimension_variables = dimension.__dict__
+        try:
+            for _, field_name, format_spec, conversion in formatter.parse(self.prompt_template.value):
+                if field_name is None:
+                    continue
+                if format_spec or conversion or (field_name != "knowledge_types"
+                                                 and field_name not in dimension_variables):
+                    return None
+            prompt = self.prompt_template.value.format(knowledge_types=self.knowledge_types(), **dimension_variables)
+
+            parts = []
+            for literal, field_name, format_spec, conversion in formatter.parse(prompt):
+                parts.append(literal.replace("{", "{{").replace("}", "}}"))
+                if field_name is None:
+                    continue
+                if format_spec or conversion:
+                    return None
+                if field_name in dimension_variables:
+                    parts.append(format(dimension_variables[field_name]).replace("{", "{{").replace("}", "}}"))
+                elif field_name in ARGUMENT_FIELDS:
+                    parts.append(f"{{{field_name}}}")
+                else:
+                    return None
+        except (ValueError, KeyError, IndexError):
+            # The prompt cannot be formatted, format_prompt raises the error.
+            return None
+        return "".join(parts)
+
+    def build(self, argument: Argument, dimension: QualityDimension):
+        compiled = self.compile(dimension)
+        if compiled is None:
+            return self.format_prompt(argument, dimension)
+        return compiled.format_map(argument.__dict__)
+
 
 class ExpertPromptBuilder(PromptBuilder):
     INSTRUCTION = ("### Instruction:\nPlease answer the following questions for the given comment from an online "
@@ -116,3 +178,77 @@ class NovicePromptBuilder(PromptBuilder):
             NovicePromptBuilder.ARGUMENT,
             NovicePromptBuilder.DEFINITION
         ]
+
+
+def create_prompt_builder(prompt_template: PromptTemplate) -> PromptBuilder:
+    if prompt_template.name in (PromptTemplate.NOVICE_TEMPLATE.name, PromptTemplate.NOVICE_REASONING_TEMPLATE.name):
+        return NovicePromptBuilder(prompt_template)
+    return ExpertPromptBuilder(prompt_template)
+
+
+class PromptMatrix:
+    """
+    Prompts of all templates, arguments and dimensions, stored in a flat list in this order (see `index`). With a
+    tokenizer, the token ids of all prompts are stored in one array, the ids of prompt i being
+    `input_ids[offsets[i]:offsets[i + 1]]`.
+    """
+
+    def __init__(self, templates: List[str], argument_ids: List[str], dimensions: List[str], prompts: List[str],
+                 input_ids=None, offsets=None):
+        self.templates = templates
+        self.argument_ids = argument_ids
+        self.dimensions = dimensions
+        self.prompts = prompts
+        self.input_ids = input_ids
+        self.offsets = offsets
+
+    @property
+    def shape(self):
+        return len(self.templates), len(self.argument_ids), len(self.dimensions)
+
+    def __len__(self):
+        return len(self.prompts)
+
+    def index(self, template: int, argument: int, dimension: int) -> int:
+        return (template * len(self.argument_ids) + argument) * len(self.dimensions) + dimension
+
+    def __getitem__(self, key) -> str:
+        return self.prompts[self.index(*key)]
+
+    def token_ids(self, i: int):
+        return self.input_ids[self.offsets[i]:self.offsets[i + 1]]
+
+    def num_tokens(self):
+        return self.offsets[1:] - self.offsets[:-1]
+
+
+def materialize(arguments: Sequence[Argument], dimensions: Sequence[QualityDimension],
+                templates: Sequence[Union[PromptTemplate, PromptBuilder]], tokenizer=None) -> PromptMatrix:
+    """
+    Builds the prompts of all arguments and dimensions with each template (or builder, e.g. one with custom
+    knowledge), optionally tokenized with the tokenizer of an HFModel.
+    """
+    builders = [template if isinstance(template, PromptBuilder) else create_prompt_builder(template)
+                for template in templates]
+
+    prompts = []
+    for builder in builders:
+        compiled = [builder.compile(dimension) for dimension in dimensions]
+        for argument in arguments:
+            variables = argument.__dict__
+            prompts += [builder.format_prompt(argument, dimension) if template is None
+                        else template.format_map(variables) for template, dimension in zip(compiled, dimensions)]
+
+    matrix = PromptMatrix([builder.prompt_template.name for builder in builders],
+                          [argument.id for argument in arguments], [dimension.dimension for dimension in dimensions],
+                          prompts)
+
+    if tokenizer is not None:
+        import numpy as np
+
+        input_ids = tokenizer(prompts)["input_ids"]
+        matrix.offsets = np.zeros(len(prompts) + 1, dtype=np.int64)
+        np.cumsum([len(ids) for ids in input_ids], out=matrix.offsets[1:])
+        matrix.input_ids = np.fromiter((token_id for ids in input_ids for token_id in ids), dtype=np.int32,
+                                       count=int(matrix.offsets[-1]))
+    return matrix
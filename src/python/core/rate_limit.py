@@ -0,0 +1,44 @@
+import asyncio
+import random
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """Asynchronous token bucket that refills continuously at `rate_per_minute` tokens per minute."""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+        self.lock = None
+        self.loop = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    async def acquire(self, amount: float = 1.0):
+        amount = min(amount, self.capacity)
+
+        # The bucket outlives the event loops of single generate_all calls, its lock must not.
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self.lock = asyncio.Lock()
+            self.loop = loop
+
+        # Waiters queue on the lock so that a large request is not starved by a stream of small ones.
+        async with self.lock:
+            self._refill()
+            while self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+                self._refill()
+
+            self.tokens -= amount
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """Exponential backoff with full jitter for the given (zero-based) attempt."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
@@ -0,0 +1,132 @@
+import contextlib
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+from core.parsing import ANSWER_PREFIX, RATING_CHARACTERS, ParsedResponse
+
+STRICT_ANSWER_INSTRUCTION = "Answer with exactly one of the options (3, 2, 1 or ?) and nothing else."
+
+
+def with_instruction(prompt: str, instruction: str) -> str:
+    """Adds the instruction before the answer heading that ends the prompt, or at the end of other prompts."""
+    heading = ANSWER_PREFIX.rstrip("\n")
+    if prompt.endswith(heading):
+        return f"{prompt[:-len(heading)]}{instruction}\n\n{heading}"
+    return f"{prompt}\n\n{instruction}"
+
+
+@dataclass
+class RetryItem:
+    key: Any
+    prompt: str
+    tries: int
+    # Items of a group (e.g. of a template) are retried with the same settings, see RetryQueue.rounds.
+    group: Any = None
+
+
+class RetryQueue:
+    """
+    Collects the prompts with unparseable responses across a sweep and issues them again in rounds instead of right
+    after each argument. A round sends all pending prompts with the same number of tries in batches of `batch_size`
+    prompts per generate_all call. Each retry can raise the sampling temperature by `temperature_step` (up to
+    `max_temperature`) and add a stricter answer instruction to the prompt.
+    """
+
+    def __init__(self, llm, batch_size: int = 64, temperature_step: float = 0.0, max_temperature: float = 1.0,
+                 instruction: Optional[str] = None):
+        self.llm = llm
+        self.batch_size = batch_size
+        self.temperature_step = temperature_step
+        self.max_temperature = max_temperature
+        self.instruction = instruction
+        self.pending: List[RetryItem] = []
+
+    def __len__(self):
+        return len(self.pending)
+
+    def add(self, key: Any, prompt: str, tries: int, group: Any = None):
+        """Adds a prompt (without the retry instruction) whose responses of `tries` tries could not be parsed."""
+        self.pending.append(RetryItem(key, prompt, tries, group))
+
+    def retry_prompt(self, item: RetryItem) -> str:
+        return item.prompt if self.instruction is None else with_instruction(item.prompt, self.instruction)
+
+    @contextlib.contextmanager
+    def temperature(self, tries: int):
+        generation_kwargs = getattr(self.llm, "generation_kwargs", None)
+        if self.temperature_step == 0 or generation_kwargs is None or "temperature" not in generation_kwargs:
+            yield
+            return
+
+        temperature = generation_kwargs["temperature"]
+        generation_kwargs["temperature"] = min(temperature + tries * self.temperature_step,
+                                               max(temperature, self.max_temperature))
+        try:
+            yield
+        finally:
+            generation_kwargs["temperature"] = temperature
+
+    def rounds(self, prepare: Optional[Callable[[Any], None]] = None) \
+            -> Iterator[Tuple[List[RetryItem], List[str], List[str], float]]:
+        """
+        Generates new responses for the pending items batch by batch until none are pending, including items added
+        meanwhile. The batches of a round are formed per group, and `prepare` is called with the group before each
+        batch. Yields the items (with their tries counted), the prompts sent, the responses and the run time.
+        """
+        while len(self.pending) > 0:
+            tries = min(item.tries for item in self.pending)
+            groups = {}
+            for item in self.pending:
+                if item.tries == tries:
+                    groups.setdefault(item.group, []).append(item)
+            self.pending = [item for item in self.pending if item.tries != tries]
+
+            for group, items in groups.items():
+                if prepare is not None:
+                    prepare(group)
+
+                for start in range(0, len(items), self.batch_size):
+                    batch = items[start:start + self.batch_size]
+                    prompts = [self.retry_prompt(item) for item in batch]
+
+                    start_time = time.time()
+                    with self.temperature(tries):
+                        responses = self.llm.generate_all(prompts)
+                    run_time = time.time() - start_time
+
+                    for item in batch:
+                        item.tries += 1
+                    yield batch, prompts, responses, run_time
+
+
+class ParseStats:
+    """Number of responses per try that each rule of parse_response rated, and the reasons of the failures."""
+
+    def __init__(self):
+        self.rules = defaultdict(Counter)
+        self.failures = defaultdict(Counter)
+
+    def record(self, result: ParsedResponse, response: Optional[str], tries: int):
+        self.rules[tries][result.rule or "unparsed"] += 1
+        if result.rating is None:
+            if response is None:
+                reason = "no response"
+            elif any(rating in response for rating in RATING_CHARACTERS):
+                reason = "conflicting ratings"
+            else:
+                reason = "no rating"
+            self.failures[tries][reason] += 1
+
+    def to_dict(self) -> dict:
+        return {str(tries): {"rules": dict(self.rules[tries]), "failures": dict(self.failures[tries])}
+                for tries in sorted(self.rules)}
+
+    def summary(self) -> str:
+        lines = []
+        for tries in sorted(self.rules):
+            rules = ", ".join(f"{rule} {count}" for rule, count in sorted(self.rules[tries].items()))
+            failures = ", ".join(f"{reason} {count}" for reason, count in sorted(self.failures[tries].items()))
+            lines.append(f"try {tries}: {rules}" + (f" (failures: {failures})" if failures else ""))
+        return "\n".join(lines)
@@ -6,6 +6,43 @@ import warnings
 warnings.filterwarnings('ignore')
 
 
+def get_perfect_agreement_subsets(data, name):
+    """
+    Selects the arguments with perfect agreement on each quality dimension.
+
+    Parameters:
+    data (pd.DataFrame): Human annotations with the columns id, annotator, a third column and one column per dimension.
+    name (str): Name of the annotation set, used in the annotator names.
+
+    Returns:
+    dict: The rows of the arguments that more than one annotator rated and that received the same rating from all
+    annotators, with the columns id, annotator and the dimension, for each dimension.
+    """
+    quality_dimensions = data.columns[3:]
+
+    # Order the rows by the first occurrence of their id, as when selecting the rows id by id.
+    groups = data.groupby('id', sort=False)
+    data = data.iloc[groups.ngroup().argsort(kind='stable')]
+    groups = data.groupby('id', sort=False)
+
+    multiple_annotators = groups['annotator'].transform('nunique') > 1
+    perfect = groups[list(quality_dimensions)].transform('nunique') == 1
+    annotators = 'human-' + name + '-' + data['annotator'].astype(str)
+
+    subsets = {}
+    for dimension in quality_dimensions:
+        mask = perfect[dimension] & multiple_annotators
+        subsets[dimension] = pd.DataFrame({'id': data['id'][mask], 'annotator': annotators[mask],
+                                           dimension: data[dimension][mask]})
+    return subsets
+
+
+def load_perfect_agreement(file_path):
+    """Reads the human annotations of a file and returns the perfect-agreement subsets of each quality dimension."""
+    data = pd.read_csv(file_path, sep='\t', encoding='latin-1')
+    return get_perfect_agreement_subsets(data, os.path.basename(file_path).split(".")[0])
+
+
 def select_perfect_agreement(file_path, save=False, output_dir=None):
     """
     Selects and saves arguments with perfect agreement on quality dimensions.
@@ -19,23 +56,14 @@ def select_perfect_agreement(file_path, save=False, output_dir=None):
     None
     """
     filename = os.path.basename(file_path)
-    data = pd.read_csv(file_path, sep='\t', encoding='latin-1')
-    quality_dimensions = data.columns[3:]
+    subsets = load_perfect_agreement(file_path)
 
     if save:
         output_dir = f"{output_dir}-{filename.split('.')[0]}"
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
 
-    for dimension in quality_dimensions:
-        unique_ids = data['id'].unique()
-        perfect_subset = pd.DataFrame()
-        for unique_id in unique_ids:
-            subset_df = data.loc[data['id'] == unique_id]
-            if subset_df[dimension].nunique() == 1 and subset_df['annotator'].nunique() > 1:
-                subset_df['annotator'] = subset_df['annotator'].apply(lambda x: f'human-{os.path.basename(file_path).split(".")[0]}-{x}')
-                # f'human-{os.path.basename(file_path).split(".")[0]}-{subset_df["annotator"]}'
-                perfect_subset = perfect_subset.append(subset_df[['id', 'annotator', dimension]])
+    for dimension, perfect_subset in subsets.items():
         if save:
             perfect_subset.to_csv(f"{output_dir}/{dimension}-{filename}", sep='\t', index=False)
         print(f"{dimension}: {len(perfect_subset.id.unique())}")
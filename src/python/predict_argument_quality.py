@@ -1,168 +1,1005 @@
-import copy
+import argparse
+import contextlib
 import datetime
+import functools
+import glob
+import itertools
 import json
+import multiprocessing
+import os
 import re
 import sys
 import time
-from typing import Optional
+import traceback
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from core.batching import BatchScheduler
+from core.cache import ResponseCache, CachedLLM
+from core.columnar import convert
+from core.data import load_arguments, load_dimension_definitions
+from core.llm import MODELS, HFModel, OpenAIModel
+from core.metrics import Metrics, peak_rss
+from core.openai_batch import BatchJob
+from core.parsing import parse_response, parse_responses
+from core.retry import STRICT_ANSWER_INSTRUCTION, ParseStats, RetryQueue
+from core.prompts import PromptTemplate, PromptBuilder, NovicePromptBuilder, create_prompt_builder
+
+MAX_TRIES = 5
+
+
+def get_prompt_builder(prompt_template: PromptTemplate):
+    prompt_builder = create_prompt_builder(prompt_template)
+
+    if isinstance(prompt_builder, NovicePromptBuilder):
+        prompt_condition = "novice"
+
+        if prompt_template.name == PromptTemplate.NOVICE_REASONING_TEMPLATE.name:
+            prompt_condition += "-reasoning"
+    else:
+        prompt_condition = "expert"
+
+        if prompt_template.name == PromptTemplate.EXPERT_REASONING_TEMPLATE.name:
+            prompt_condition += "-reasoning"
+
+    return prompt_builder, prompt_condition
+
+
+def get_sweep_index(model_name: str, resume: bool, num_samples: int = 1) -> int:
+    """
+    Number of the (first of `num_samples`) ratings files per template of a sweep over all templates of a model. A new
+    sweep is numbered after the highest ratings file of any template of the model, so that all its templates share the
+    number, while resuming continues the latest sweep. As all files of a sweep are created when it starts (see
+    `get_template_runs`), the highest number is the last of its `num_samples` files, however early it was interrupted.
+    """
+    file_pattern = re.compile(rf"{re.escape(model_name)}-(?:expert|novice)(?:-reasoning)?-([0-9]+)\.jsonl")
+    numbers = [int(match.group(1)) for match in map(file_pattern.fullmatch, os.listdir("data/ratings"))
+               if match is not None]
+
+    annotator_index = max(numbers, default=0)
+    if not resume or annotator_index == 0:
+        return annotator_index + 1
+
+    return max(annotator_index - num_samples + 1, 1)
+
+
+def load_finished_ratings(ratings_path: str, log_dir: str) -> Set[Tuple[str, str]]:
+    """
+    Collects the (argument id, dimension) pairs already rated for the given ratings file. Final ratings that reached
+    the logs but not the ratings file before an interruption are appended to the ratings file.
+    """
+    finished = set()
+    if os.path.exists(ratings_path):
+        with open(ratings_path, "r") as in_file:
+            for line in in_file:
+                # A line cut off by the interruption is rated again.
+                if line.endswith("\n"):
+                    rating = json.loads(line)
+                    finished.add((rating["id"], rating["dimension"]))
+
+        # Drop a trailing partial line so that appended ratings start on a line of their own.
+        with open(ratings_path, "r+") as in_file:
+            content = in_file.read()
+            in_file.seek(content.rfind("\n") + 1)
+            in_file.truncate()
+
+    ratings_file_name = os.path.basename(ratings_path)
+    recovered = []
+    for log_path in sorted(glob.glob(os.path.join(log_dir, "*.jsonl"))):
+        with open(log_path, "r") as log_file:
+            for line in log_file:
+                if ratings_file_name not in line or not line.endswith("\n"):
+                    continue
+
+                entry = json.loads(line)
+                key = (entry["id"], entry["dimension"])
+                if (entry.get("ratings_file") == ratings_file_name and key not in finished
+                        and (entry["parsed_response"] is not None or entry["try"] == MAX_TRIES)):
+                    finished.add(key)
+                    recovered.append({"id": entry["id"], "dimension": entry["dimension"],
+                                      "rating": entry["parsed_response"]})
+
+    with open(ratings_path, "a") as out_file:
+        for rating in recovered:
+            out_file.write(json.dumps(rating))
+            out_file.write("\n")
+
+    return finished
+
+
+def write_jsonl_line(file, data: dict):
+    file.write(json.dumps(data))
+    file.write("\n")
+    file.flush()
+
+
+def annotate_batched(llm, template_runs, arguments, dimensions, log_file, max_batch_tokens, decoding, sample_index):
+    """
+    Annotates all arguments with the templates of `template_runs`, with prompts pooled across arguments and templates
+    and batched by tokenized length. Templates that are decoded with the same settings (token budget, stop at the
+    rating) share batches. Prompts with unparseable responses are scheduled again once all other prompts were, up to
+    MAX_TRIES times.
+    """
+    scheduler = BatchScheduler(llm, max_batch_tokens, max_tries=MAX_TRIES)
+
+    # The template runs per decoding settings, which form the groups of the scheduler.
+    groups = {}
+    for template_run in template_runs:
+        prepare_template_run(llm, decoding, template_run, sample_index)
+        model = llm.llm if isinstance(llm, CachedLLM) else llm
+        settings = (model.generation_kwargs["max_new_tokens"], model.stop_at_rating)
+        groups.setdefault(settings, []).append(template_run)
+
+        keys = [(template_run, argument, dimension) for argument in arguments for dimension in dimensions
+                if (argument.id, dimension.dimension) not in template_run.finished]
+        with llm.metrics.span("build"):
+            prompts = [template_run.prompt_builder.build(argument, dimension) for _, argument, dimension in keys]
+        scheduler.submit(keys, prompts, settings)
+
+    def prepare(settings):
+        prepare_template_run(llm, decoding, groups[settings][0], sample_index)
+        llm.metrics.template = "+".join(template_run.prompt_template.name for template_run in groups[settings])
+
+    with contextlib.ExitStack() as stack:
+        out_files = {template_run.out_file_name: stack.enter_context(
+            open(os.path.join("data/ratings", template_run.out_file_name), "a")) for template_run in template_runs}
+
+        for batch, responses, stats in scheduler.run(prepare):
+            timestamp = datetime.datetime.now() - datetime.timedelta(seconds=stats.run_time)
+            llm.metrics.add("generate", stats.run_time)
+
+            with llm.metrics.span("parse"):
+                ratings = [parse_response(response) for response in responses]
+
+            write_start_time = time.perf_counter()
+            for item, response, rating in zip(batch, responses, ratings):
+                template_run, argument, dimension = item.key
+
+                write_jsonl_line(log_file, {
+                    "timestamp": timestamp.isoformat(),
+                    "model": llm.name,
+                    "run_time": stats.run_time,
+                    "try": item.tries,
+                    "id": argument.id,
+                    "dimension": dimension.dimension,
+                    "template": template_run.prompt_template.name,
+                    "ratings_file": template_run.out_file_name,
+                    "prompt": item.prompt,
+                    "response": response,
+                    "parsed_response": rating,
+                })
+
+                if rating is not None or not scheduler.resubmit(item):
+                    write_jsonl_line(out_files[template_run.out_file_name],
+                                     {"id": argument.id, "dimension": dimension.dimension, "rating": rating})
+            llm.metrics.add("write", time.perf_counter() - write_start_time)
 
-from core.argument import Argument
-from core.llm import *
-from core.prompts import PromptTemplate, ExpertPromptBuilder, NovicePromptBuilder
-from core.quality_dimension import QualityDimension
-
-FIRST_OCCURRENCE_PATTERN = re.compile(r"^\s*[1-3?](?: ?- ?(?:High|Medium|Low|Cannot judge))?", re.DOTALL)
-
-ANSWER_PATTERN = re.compile(r"(?<=### Your answer:\n)^[1-3?](?: ?- ?(?:High|Medium|Low|Cannot judge))?", re.MULTILINE)
-
-RATING_PATTERN = re.compile(r"[1-3?](?: ?- ?(?:High|Medium|Low|Cannot judge))?")
-
-
-def load_arguments(path: str) -> List[Argument]:
-    arguments = []
-    with open(path, "r") as in_file:
-        in_file.readline()
-
-        for line in in_file:
-            comp = line.strip().split("\t")
-            arguments.append(Argument(*comp))
-
-    return arguments
-
-
-def load_dimension_definitions(path: str) -> List[QualityDimension]:
-    dimensions = []
-
-    with open(path, "r") as in_file:
-        for line in in_file:
-            data = json.loads(line)
-            dimensions.append(QualityDimension(**data))
-
-    return dimensions
-
-
-def parse_response(response: str) -> Optional[str]:
-    pattern_sequence = [FIRST_OCCURRENCE_PATTERN, ANSWER_PATTERN, RATING_PATTERN]
-
-    for pattern in pattern_sequence:
-        matches = re.findall(pattern, response)
-        match = None
-        if len(matches) > 0:
-            if len(matches) > 1:
-                if matches.count(matches[0]) == len(matches):
-                    match = matches[0]
+            print(
+                f"[{datetime.datetime.now().isoformat()}] {llm.name} annotated a batch of {stats.batch_size} prompts "
+                f"with templates \"{llm.metrics.template}\" ({stats.padded_tokens} padded prompt tokens, "
+                f"{stats.generated_tokens} generated tokens, {stats.tokens_per_second:.1f} tokens/s, "
+                f"{len(scheduler)} pending).", flush=True)
+
+
+def annotate_scored(llm, prompt_builder, prompt_template, arguments, dimensions, finished, out_file, out_file_name,
+                    log_file, sample):
+    """
+    Annotates all arguments of a template by scoring the rating tokens after each prompt in a single forward pass.
+    The ratings are stored together with their probability distribution.
+    """
+    for num_done, argument in enumerate(arguments):
+        argument_dimensions = [dimension for dimension in dimensions
+                               if (argument.id, dimension.dimension) not in finished]
+        if len(argument_dimensions) == 0:
+            continue
+
+        print(
+            f"[{datetime.datetime.now().isoformat()}] ({num_done + 1}/{len(arguments)}) "
+            f"{llm.name} score \"{argument.id}\" with template \"{prompt_template.name}\"...",
+            end="", flush=True)
+
+        with llm.metrics.span("build"):
+            prompts = [prompt_builder.build(argument, dimension) for dimension in argument_dimensions]
+
+        timestamp = datetime.datetime.now()
+        start_time = time.time()
+        scores = llm.score_ratings(prompts, sample=sample)
+        run_time = time.time() - start_time
+        llm.metrics.add("generate", run_time)
+
+        write_start_time = time.perf_counter()
+        for prompt, dimension, (rating, probabilities) in zip(prompts, argument_dimensions, scores):
+            write_jsonl_line(log_file, {
+                "timestamp": timestamp.isoformat(),
+                "model": llm.name,
+                "run_time": run_time,
+                "try": 1,
+                "id": argument.id,
+                "dimension": dimension.dimension,
+                "template": prompt_template.name,
+                "ratings_file": out_file_name,
+                "prompt": prompt,
+                "response": rating,
+                "parsed_response": rating,
+                "probabilities": probabilities,
+            })
+            write_jsonl_line(out_file, {"id": argument.id, "dimension": dimension.dimension, "rating": rating,
+                                        "probabilities": probabilities})
+        llm.metrics.add("write", time.perf_counter() - write_start_time)
+
+        print("Done.", flush=True)
+
+
+def annotate_openai_batch(llm, prompt_builder, prompt_template, arguments, dimensions, finished, out_file,
+                          out_file_name, log_file, batch_dir, poll_interval, submit_only):
+    """
+    Annotates all arguments of a template with the Batch API of an OpenAI model: one batch with the prompts of all
+    unrated arguments and dimensions, then a batch per try with the prompts whose responses could not be parsed. Each
+    batch is tracked in a state file in `batch_dir`, so that a resumed run collects the batches that were already
+    submitted. With `submit_only`, the first batch is submitted and the responses are left to a resumed run.
+    """
+    arguments_by_id = {argument.id: argument for argument in arguments}
+    dimensions_by_name = {dimension.dimension: dimension for dimension in dimensions}
+
+    def build(key):
+        return prompt_builder.build(arguments_by_id[key[0]], dimensions_by_name[key[1]])
+
+    keys = [(argument.id, dimension.dimension) for argument in arguments for dimension in dimensions
+            if (argument.id, dimension.dimension) not in finished]
+
+    for tries in range(1, MAX_TRIES + 1):
+        job = BatchJob(llm, os.path.join(batch_dir, f"{os.path.splitext(out_file_name)[0]}-{tries}.json"))
+        if not job.submitted:
+            if len(keys) == 0:
+                return
+            with llm.metrics.span("build"):
+                prompts = [build(key) for key in keys]
+            job.submit(keys, prompts)
+            print(f"[{datetime.datetime.now().isoformat()}] {llm.name} submitted batch {job.state['batch_id']} with "
+                  f"{len(keys)} prompts of template \"{prompt_template.name}\" (try {tries}).", flush=True)
+        if submit_only:
+            return
+
+        start_time = time.time()
+        responses = job.results(poll_interval)
+        run_time = time.time() - start_time
+        timestamp = datetime.datetime.now()
+        llm.metrics.add("batch_wait", run_time)
+
+        with llm.metrics.span("parse"):
+            ratings = [parse_response(response) if response is not None else None for response in responses]
+
+        write_start_time = time.perf_counter()
+        submitted = set(job.keys)
+        retry_keys = []
+        for key, response, rating in zip(job.keys, responses, ratings):
+            if key in finished:
+                # Rated before the run was interrupted.
+                continue
+
+            write_jsonl_line(log_file, {
+                "timestamp": timestamp.isoformat(),
+                "model": llm.name,
+                "run_time": run_time,
+                "try": tries,
+                "id": key[0],
+                "dimension": key[1],
+                "template": prompt_template.name,
+                "ratings_file": out_file_name,
+                "prompt": build(key),
+                "response": response,
+                "parsed_response": rating,
+            })
+
+            if rating is not None or tries == MAX_TRIES:
+                write_jsonl_line(out_file, {"id": key[0], "dimension": key[1], "rating": rating})
+                finished.add(key)
             else:
-                match = matches[0]
-
-        if match is not None:
-            return match.split("-")[0].strip()
-
-    return None
-
-
-def main():
+                retry_keys.append(key)
+        llm.metrics.add("write", time.perf_counter() - write_start_time)
+
+        print(f"[{datetime.datetime.now().isoformat()}] {llm.name} collected batch {job.state['batch_id']} "
+              f"({job.state['status']}) of template \"{prompt_template.name}\", {len(retry_keys)} prompts to retry.",
+              flush=True)
+
+        keys = retry_keys + [key for key in keys if key not in submitted and key not in finished]
+
+
+def annotate_argument(llm, prompt_builder, prompt_template, argument, dimensions, out_file_name, write_log,
+                      write_rating, max_tries=MAX_TRIES, stats=None):
+    """
+    Annotates one argument in all given dimensions, retrying the dimensions with unparseable responses up to
+    `max_tries` times. Log entries and final ratings are passed to `write_log` and `write_rating` as soon as they are
+    available, and the rule that rated each response is recorded in `stats`. Returns the dimensions and prompts that
+    are still unparseable if `max_tries` is below MAX_TRIES, so that they can be retried later.
+    """
+    with llm.metrics.span("build"):
+        pending = [(dimension, prompt_builder.build(argument, dimension)) for dimension in dimensions]
+
+    retries = 0
+    while len(pending) > 0 and retries < max_tries:
+        timestamp = datetime.datetime.now()
+        start_time = time.time()
+        responses = llm.generate_all([prompt for _, prompt in pending])
+        run_time = time.time() - start_time
+        llm.metrics.add("generate", run_time)
+
+        with llm.metrics.span("parse"):
+            results = list(parse_responses(responses))
+
+        write_start_time = time.perf_counter()
+        unparsed = []
+        for (dimension, prompt), response, result in zip(pending, responses, results):
+            rating = result.rating
+            if stats is not None:
+                stats.record(result, response, retries + 1)
+
+            write_log({
+                "timestamp": timestamp.isoformat(),
+                "model": llm.name,
+                "run_time": run_time,
+                "try": retries + 1,
+                "id": argument.id,
+                "dimension": dimension.dimension,
+                "template": prompt_template.name,
+                "ratings_file": out_file_name,
+                "prompt": prompt,
+                "response": response,
+                "parsed_response": rating,
+            })
+
+            if rating is not None or retries == MAX_TRIES - 1:
+                write_rating({"id": argument.id, "dimension": dimension.dimension, "rating": rating})
+            else:
+                unparsed.append((dimension, prompt))
+        llm.metrics.add("write", time.perf_counter() - write_start_time)
+
+        pending = unparsed
+        retries += 1
+
+    return pending
+
+
+def prepare_template_run(llm, decoding, template_run, sample_index):
+    """
+    Applies the decoding options of the template and, with a cache, the sample index of the ratings file, and labels
+    the metrics that follow with the template.
+    """
+    llm.metrics.template = template_run.prompt_template.name
+    decoding.apply(llm, template_run.prompt_template)
+    if isinstance(llm, CachedLLM):
+        llm.sample_index = sample_index if sample_index is not None else template_run.annotator_index
+
+
+def retry_unparsed(llm, queue, log_file, stats, template_runs, decoding, sample_index):
+    """
+    Retries the prompts of a RetryQueue in batched rounds until each is rated or has been tried MAX_TRIES times. The
+    keys of the queue items are (template, argument id, dimension, ratings file name) and their groups the ratings file
+    names, whose template run settings apply to their retries. Final ratings are appended to the ratings files.
+    """
+    runs = {template_run.out_file_name: template_run for template_run in template_runs}
+
+    def prepare(out_file_name):
+        prepare_template_run(llm, decoding, runs[out_file_name], sample_index)
+
+    for batch, prompts, responses, run_time in queue.rounds(prepare):
+        timestamp = datetime.datetime.now() - datetime.timedelta(seconds=run_time)
+        llm.metrics.add("generate", run_time)
+
+        with llm.metrics.span("parse"):
+            results = list(parse_responses(responses))
+
+        write_start_time = time.perf_counter()
+        ratings = {}
+        for item, prompt, response, result in zip(batch, prompts, responses, results):
+            prompt_template, argument_id, dimension, out_file_name = item.key
+            stats.record(result, response, item.tries)
+
+            write_jsonl_line(log_file, {
+                "timestamp": timestamp.isoformat(),
+                "model": llm.name,
+                "run_time": run_time,
+                "try": item.tries,
+                "id": argument_id,
+                "dimension": dimension,
+                "template": prompt_template.name,
+                "ratings_file": out_file_name,
+                "prompt": prompt,
+                "response": response,
+                "parsed_response": result.rating,
+            })
+
+            if result.rating is not None or item.tries == MAX_TRIES:
+                ratings.setdefault(out_file_name, []).append(
+                    {"id": argument_id, "dimension": dimension, "rating": result.rating})
+            else:
+                queue.add(item.key, item.prompt, item.tries, item.group)
+
+        for out_file_name, file_ratings in ratings.items():
+            with open(os.path.join("data/ratings", out_file_name), "a") as out_file:
+                for rating in file_ratings:
+                    write_jsonl_line(out_file, rating)
+        llm.metrics.add("write", time.perf_counter() - write_start_time)
+
+        print(f"[{datetime.datetime.now().isoformat()}] {llm.name} retried {len(batch)} prompts, "
+              f"{sum(len(file_ratings) for file_ratings in ratings.values())} finished, {len(queue)} pending.",
+              flush=True)
+
+
+def annotate_samples(llm, prompt_builder, prompt_template, argument, dimensions, sample_runs, write_log, out_files):
+    """
+    Annotates one argument in all given dimensions for several ratings files at once: a single call generates one
+    response per ratings file (sample) for each prompt. Unparseable responses are retried per sample up to MAX_TRIES
+    times. `out_files` maps the ratings file names of the runs to the open files.
+    """
+    # The runs (samples) for which each dimension still has to be rated.
+    pending = [(dimension, [run for run in sample_runs if (argument.id, dimension.dimension) not in run.finished])
+               for dimension in dimensions]
+    pending = [(dimension, runs) for dimension, runs in pending if len(runs) > 0]
+    if len(pending) == 0:
+        return
+
+    with llm.metrics.span("build"):
+        prompts = [prompt_builder.build(argument, dimension) for dimension, _ in pending]
+    num_samples = max(len(runs) for _, runs in pending)
+
+    timestamp = datetime.datetime.now()
+    start_time = time.time()
+    samples = llm.generate_samples(prompts, num_samples)
+    run_time = time.time() - start_time
+    llm.metrics.add("generate", run_time)
+
+    requests = [(dimension, prompt, run, response)
+                for (dimension, runs), prompt, responses in zip(pending, prompts, samples)
+                for run, response in zip(runs, responses)]
+
+    for tries in range(1, MAX_TRIES + 1):
+        with llm.metrics.span("parse"):
+            ratings = [parse_response(response) for _, _, _, response in requests]
+
+        write_start_time = time.perf_counter()
+        retries = []
+        for (dimension, prompt, run, response), rating in zip(requests, ratings):
+            write_log({
+                "timestamp": timestamp.isoformat(),
+                "model": llm.name,
+                "run_time": run_time,
+                "try": tries,
+                "id": argument.id,
+                "dimension": dimension.dimension,
+                "template": prompt_template.name,
+                "ratings_file": run.out_file_name,
+                "prompt": prompt,
+                "response": response,
+                "parsed_response": rating,
+            })
+
+            if rating is not None or tries == MAX_TRIES:
+                write_jsonl_line(out_files[run.out_file_name],
+                                 {"id": argument.id, "dimension": dimension.dimension, "rating": rating})
+            else:
+                retries.append((dimension, prompt, run))
+        llm.metrics.add("write", time.perf_counter() - write_start_time)
+
+        if len(retries) == 0:
+            break
+
+        timestamp = datetime.datetime.now()
+        start_time = time.time()
+        responses = llm.generate_all([prompt for _, prompt, _ in retries])
+        run_time = time.time() - start_time
+        llm.metrics.add("generate", run_time)
+        requests = [(dimension, prompt, run, response)
+                    for (dimension, prompt, run), response in zip(retries, responses)]
+
+
+@dataclass
+class TemplateRun:
+    prompt_template: PromptTemplate
+    prompt_builder: PromptBuilder
+    annotator_index: int
+    out_file_name: str
+    finished: Set[Tuple[str, str]]
+
+
+@dataclass
+class DecodingOptions:
+    """
+    Decoding settings that depend on the template: the token budget per template name (the budget of the model
+    otherwise) and, for the templates without reasoning, whether decoding of Hugging Face models stops once the rating
+    is decided and the stop sequences of OpenAI models.
+    """
+    stop_at_rating: bool = False
+    stop: Optional[List[str]] = None
+    token_budgets: Dict[str, int] = field(default_factory=dict)
+    # The budget of each model before any template changed it, by model name (ids are reused once a model is freed).
+    default_budgets: Dict[str, int] = field(default_factory=dict)
+
+    def apply(self, llm, prompt_template: PromptTemplate):
+        model = llm.llm if isinstance(llm, CachedLLM) else llm
+        answer_only = "REASONING" not in prompt_template.name
+        if isinstance(model, HFModel):
+            budget_key = "max_new_tokens"
+            model.stop_at_rating = self.stop_at_rating and answer_only
+        elif isinstance(model, OpenAIModel):
+            budget_key = "max_tokens"
+            model.generation_kwargs.pop("stop", None)
+            if self.stop and answer_only:
+                model.generation_kwargs["stop"] = self.stop
+        else:
+            return
+
+        default_budget = self.default_budgets.setdefault(model.model_name, model.generation_kwargs[budget_key])
+        model.generation_kwargs[budget_key] = self.token_budgets.get(prompt_template.name, default_budget)
+
+
+def get_template_runs(model_name: str, resume: bool, num_samples: int = 1) -> List[TemplateRun]:
+    """
+    Runs of all templates, with `num_samples` consecutively numbered ratings files (runs) per template that have the
+    same numbers for all templates (see `get_sweep_index`). The ratings files that do not exist yet are created.
+    """
+    first_index = get_sweep_index(model_name, resume, num_samples)
+    template_runs = []
+    for prompt_template in PromptTemplate:
+        prompt_builder, prompt_condition = get_prompt_builder(prompt_template)
+
+        for annotator_index in range(first_index, first_index + num_samples):
+            out_file_name = f"{model_name}-{prompt_condition}-{annotator_index}.jsonl"
+
+            # Created up front, so that a resumed run finds the sweep even if it fails before its last template.
+            open(os.path.join("data/ratings", out_file_name), "a").close()
+
+            finished = set()
+            if resume:
+                finished = load_finished_ratings(os.path.join("data/ratings", out_file_name), "data/logs")
+                print(f"Resume {out_file_name} with {len(finished)} ratings.")
+
+            template_runs.append(TemplateRun(prompt_template, prompt_builder, annotator_index, out_file_name,
+                                             finished))
+
+    return template_runs
+
+
+def annotation_worker(rank, llm_factory, llm_kwargs, num_threads, cache_kwargs, sample_index, shard, dimensions,
+                      template_runs, decoding, queue):
+    """
+    Annotates a shard of (index, argument) pairs with all templates in a worker process and sends the ratings and log
+    entries of every argument to the queue, and its metrics once it is done.
+    """
+    try:
+        if num_threads is not None:
+            import torch
+            torch.set_num_threads(num_threads)
+
+        start_time = time.perf_counter()
+        llm = llm_factory(**llm_kwargs)
+        llm.metrics = Metrics(llm.name)
+        llm.metrics.add("load", time.perf_counter() - start_time)
+        if cache_kwargs is not None:
+            llm = CachedLLM(llm, ResponseCache(**cache_kwargs))
+
+        for template_run in template_runs:
+            prepare_template_run(llm, decoding, template_run, sample_index)
+
+            for index, argument in shard:
+                argument_dimensions = [dimension for dimension in dimensions
+                                       if (argument.id, dimension.dimension) not in template_run.finished]
+                ratings = []
+                log_entries = []
+                annotate_argument(llm, template_run.prompt_builder, template_run.prompt_template, argument,
+                                  argument_dimensions, template_run.out_file_name, log_entries.append, ratings.append)
+
+                queue.put(("argument", rank, template_run.out_file_name, index, ratings, log_entries))
+
+        if cache_kwargs is not None:
+            llm.cache.close()
+
+        queue.put(("done", rank, llm.metrics))
+    except Exception:
+        queue.put(("error", rank, traceback.format_exc()))
+
+
+def annotate_parallel(llm_factory, devices, arguments, dimensions, template_runs, log_file, num_workers, cache_kwargs,
+                      sample_index, decoding, metrics):
+    """
+    Splits the arguments across worker processes that each load their own model (on the next of the given devices)
+    and merges their ratings into the ratings files in argument and dimension order, and their metrics into `metrics`.
+    """
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+
+    indexed_arguments = list(enumerate(arguments))
+    worker_devices = [devices[rank % len(devices)] for rank in range(num_workers)]
+    workers = []
+    for rank, device in enumerate(worker_devices):
+        llm_kwargs = {}
+        if device is not None:
+            llm_kwargs["device_map"] = {"": device}
+
+        # Workers on the CPU share its cores instead of each starting a thread per core.
+        num_threads = None
+        if device == "cpu":
+            num_threads = max(1, os.cpu_count() // worker_devices.count("cpu"))
+
+        worker = context.Process(target=annotation_worker, args=(
+            rank, llm_factory, llm_kwargs, num_threads, cache_kwargs, sample_index,
+            indexed_arguments[rank::num_workers], dimensions, template_runs, decoding, queue))
+        worker.start()
+        workers.append(worker)
+
+    dimension_order = {dimension.dimension: i for i, dimension in enumerate(dimensions)}
+    pending = {template_run.out_file_name: {} for template_run in template_runs}
+    next_index = {template_run.out_file_name: 0 for template_run in template_runs}
+
+    with contextlib.ExitStack() as stack:
+        out_files = {template_run.out_file_name: stack.enter_context(
+            open(os.path.join("data/ratings", template_run.out_file_name), "a")) for template_run in template_runs}
+
+        num_running = num_workers
+        while num_running > 0:
+            message = queue.get()
+
+            if message[0] == "error":
+                for worker in workers:
+                    worker.terminate()
+                raise RuntimeError(f"Worker {message[1]} failed:\n{message[2]}")
+
+            if message[0] == "done":
+                metrics.merge(message[2])
+                num_running -= 1
+                continue
+
+            _, rank, out_file_name, index, ratings, log_entries = message
+            for log_entry in log_entries:
+                write_jsonl_line(log_file, log_entry)
+
+            pending[out_file_name][index] = sorted(ratings, key=lambda rating: dimension_order[rating["dimension"]])
+            while next_index[out_file_name] in pending[out_file_name]:
+                for rating in pending[out_file_name].pop(next_index[out_file_name]):
+                    write_jsonl_line(out_files[out_file_name], rating)
+                next_index[out_file_name] += 1
+
+            print(f"[{datetime.datetime.now().isoformat()}] ({next_index[out_file_name]}/{len(arguments)}) "
+                  f"Worker {rank} annotated \"{arguments[index].id}\" for \"{out_file_name}\".", flush=True)
+
+    for worker in workers:
+        worker.join()
+
+
+def main(args):
     arguments = load_arguments("data/arguments.tsv")
     dimensions = load_dimension_definitions("data/dimensions_definitions.jsonl")
     num_arguments = len(arguments)
 
-    ratings = []
+    hf_kwargs = {"prefix_caching": args.prefix_caching, "dtype": args.dtype, "quantize": args.quantize,
+                 "max_memory": args.max_memory, "offload_folder": args.offload_folder,
+                 "safetensors": args.safetensors}
+    if args.device_map is not None:
+        hf_kwargs["device_map"] = args.device_map
+    openai_kwargs = {"max_concurrency": args.max_concurrency, "requests_per_minute": args.requests_per_minute,
+                     "tokens_per_minute": args.tokens_per_minute, "max_retries": args.max_retries}
+    llms = {name: functools.partial(MODELS[name], **(hf_kwargs if issubclass(MODELS[name], HFModel) else openai_kwargs))
+            for name in args.models}
+    if args.hf_model is not None:
+        llms = {HFModel.__name__: functools.partial(HFModel, args.hf_model, **hf_kwargs)}
 
-    llms = [LLama213b]
     begin_timestamp = datetime.datetime.now()
     os.makedirs("data/ratings/", exist_ok=True)
     os.makedirs("data/logs/", exist_ok=True)
+    if args.openai_batch:
+        os.makedirs(args.batch_dir, exist_ok=True)
 
     log_file = open(f"data/logs/log-{begin_timestamp.isoformat()}.jsonl", "w+")
+    out_file_names = []
+
+    cache = None
+    cache_kwargs = None
+    if args.cache is not None:
+        cache_kwargs = {"path": args.cache, "max_entries": args.cache_max_entries, "max_age": args.cache_max_age,
+                        "read_only": args.replay}
+
+    decoding = DecodingOptions(args.stop_at_rating, args.stop, args.token_budget)
+    stats = ParseStats()
+    metrics = Metrics()
 
     try:
-        for llm in llms:
+        for llm_name, llm in llms.items():
+            template_runs = get_template_runs(llm_name, args.resume, args.samples)
+            out_file_names += [template_run.out_file_name for template_run in template_runs]
+
+            if args.workers > 1:
+                devices = [None]
+                if args.devices is not None and (args.hf_model is not None or issubclass(MODELS[llm_name], HFModel)):
+                    devices = args.devices
+
+                annotate_parallel(llm, devices, arguments, dimensions, template_runs, log_file, args.workers,
+                                  cache_kwargs, args.sample_index, decoding, metrics)
+                continue
+
             print(
-                f"[{datetime.datetime.now().isoformat()}] Initialize {llm.__name__}...",
+                f"[{datetime.datetime.now().isoformat()}] Initialize {llm_name}...",
                 end="")
-            llm = llm()
-            print("Done.", flush=True)
-            for prompt_template in PromptTemplate:
-                if (prompt_template.name == PromptTemplate.NOVICE_TEMPLATE.name
-                        or prompt_template.name == PromptTemplate.NOVICE_REASONING_TEMPLATE.name):
-                    prompt_builder = NovicePromptBuilder(prompt_template)
-
-                    prompt_condition = "novice"
-
-                    if prompt_template.name == PromptTemplate.NOVICE_REASONING_TEMPLATE.name:
-                        prompt_condition += "-reasoning"
-                else:
-                    prompt_builder = ExpertPromptBuilder(prompt_template)
-
-                    prompt_condition = "expert"
-
-                    if prompt_template.name == PromptTemplate.EXPERT_REASONING_TEMPLATE.name:
-                        prompt_condition += "-reasoning"
-
-                num_done = 0
-                for argument in arguments:
-                    prompts = []
-
-                    dimensions_copy = copy.deepcopy(dimensions)
-                    print(
-                        f"[{datetime.datetime.now().isoformat()}] ({num_done + 1}/{num_arguments}) "
-                        f"{llm.__class__.__name__} annotate \"{argument.id}\" with template \"{prompt_template.name}\"...",
-                        end="", flush=True)
-
-                    for dimension in dimensions_copy:
-                        prompt = prompt_builder.build(argument, dimension)
-                        prompts.append(prompt)
-
-                    retries = 0
-                    while len(dimensions_copy) > 0 and retries < 5:
-                        timestamp = datetime.datetime.now()
-                        start_time = time.time()
-                        responses = llm.generate_all(prompts)
-                        run_time = time.time() - start_time
-
-                        zipped = [t for t in zip(prompts, responses, dimensions_copy)]
-                        for prompt, response, dimension in zipped:
-                            rating = parse_response(response)
-
-                            log_file.write(json.dumps({
-                                "timestamp": timestamp.isoformat(),
-                                "model": llm.__class__.__name__,
-                                "run_time": run_time,
-                                "try": retries + 1,
-                                "dimension": dimension.dimension,
-                                "prompt": prompt,
-                                "response": response,
-                                "parsed_response": rating,
-                            }))
-                            log_file.write("\n")
-                            log_file.flush()
-
-                            if rating is not None or retries == 4:
-                                ratings.append({"id": argument.id, "dimension": dimension.dimension, "rating": rating})
-                                prompts.remove(prompt)
-                                dimensions_copy.remove(dimension)
-
-                        retries += 1
-
-                    num_done += 1
-                    print("Done.", flush=True)
-
-                existing_files = [f for f in os.listdir("data/ratings")
-                                  if re.match(rf"{llm.__class__.__name__}-{prompt_condition}-[0-9]+\.jsonl", f)]
-                out_file_name = f"{llm.__class__.__name__}-{prompt_condition}-{len(existing_files) + 1}.jsonl"
-
-                with open(os.path.join("data/ratings", out_file_name), "w+") as out_file:
-                    for rating in ratings:
-                        out_file.write(json.dumps(rating))
-                        out_file.write("\n")
-
-                    ratings.clear()
+            metrics.model = llm_name
+            metrics.template = ""
+            start_time = time.perf_counter()
+            with metrics.span("load"):
+                llm = llm()
+            llm.metrics = metrics
+            if cache_kwargs is not None:
+                cache = ResponseCache(**cache_kwargs)
+                llm = CachedLLM(llm, cache)
+            max_rss = peak_rss()
+            print(f"Done ({time.perf_counter() - start_time:.1f}s"
+                  + (f", peak RSS {max_rss / 2 ** 30:.2f} GiB" if max_rss is not None else "") + ").", flush=True)
+
+            retry_queue = None
+            if args.retry_queue:
+                retry_queue = RetryQueue(llm, args.retry_batch_size, args.retry_temperature_step,
+                                         args.retry_max_temperature, args.retry_instruction)
+
+            if args.samples > 1:
+                for prompt_template, sample_runs in itertools.groupby(template_runs,
+                                                                      key=lambda run: run.prompt_template):
+                    sample_runs = list(sample_runs)
+                    metrics.template = prompt_template.name
+                    decoding.apply(llm, prompt_template)
+                    with contextlib.ExitStack() as stack:
+                        out_files = {run.out_file_name: stack.enter_context(
+                            open(os.path.join("data/ratings", run.out_file_name), "a")) for run in sample_runs}
+
+                        for num_done, argument in enumerate(arguments):
+                            print(
+                                f"[{datetime.datetime.now().isoformat()}] ({num_done + 1}/{num_arguments}) "
+                                f"{llm.name} annotate \"{argument.id}\" with template \"{prompt_template.name}\" "
+                                f"({len(sample_runs)} samples)...", end="", flush=True)
+
+                            annotate_samples(llm, sample_runs[0].prompt_builder, prompt_template, argument,
+                                             dimensions, sample_runs, functools.partial(write_jsonl_line, log_file),
+                                             out_files)
+
+                            print("Done.", flush=True)
+
+                del llm
+                continue
+
+            batched_runs = []
+            for template_run in template_runs:
+                prompt_template = template_run.prompt_template
+                prompt_builder = template_run.prompt_builder
+                out_file_name = template_run.out_file_name
+                finished = template_run.finished
+
+                prepare_template_run(llm, decoding, template_run, args.sample_index)
+
+                with open(os.path.join("data/ratings", out_file_name), "a") as out_file:
+                    if args.logit_scoring is not None and "REASONING" not in prompt_template.name:
+                        annotate_scored(llm, prompt_builder, prompt_template, arguments, dimensions, finished,
+                                        out_file, out_file_name, log_file, args.logit_scoring == "sample")
+                        continue
+
+                    if args.openai_batch and isinstance(llm, OpenAIModel):
+                        annotate_openai_batch(llm, prompt_builder, prompt_template, arguments, dimensions, finished,
+                                              out_file, out_file_name, log_file, args.batch_dir, args.poll_interval,
+                                              args.batch_submit_only)
+                        continue
+
+                    if args.max_batch_tokens is not None:
+                        # Annotated below, together with the other templates.
+                        batched_runs.append(template_run)
+                        continue
+
+                    for num_done, argument in enumerate(arguments):
+                        argument_dimensions = [dimension for dimension in dimensions
+                                               if (argument.id, dimension.dimension) not in finished]
+                        if len(argument_dimensions) == 0:
+                            continue
+
+                        print(
+                            f"[{datetime.datetime.now().isoformat()}] ({num_done + 1}/{num_arguments}) "
+                            f"{llm.name} annotate \"{argument.id}\" with template \"{prompt_template.name}\"...",
+                            end="", flush=True)
+
+                        unparsed = annotate_argument(llm, prompt_builder, prompt_template, argument,
+                                                     argument_dimensions, out_file_name,
+                                                     functools.partial(write_jsonl_line, log_file),
+                                                     functools.partial(write_jsonl_line, out_file),
+                                                     max_tries=1 if retry_queue is not None else MAX_TRIES,
+                                                     stats=stats)
+                        for dimension, prompt in unparsed:
+                            retry_queue.add((prompt_template, argument.id, dimension.dimension, out_file_name),
+                                            prompt, 1, out_file_name)
+
+                        print("Done.", flush=True)
+
+            if len(batched_runs) > 0:
+                annotate_batched(llm, batched_runs, arguments, dimensions, log_file, args.max_batch_tokens, decoding,
+                                 args.sample_index)
+
+            if retry_queue is not None and len(retry_queue) > 0:
+                retry_unparsed(llm, retry_queue, log_file, stats, template_runs, decoding, args.sample_index)
 
             del llm
+            if cache is not None:
+                print(f"Response cache: {cache.hits} hits, {cache.misses} misses.")
+                cache.close()
+                cache = None
     except Exception as e:
         print(e, file=sys.stderr)
     finally:
         log_file.close()
 
+        if stats.rules:
+            print(f"Parsed responses per try and rule:\n{stats.summary()}")
+            with open(f"data/logs/parse-stats-{begin_timestamp.isoformat()}.json", "w") as stats_file:
+                json.dump(stats.to_dict(), stats_file, indent=2)
+
+        if metrics.durations:
+            print(f"Time per model, template and stage:\n{metrics.format_summary()}")
+            metrics.write_jsonl(f"data/logs/metrics-{begin_timestamp.isoformat()}.jsonl")
+            if args.prometheus is not None:
+                metrics.write_prometheus(args.prometheus)
+
+        if cache is not None:
+            print(f"Response cache: {cache.hits} hits, {cache.misses} misses.")
+            cache.close()
+
+        if args.parquet:
+            # The JSONL files remain the journal that --resume continues, the Parquet files are rewritten from them.
+            for path in [os.path.join("data/ratings", name) for name in out_file_names] + [log_file.name]:
+                if os.path.exists(path):
+                    print(f"Wrote {convert(path)}.")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-m', '--models', type=str, nargs="+", default=["LLama213b"], choices=list(MODELS),
+                        help='models to annotate the arguments with')
+    parser.add_argument('--hf-model', type=str, default=None,
+                        help='name or path of any Hugging Face causal language model to use instead of --models')
+    parser.add_argument('--device-map', type=str, default=None,
+                        help='device map of Hugging Face models, e.g. "cpu" or "auto" (default: first GPU, "auto" for '
+                             'LLama270b)')
+    parser.add_argument('--dtype', type=str, default="float16", choices=HFModel.DTYPES,
+                        help='type of the weights of Hugging Face models ("auto": type of the checkpoint)')
+    parser.add_argument('--quantize', type=str, default=None, choices=["int8"],
+                        help='replace the linear layers of Hugging Face models by dynamically quantized int8 layers '
+                             '(CPU only, e.g. with --device-map cpu)')
+    parser.add_argument('--max-memory', type=str, nargs="+", default=None, metavar="DEVICE=SIZE",
+                        help='memory per device that --device-map auto may fill, e.g. 0=20GiB cpu=60GiB')
+    parser.add_argument('--offload-folder', type=str, default=None,
+                        help='folder for the weights of Hugging Face models that do not fit into --max-memory')
+    parser.add_argument('--safetensors', action='store_true',
+                        help='only load safetensors weights of Hugging Face models, which are memory-mapped instead '
+                             'of read into memory')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='number of worker processes that each load a model and annotate a share of the arguments')
+    parser.add_argument('--devices', type=str, nargs="+", default=None,
+                        help='devices to spread the workers of Hugging Face models over, e.g. "cuda:0 cuda:1" or "cpu"')
+    parser.add_argument('--max-concurrency', type=int, default=8,
+                        help='number of requests of OpenAI models in flight at once')
+    parser.add_argument('--requests-per-minute', type=float, default=None,
+                        help='request rate limit of OpenAI models (default: none)')
+    parser.add_argument('--tokens-per-minute', type=float, default=None,
+                        help='token rate limit of OpenAI models, counting the prompt and the full completion budget '
+                             '(default: none)')
+    parser.add_argument('--max-retries', type=int, default=10,
+                        help='attempts of an OpenAI request that fails with a rate limit, timeout or server error')
+    parser.add_argument('--prefix-caching', action='store_true',
+                        help='encode the prefix shared by the prompts of an argument once and reuse its key-value '
+                             'cache for all dimensions (Hugging Face models only)')
+    parser.add_argument('--logit-scoring', type=str, default=None, choices=["argmax", "sample"],
+                        help='rate with the templates without reasoning by a single forward pass over the rating '
+                             'tokens, taking the most probable or a sampled rating (Hugging Face models only)')
+    parser.add_argument('--max-batch-tokens', type=int, default=None,
+                        help='pool the prompts of all arguments and templates into batches of similar length with at '
+                             'most this many padded prompt and generated tokens (Hugging Face models only)')
+    parser.add_argument('--resume', action='store_true',
+                        help='continue the latest sweep of each model (the ratings files with the highest number of '
+                             'any template and the --samples files before them), skipping arguments and dimensions '
+                             'that are already rated in it or in the logs')
+    parser.add_argument('--cache', type=str, default=None,
+                        help='SQLite file to cache responses in, keyed by model, prompt, parameters and sample')
+    parser.add_argument('--cache-max-entries', type=int, default=None,
+                        help='evict the least recently used responses beyond this number')
+    parser.add_argument('--cache-max-age', type=float, default=None,
+                        help='evict cached responses older than this number of seconds')
+    parser.add_argument('--replay', action='store_true',
+                        help='only serve responses from the cache and fail on cache misses')
+    parser.add_argument('--sample-index', type=int, default=None,
+                        help='sample index of the cached responses to use instead of the number of the new ratings '
+                             'file, e.g. to replay the run that wrote the first ratings file')
+    parser.add_argument('--parquet', action='store_true',
+                        help='also store the ratings and the log of the run in Parquet files, with the prompts in a '
+                             'separate table')
+    parser.add_argument('--openai-batch', action='store_true',
+                        help='annotate with the Batch API of OpenAI models: submit the prompts of each template as a '
+                             'batch, wait for it and retry unparseable responses with further batches')
+    parser.add_argument('--batch-dir', type=str, default="data/batches",
+                        help='directory for the state, input and output files of the batches')
+    parser.add_argument('--poll-interval', type=float, default=60,
+                        help='seconds between two status requests of a batch')
+    parser.add_argument('--batch-submit-only', action='store_true',
+                        help='only submit the batches and exit; a later run with --resume collects the responses')
+    parser.add_argument('--samples', type=int, default=1,
+                        help='number of ratings files (annotators) to write per template from a single request per '
+                             'prompt that returns this many samples (num_return_sequences / n)')
+    parser.add_argument('--stop-at-rating', action='store_true',
+                        help='end the decoding of Hugging Face models with the templates without reasoning as soon as '
+                             'the response starts with a rating, which parse_response then returns')
+    parser.add_argument('--stop', type=str, nargs="+", default=None,
+                        help='stop sequences of OpenAI models for the templates without reasoning')
+    parser.add_argument('--token-budget', type=str, nargs="+", default=[], metavar="TEMPLATE=TOKENS",
+                        help='maximum number of generated tokens per template, e.g. EXPERT_TEMPLATE=16')
+    parser.add_argument('--retry-queue', action='store_true',
+                        help='collect the prompts with unparseable responses of all arguments and templates of a model '
+                             'and retry them in batched rounds after the first pass instead of after each argument')
+    parser.add_argument('--retry-batch-size', type=int, default=64,
+                        help='number of prompts per generation call of a retry round')
+    parser.add_argument('--retry-temperature-step', type=float, default=0.0,
+                        help='raise the sampling temperature by this much with every retry')
+    parser.add_argument('--retry-max-temperature', type=float, default=1.0,
+                        help='highest temperature reached by --retry-temperature-step')
+    parser.add_argument('--retry-instruction', type=str, nargs="?", default=None, const=STRICT_ANSWER_INSTRUCTION,
+                        help='add a stricter answer instruction to retried prompts (default instruction: '
+                             f'"{STRICT_ANSWER_INSTRUCTION}")')
+    parser.add_argument('--prometheus', type=str, default=None,
+                        help='also write the time per stage and the token throughput to this file in the Prometheus '
+                             'text format (e.g. for the textfile collector of the node exporter)')
+    args = parser.parse_args()
+
+    token_budgets = {}
+    for budget in args.token_budget:
+        name, _, tokens = budget.partition("=")
+        if name not in PromptTemplate.__members__ or not tokens.isdigit():
+            parser.error(f"invalid token budget {budget}, expected TEMPLATE=TOKENS with a template of "
+                         f"{', '.join(PromptTemplate.__members__)}")
+        token_budgets[name] = int(tokens)
+    args.token_budget = token_budgets
+
+    if args.max_memory is not None:
+        max_memory = {}
+        for limit in args.max_memory:
+            device, _, size = limit.partition("=")
+            if not device or not size:
+                parser.error(f"invalid memory limit {limit}, expected DEVICE=SIZE, e.g. 0=20GiB or cpu=60GiB")
+            max_memory[int(device) if device.isdigit() else device] = size
+        args.max_memory = max_memory
+
+    if args.max_concurrency < 1 or args.max_retries < 1:
+        parser.error("--max-concurrency and --max-retries must be at least 1")
+
+    if args.replay and args.cache is None:
+        parser.error("--replay requires --cache")
+
+    if args.workers > 1 and (args.max_batch_tokens is not None or args.logit_scoring is not None):
+        parser.error("--workers cannot be combined with --max-batch-tokens or --logit-scoring")
+
+    if args.openai_batch and (args.workers > 1 or args.cache is not None):
+        parser.error("--openai-batch cannot be combined with --workers or --cache")
+
+    if args.samples > 1 and (args.workers > 1 or args.cache is not None or args.max_batch_tokens is not None
+                             or args.logit_scoring is not None or args.openai_batch):
+        parser.error("--samples cannot be combined with --workers, --cache, --max-batch-tokens, --logit-scoring or "
+                     "--openai-batch")
+
+    if args.retry_queue and (args.workers > 1 or args.samples > 1 or args.max_batch_tokens is not None
+                             or args.openai_batch):
+        parser.error("--retry-queue cannot be combined with --workers, --samples, --max-batch-tokens or "
+                     "--openai-batch, which retry on their own")
+
+    if (args.retry_temperature_step or args.retry_instruction is not None) and not args.retry_queue:
+        parser.error("--retry-temperature-step and --retry-instruction require --retry-queue")
+
+    if args.batch_submit_only and not args.openai_batch:
+        parser.error("--batch-submit-only requires --openai-batch")
+
+    for option in ["max_batch_tokens", "logit_scoring"]:
+        if getattr(args, option) is not None and args.hf_model is None \
+                and any(issubclass(MODELS[name], OpenAIModel) for name in args.models):
+            parser.error(f"--{option.replace('_', '-')} requires a Hugging Face model")
+
+    return args
+
 
 if __name__ == '__main__':
-    main()
+    main(parse_args())
@@ -0,0 +1,133 @@
+import argparse
+import glob
+import gzip
+import json
+import multiprocessing
+import os
+
+from core.parsing import parse_responses
+
+try:
+    import orjson
+
+    def loads(line):
+        try:
+            return orjson.loads(line)
+        except orjson.JSONDecodeError:
+            # orjson rejects NaN and integers beyond 64 bits, which json.dumps writes.
+            return json.loads(line)
+except ImportError:
+    loads = json.loads
+
+
+def dumps(data):
+    # json.dumps as predict_argument_quality.py writes the lines, so that unchanged lines stay the same byte for byte.
+    return json.dumps(data).encode("utf-8")
+
+
+CHUNK_SIZE = 10000
+
+
+def open_file(path, mode):
+    """Opens a plain, gzip (.gz) or Zstandard (.zst) compressed file in binary mode."""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode)
+    if path.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError(f"Reading and writing {path} requires the zstandard package") from None
+        return zstandard.open(path, mode)
+    return open(path, mode)
+
+
+def read_chunks(in_file):
+    """Chunks of the decoded lines of a file, with blank lines kept as they are (bytes)."""
+    chunk = []
+    for line in in_file:
+        chunk.append(loads(line) if line.strip() else line)
+        if len(chunk) == CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def reparse_file(paths, field=None):
+    """
+    Parses the response of every line of a prediction or log file again and writes the lines with the new rating to
+    the output file, which only replaces an existing file once it is complete. The rating is stored in `field`, by
+    default in `parsed_response` for logs and in `rating` for predictions; lines without a response and blank lines are
+    copied.
+    """
+    in_path, out_path = paths
+    stats = {"file": in_path, "lines": 0, "changed": 0, "rules": {}}
+
+    temp_path = f"{out_path}.tmp-{os.getpid()}{os.path.splitext(out_path)[1]}"
+    try:
+        with open_file(in_path, "rb") as in_file, open_file(temp_path, "wb") as out_file:
+            for chunk in read_chunks(in_file):
+                parseable = [data for data in chunk if isinstance(data, dict) and isinstance(data.get("response"), str)]
+                for data, result in zip(parseable, parse_responses(data["response"] for data in parseable)):
+                    rating_field = field or ("parsed_response" if "parsed_response" in data else "rating")
+                    if data.get(rating_field) != result.rating:
+                        stats["changed"] += 1
+                    data[rating_field] = result.rating
+                    stats["rules"][result.rule] = stats["rules"].get(result.rule, 0) + 1
+
+                out_file.write(b"".join(data if isinstance(data, bytes) else dumps(data) + b"\n" for data in chunk))
+                stats["lines"] += len(chunk)
+        os.replace(temp_path, out_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return stats
+
+
+def get_file_pairs(inputs, pattern, output_dir):
+    in_paths = []
+    for path in inputs:
+        if os.path.isdir(path):
+            in_paths += sorted(glob.glob(os.path.join(path, pattern)))
+        else:
+            in_paths.append(path)
+    return [(in_path, os.path.join(output_dir, os.path.basename(in_path))) for in_path in in_paths]
+
+
+def main(args):
+    os.makedirs(args.output_dir, exist_ok=True)
+    file_pairs = get_file_pairs(args.inputs, args.pattern, args.output_dir)
+    for in_path, out_path in file_pairs:
+        if os.path.abspath(in_path) == os.path.abspath(out_path) and not args.in_place:
+            raise ValueError(f"{in_path} would be overwritten, use --in-place to allow it")
+
+    if args.workers > 1:
+        pool = multiprocessing.Pool(args.workers)
+        results = pool.imap_unordered(reparse_file, file_pairs)
+    else:
+        pool = None
+        results = map(reparse_file, file_pairs)
+
+    try:
+        for stats in results:
+            print(f"{stats['file']}: {stats['lines']} lines, {stats['changed']} changed ratings, "
+                  f"rules: {stats['rules']}")
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Parse the responses of prediction or log files again.")
+    parser.add_argument("inputs", type=str, nargs="+", help="JSONL files (optionally .gz or .zst) or directories")
+    parser.add_argument("-p", "--pattern", type=str, default="*.jsonl*",
+                        help="pattern of the files to parse in input directories")
+    parser.add_argument("-o", "--output-dir", type=str, default="data/ratings")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="number of files parsed in parallel")
+    parser.add_argument("--in-place", action="store_true", help="allow replacing the input files")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    main(parse_args())